@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 import os
 import argparse
+import multiprocessing as mp
 from pathlib import Path
 from contextlib import contextmanager
 import yaml
+import numpy as np
+import awkward as ak
 
 from analysis_suite.commons.info import fileInfo
 import analysis_suite.commons.setup_functions as setup
@@ -48,31 +51,65 @@ def setInputs(inputs):
     return root_inputs
 
 
-def getSumW(infiles):
-    output = ROOT.TH1F('sumweight', 'sumweight', 14, 0, 14)
-    LHESCALE, PDF, ALPHAZ = 1, 10, 12
+def read_runs(infiles):
+    """Columns of the Runs trees of all the files (None for missing branches)
+
+    The trees are read through a TChain like the Events, so the files are
+    opened the same way as for the selection
+    """
+    branches = ["genEventSumw", "LHEScaleSumw", "LHEPdfSumw"]
     fChain = ROOT.TChain()
-    for fname in files:
+    for fname in infiles:
         fChain.Add(f"{fname}/Runs")
-    for entry in fChain:
-        sumW = entry.genEventSumw if hasattr(entry, 'genEventSumw') else -1
-        output.Fill(0, sumW)
-        if hasattr(entry, "LHEScaleSumw"):
-            for i, scale in enumerate(entry.LHEScaleSumw):
-                output.Fill(LHESCALE+i, scale*sumW)
-        if hasattr(entry, "LHEPdfSumw"):
-            if len(entry.LHEPdfSumw) >= 101:
-                pdf = sorted([entry.LHEPdfSumw[i] for i in range(101)])
-                err = (pdf[85] - pdf[15])/2
-                output.Fill(PDF, (pdf[50]-err)*sumW)
-                output.Fill(PDF+1, (pdf[50]+err)*sumW)
-            # Alpha Z sumweight
-            if len(entry.LHEPdfSumw) == 103:
-                output.Fill(ALPHAZ, entry.LHEPdfSumw[101]*sumW)
-                output.Fill(ALPHAZ+1, entry.LHEPdfSumw[102]*sumW)
-            else:
-                output.Fill(ALPHAZ, sumW)
-                output.Fill(ALPHAZ+1, sumW)
+    nentries = fChain.GetEntries()
+    if nentries <= 0:
+        return dict.fromkeys(branches), 0
+    fChain.LoadTree(0)
+    found = [branch for branch in branches if fChain.GetBranch(branch)]
+    columns = ROOT.RDataFrame(fChain).AsNumpy(found)
+    runs = dict.fromkeys(branches)
+    for branch in found:
+        col = columns[branch]
+        runs[branch] = ak.Array([np.asarray(vals) for vals in col]) if col.dtype == object else col
+    return runs, nentries
+
+
+def get_sumw_fills(runs, nentries):
+    """Bins and weights filled for each run, in the same order as one Fill per value"""
+    LHESCALE, PDF, ALPHAZ = 1, 10, 12
+    sumW = np.full(nentries, -1.) if runs["genEventSumw"] is None else ak.to_numpy(runs["genEventSumw"])
+    bins = [ak.unflatten(np.zeros(nentries), 1)]
+    weights = [ak.unflatten(sumW, 1)]
+    if (scale := runs["LHEScaleSumw"]) is not None:
+        bins.append(ak.local_index(scale) + LHESCALE)
+        weights.append(scale*sumW)
+    if (pdf_sumw := runs["LHEPdfSumw"]) is not None:
+        counts = ak.to_numpy(ak.num(pdf_sumw))
+        envelope = counts >= 101
+        pdf_weights = np.empty((0, 2))
+        if np.any(envelope):
+            pdf = np.partition(ak.to_numpy(pdf_sumw[envelope][:, :101]), [15, 50, 85], axis=1)
+            err = (pdf[:, 85] - pdf[:, 15])/2
+            pdf_weights = np.stack([(pdf[:, 50]-err)*sumW[envelope], (pdf[:, 50]+err)*sumW[envelope]], axis=1)
+        num_fill = np.where(envelope, 2, 0)
+        bins.append(ak.unflatten(np.tile([PDF, PDF+1], np.count_nonzero(envelope)), num_fill))
+        weights.append(ak.unflatten(pdf_weights.reshape(-1), num_fill))
+        # Alpha Z sumweight
+        alpha = ak.to_numpy(ak.fill_none(ak.pad_none(pdf_sumw, 103, clip=True)[:, 101:103], 0.))
+        alpha_weights = np.where((counts == 103)[:, None], alpha*sumW[:, None], sumW[:, None])
+        bins.append(ak.unflatten(np.tile([ALPHAZ, ALPHAZ+1], nentries), 2))
+        weights.append(ak.unflatten(alpha_weights.reshape(-1), 2))
+    bins = ak.to_numpy(ak.flatten(ak.concatenate(bins, axis=1))).astype(np.float64)
+    weights = ak.to_numpy(ak.flatten(ak.concatenate(weights, axis=1))).astype(np.float64)
+    return bins, weights
+
+
+def getSumW(infiles):
+    output = ROOT.TH1F('sumweight', 'sumweight', 14, 0, 14)
+    runs, nentries = read_runs(infiles)
+    if nentries > 0:
+        bins, weights = get_sumw_fills(runs, nentries)
+        output.FillN(len(bins), np.ascontiguousarray(bins), np.ascontiguousarray(weights))
     return output
 
 def run_jetmet(infiles, inputs):
@@ -94,28 +131,108 @@ def run_jetmet(infiles, inputs):
                       branchsel=user.analysis_area/'data'/keep_drop_file)
     p.run()
 
-def run_ntuple(analysis, infiles, outfile, inputs):
-    rInputs = setInputs(inputs)
-    if int(args.verbose) > 0:
-        print(yaml.dump(inputs, indent=4, default_flow_style=False))
-
-    # Run Selection
+def get_chain(infiles):
     fChain = ROOT.TChain()
     for fname in infiles:
         fChain.Add(f"{fname}/Events")
+    return fChain
+
 
+def write_selector(selector, anaFolder):
+    for tree in [tree.tree for tree in selector.getTrees()]:
+        anaFolder.WriteObject(tree, tree.GetTitle())
+    for i in selector.GetOutputList():
+        anaFolder.WriteObject(i, i.GetName())
+
+
+def process_range(analysis, infiles, outfile, inputs, first, nentries):
+    """Run the selector over `nentries` entries of the chain starting at `first`
+
+    The trees and output list are written to `outfile` (without the sumweight).
+    Returns the name of the output directory of the selector
+    """
+    rInputs = setInputs(inputs)
+    fChain = get_chain(infiles)
     selector = getattr(ROOT, analysis)()
-    with rOpen(outfile, "RECREATE") as rOutput:
+    with rOpen(str(outfile), "RECREATE") as rOutput:
         selector.SetInputList(rInputs)
         selector.setOutputFile(rOutput)
-        fChain.Process(selector, "")
-        # Output
+        fChain.Process(selector, "", nentries, first)
         anaFolder = selector.getOutdir()
-        anaFolder.WriteObject(getSumW(files), 'sumweight')
-        for tree in [tree.tree for tree in selector.getTrees()]:
-            anaFolder.WriteObject(tree, tree.GetTitle())
-        for i in selector.GetOutputList():
-            anaFolder.WriteObject(i, i.GetName())
+        write_selector(selector, anaFolder)
+        return anaFolder.GetName()
+
+
+def merge_outputs(partials, outfile, sumweight, group):
+    """Merge the outputs of `process_range` in order into `outfile`
+
+    Trees are concatenated in the order of the partial files, so the events
+    are in the same order as a single job. Histograms are added and the other
+    objects (systematic lists) are taken from the first file. `group` is the
+    output directory of the selector
+    """
+    rFiles = [ROOT.TFile(str(partial)) for partial in partials]
+    keys = [(key.GetName(), key.GetClassName()) for key in rFiles[0].Get(group).GetListOfKeys()]
+    with rOpen(outfile, "RECREATE") as rOutput:
+        anaFolder = rOutput.mkdir(group)
+        anaFolder.WriteObject(sumweight, 'sumweight')
+        anaFolder.cd()
+        merged = dict()
+        for name, classname in keys:
+            if name in merged:
+                continue
+            if ROOT.TClass.GetClass(classname).InheritsFrom("TTree"):
+                chain = ROOT.TChain(f"{group}/{name}")
+                for partial in partials:
+                    chain.Add(str(partial))
+                merged[name] = chain.CloneTree(-1, "fast")
+            elif ROOT.TClass.GetClass(classname).InheritsFrom("TH1"):
+                merged[name] = rFiles[0].Get(f"{group}/{name}").Clone()
+                merged[name].SetDirectory(0)
+                for f in rFiles[1:]:
+                    if (hist := f.Get(f"{group}/{name}")):
+                        merged[name].Add(hist)
+            else:
+                merged[name] = rFiles[0].Get(f"{group}/{name}")
+        for name, _ in keys:
+            anaFolder.WriteObject(merged[name], name)
+    for f in rFiles:
+        f.Close()
+
+
+def run_ntuple(analysis, infiles, outfile, inputs, cores=1, verbose=-1):
+    if int(verbose) > 0:
+        print(yaml.dump(inputs, indent=4, default_flow_style=False))
+
+    # Run Selection
+    nentries = get_chain(infiles).GetEntries()
+    if cores == 1 or inputs["NEvents"] > 0 or nentries < cores:
+        rInputs = setInputs(inputs)
+        fChain = get_chain(infiles)
+        selector = getattr(ROOT, analysis)()
+        with rOpen(outfile, "RECREATE") as rOutput:
+            selector.SetInputList(rInputs)
+            selector.setOutputFile(rOutput)
+            fChain.Process(selector, "")
+            # Output
+            anaFolder = selector.getOutdir()
+            anaFolder.WriteObject(getSumW(infiles), 'sumweight')
+            write_selector(selector, anaFolder)
+        return
+
+    # Split the chain in entry ranges run by independent selectors. The workers
+    # are spawned, so they don't inherit the files and ROOT state of this process
+    bounds = np.linspace(0, nentries, cores+1).astype(int)
+    partials = [Path(outfile).with_suffix(f".part{i}.root") for i in range(cores)]
+    jobs = [(analysis, infiles, partial, inputs, first, last-first)
+            for partial, first, last in zip(partials, bounds[:-1], bounds[1:])]
+    try:
+        with mp.get_context("spawn").Pool(cores) as pool:
+            groups = pool.starmap(process_range, jobs)
+        merge_outputs(partials, outfile, getSumW(infiles), groups[0])
+    finally:
+        for partial in partials:
+            partial.unlink(missing_ok=True)
 
 
 if __name__ == "__main__":
@@ -162,7 +279,7 @@ if __name__ == "__main__":
     # if analysis == "ThreeTop":
     #     run_jetmet(files, inputs)
         # files = [Path(f.replace(".root", "_Skim.root")).name for f in files]
-    run_ntuple(analysis, files, outputfile, inputs)
+    run_ntuple(analysis, files, outputfile, inputs, args.cores, args.verbose)
     # # Remove skimmed file if done
     # if analysis == "ThreeTop":
     #     for f in files:
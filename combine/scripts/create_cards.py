@@ -46,7 +46,8 @@ def split_hists(hists, systname, year, chan):
                     out_name = syst.get_name(year, with_lowess=False)
                     yield f'{out_name}_{updown}', group, hist
 
-def get_hists(infile, systs, workdir, ntuple_name, region, year, unblind):
+def get_hists(infile, systs, workdir, ntuple_name, region, year, unblind, hist_cache=False, cutflow_dir=None,
+              column_cache=False):
     ntuple = get_ntuple(*ntuple_name)
     ntuple.remove_group("nonprompt_mc")
     if not unblind:
@@ -62,7 +63,9 @@ def get_hists(infile, systs, workdir, ntuple_name, region, year, unblind):
         mask = lambda vg: vg['BDT'] > cut[year]
 
     hist_factory = HistGetter(ntuple, year, region=region, filename=infile,
-                                workdir=workdir, scales=['btag_jetlep', 'wz', 'theory_rescale'], mask=mask)
+                                workdir=workdir, scales=['btag_jetlep', 'wz', 'theory_rescale'], mask=mask,
+                                hist_cache=hist_cache, cutflow=cutflow_dir is not None,
+                                column_cache=column_cache)
     systs = hist_factory.systs if systs is None else systs
     for syst in systs:
         if "data" in str(infile) and syst != "Nominal":
@@ -75,6 +78,9 @@ def get_hists(infile, systs, workdir, ntuple_name, region, year, unblind):
             if systname not in syst_hists:
                 syst_hists[systname] = {}
             syst_hists[systname][group] = hist
+    if cutflow_dir is not None:
+        syst_name = f"_{'_'.join(systs)}" if systs is not None else ""
+        hist_factory.write_cutflow(cutflow_dir, f'cutflow_{region}_{year}_{infile.stem}{syst_name}')
     return {f'{region}-{year}': syst_hists}
 
 
@@ -212,11 +218,18 @@ if __name__ == "__main__":
     parser.add_argument('--skip', action='store_true')
     parser.add_argument("-j", '--cores', default=1, type=int)
     parser.add_argument("-t", '--extra_text', default="")
+    parser.add_argument('--cutflow', action='store_true',
+                        help="Write the yield and time of each cut and mask next to the logs")
+    parser.add_argument('--hist_cache', action='store_true',
+                        help="Keep the histograms on disk and reuse them when rerunning with the same inputs")
+    parser.add_argument('--column_cache', action='store_true',
+                        help="Keep the decompressed branches in the scratch area to speed up reruns")
     args = parser.parse_args()
 
     combine_dir = args.workdir/"combine"/args.extra_text
     combine_dir.mkdir(exist_ok=True, parents=True)
     (combine_dir/'plots').mkdir(exist_ok=True, parents=True)
+    cutflow_dir = combine_dir/'plots' if args.cutflow else None
     runCombine.work_dir = combine_dir
 
     combine_info = get_inputs(args.workdir, 'combine_info')
@@ -236,9 +249,11 @@ if __name__ == "__main__":
                 for filename in file_dir.glob(info['glob']):
                     if 'Nominal' in filename.name and args.cores > 1:
                         for syst in nom_systs:
-                            hist_inputs.append((filename, [syst], args.workdir, ntuple_name, region, year, args.unblind))
+                            hist_inputs.append((filename, [syst], args.workdir, ntuple_name, region, year, args.unblind,
+                                                args.hist_cache, cutflow_dir, args.column_cache))
                     else:
-                        hist_inputs.append((filename, None, args.workdir, ntuple_name, region, year, args.unblind))
+                        hist_inputs.append((filename, None, args.workdir, ntuple_name, region, year, args.unblind,
+                                            args.hist_cache, cutflow_dir, args.column_cache))
 
         if args.cores == 1:
             file_hists = [get_hists(*input) for input in hist_inputs]
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+import numpy as np
+import pandas as pd
+
+
+class ColumnBuilder:
+    """Accumulates tables chunk by chunk as numpy columns
+
+    Appending only keeps a reference to each chunk, the columns are
+    concatenated once when the table is built. Columns missing from a chunk
+    are filled with NaN, like `pd.concat` does.
+
+    Attributes
+    ----------
+    nrows : int
+        Number of rows appended so far
+    """
+
+    def __init__(self):
+        self.nrows = 0
+        self._chunks = []
+        self._columns = dict()
+        self._built = None
+
+    def __len__(self):
+        return self.nrows
+
+    def __bool__(self):
+        return self.nrows > 0
+
+    @property
+    def columns(self):
+        return list(self._columns.keys())
+
+    def append(self, arrays, front=False):
+        """Add a chunk of rows
+
+        Parameters
+        ----------
+        arrays : dict or pandas.DataFrame
+            Column name to array, all arrays need the same length
+        front : bool, optional
+            Put the rows before the ones already added
+        """
+        if isinstance(arrays, pd.DataFrame):
+            arrays = {col: arrays[col].to_numpy() for col in arrays.columns}
+        else:
+            arrays = {col: np.asarray(arr) for col, arr in arrays.items()}
+        lengths = {len(arr) for arr in arrays.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Columns have different lengths: {lengths}")
+        nrows = lengths.pop() if lengths else 0
+        for col in arrays:
+            self._columns.setdefault(col, None)
+        if front:
+            self._chunks.insert(0, (nrows, arrays))
+        else:
+            self._chunks.append((nrows, arrays))
+        self.nrows += nrows
+        self._built = None
+
+    def extend(self, other, front=False):
+        """Add all the chunks of another builder"""
+        for nrows, arrays in (reversed(other._chunks) if front else other._chunks):
+            self.append(arrays, front=front)
+
+    def build(self):
+        """Concatenate the chunks into one array per column
+
+        Returns
+        -------
+        dict
+            Column name to numpy array of length `nrows`
+        """
+        if self._built is not None:
+            return self._built
+        output = {}
+        for col in self._columns:
+            parts = []
+            for nrows, arrays in self._chunks:
+                if col in arrays:
+                    parts.append(arrays[col])
+                else:
+                    parts.append(np.full(nrows, np.nan))
+            output[col] = np.concatenate(parts) if parts else np.array([])
+        self._chunks = [(self.nrows, output)]
+        self._built = output
+        return output
+
+    def to_pandas(self):
+        return pd.DataFrame(self.build())
+
+    def write(self, outfile, name, index=True):
+        """Write the columns as a tree in an uproot file
+
+        Parameters
+        ----------
+        outfile : uproot.WritableDirectory
+            File opened with uproot.recreate
+        name : string
+            Name of the tree
+        index : bool, optional
+            Add an `index` branch like uproot does when writing a DataFrame
+        """
+        arrays = self.build()
+        if index:
+            arrays = {"index": np.arange(self.nrows), **arrays}
+        outfile[name] = arrays
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import logging
+import os
+import shutil
+import uuid
+import awkward as ak
+import numpy as np
+
+import analysis_suite.commons.user as user
+from .disk_cache import DiskCache
+
+
+class ColumnCache(DiskCache):
+    """On disk cache of decompressed branches
+
+    Each column is stored in its own directory as the awkward form and one
+    `.npy` file per buffer, so a hit is loaded memory mapped (copy on write)
+    without decompressing the ROOT file again. Entries are keyed on the
+    file UUID, size and modification time, the tree path, the branch and
+    the entry range. When the cache goes over `max_size` the least recently
+    used columns are removed (see `DiskCache`).
+    """
+
+    def __init__(self, path, max_size=50*1024**3):
+        super().__init__(path, max_size)
+
+    def key(self, tree, branch, entry_start, entry_stop):
+        filename = tree.file.file_path
+        try:
+            stats = os.stat(filename)
+            file_id = (stats.st_size, stats.st_mtime)
+        except OSError:
+            file_id = None
+        name = f"{tree.file.uuid}:{filename}:{file_id}:{tree.object_path}:{branch}:{entry_start}:{entry_stop}"
+        return hashlib.sha256(name.encode()).hexdigest()
+
+    def _entry_dir(self, key):
+        return self.path / key[:2] / key
+
+    def load(self, tree, branch, entry_start, entry_stop):
+        """Get a column from the cache, None if it isn't stored"""
+        directory = self._entry_dir(self.key(tree, branch, entry_start, entry_stop))
+        meta = directory / "meta.json"
+        if not meta.exists():
+            return None
+        try:
+            with open(meta) as f:
+                info = json.load(f)
+            container = {name: np.load(directory / f"{i}.npy", mmap_mode='c')
+                         for i, name in enumerate(info["buffers"])}
+            arr = ak.from_buffers(ak.forms.from_json(info["form"]), info["length"], container)
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Removing unreadable cache entry {directory}: {e}")
+            shutil.rmtree(directory, ignore_errors=True)
+            return None
+        self.touch(meta)
+        return arr
+
+    def store(self, tree, branch, entry_start, entry_stop, arr):
+        """Write a column to the cache, evicting old columns if over the size limit"""
+        directory = self._entry_dir(self.key(tree, branch, entry_start, entry_stop))
+        if directory.exists():
+            return
+        form, length, container = ak.to_buffers(ak.Array(arr) if isinstance(arr, np.ndarray) else arr)
+        tmp = directory.with_name(f"{directory.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            tmp.mkdir(parents=True)
+            for i, buffer in enumerate(container.values()):
+                np.save(tmp / f"{i}.npy", np.asarray(buffer))
+            with open(tmp / "meta.json", 'w') as f:
+                json.dump({"form": form.to_json(), "length": length, "buffers": list(container.keys()),
+                           "branch": branch}, f)
+            size = sum(path.stat().st_size for path in tmp.iterdir())
+            os.rename(tmp, directory)
+        except OSError as e:
+            logging.warning(f"Could not write {branch} to the column cache: {e}")
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        self.added(size)
+
+    def get_entries(self):
+        entries = []
+        for meta in self.path.glob("*/*/meta.json"):
+            try:
+                size = sum(path.stat().st_size for path in meta.parent.iterdir())
+                entries.append((meta.stat().st_mtime, size, meta.parent))
+            except OSError:
+                continue
+        return entries
+
+
+_column_cache = False
+
+
+def get_column_cache():
+    """Shared cache in the user scratch area, None if it can't be used"""
+    global _column_cache
+    if _column_cache is False:
+        try:
+            _column_cache = ColumnCache(user.scratch_area / "column_cache")
+        except OSError:
+            _column_cache = None
+    return _column_cache
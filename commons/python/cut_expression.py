@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""Compiler for cut strings
+
+Cut strings are written with the variables of a getter, eg
+`NJets >= 2 && (abs(l1Eta) < 2.1 || !passZVeto) && HT - Met > 200`,
+supporting `&&`, `||`, `!`, comparisons, `+ - * /`, parentheses and `abs`.
+Each string is parsed once. With numexpr installed the whole expression is
+evaluated as one multi-threaded kernel, otherwise it is evaluated with
+numpy, computing repeated subexpressions only once.
+"""
+import re
+from functools import lru_cache
+import awkward as ak
+import numpy as np
+
+try:
+    import numexpr
+    has_numexpr = True
+except ImportError:
+    has_numexpr = False
+
+token_re = re.compile(r"\s*(?:(\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)|([A-Za-z_]\w*)"
+                      r"|(&&|\|\||==|!=|<=|>=|[<>!()+\-*/]))")
+
+compare_ops = {"<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal,
+               "==": np.equal, "!=": np.not_equal}
+arith_ops = {"+": np.add, "-": np.subtract, "*": np.multiply, "/": np.true_divide}
+numexpr_ops = {"&&": "&", "||": "|"}
+
+
+def tokenize(expr):
+    tokens = []
+    pos = 0
+    expr = expr.strip()
+    while pos < len(expr):
+        match = token_re.match(expr, pos)
+        if match is None or match.end() == pos:
+            raise ValueError(f"Cannot parse '{expr}' at '{expr[pos:]}'")
+        number, name, op = match.groups()
+        if number is not None:
+            tokens.append(("num", float(number)))
+        elif name is not None:
+            tokens.append(("var", name))
+        else:
+            tokens.append(("op", op))
+        pos = match.end()
+    return tokens
+
+
+class Parser:
+    """Recursive descent parser turning tokens into a tree of tuples
+
+    Nodes are ("num", value), ("var", name), ("abs", node), ("neg", node),
+    ("not", node) or (op, left, right), so equal subexpressions are equal
+    tuples.
+    """
+
+    def __init__(self, expr):
+        self.expr = expr
+        self.tokens = tokenize(expr)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, op=None):
+        token = self.peek()
+        if token[0] is None:
+            raise ValueError(f"Unexpected end of '{self.expr}'")
+        elif op is not None and token != ("op", op):
+            raise ValueError(f"Expected '{op}' in '{self.expr}'")
+        self.pos += 1
+        return token
+
+    def parse(self):
+        node = self.parse_or()
+        if self.pos != len(self.tokens):
+            raise ValueError(f"Unexpected '{self.peek()[1]}' in '{self.expr}'")
+        return node
+
+    def parse_binary(self, ops, parse_next):
+        node = parse_next()
+        while self.peek()[0] == "op" and self.peek()[1] in ops:
+            op = self.take()[1]
+            node = (op, node, parse_next())
+        return node
+
+    def parse_or(self):
+        return self.parse_binary(["||"], self.parse_and)
+
+    def parse_and(self):
+        return self.parse_binary(["&&"], self.parse_not)
+
+    def parse_not(self):
+        if self.peek() == ("op", "!"):
+            self.take()
+            return ("not", self.parse_not())
+        return self.parse_compare()
+
+    def parse_compare(self):
+        node = self.parse_arith()
+        if self.peek()[0] == "op" and self.peek()[1] in compare_ops:
+            op = self.take()[1]
+            node = (op, node, self.parse_arith())
+        return node
+
+    def parse_arith(self):
+        return self.parse_binary(["+", "-"], self.parse_term)
+
+    def parse_term(self):
+        return self.parse_binary(["*", "/"], self.parse_unary)
+
+    def parse_unary(self):
+        if self.peek() == ("op", "-"):
+            self.take()
+            return ("neg", self.parse_unary())
+        return self.parse_atom()
+
+    def parse_atom(self):
+        kind, value = self.take()
+        if kind == "num":
+            return ("num", value)
+        elif kind == "var" and value == "abs":
+            self.take("(")
+            node = self.parse_or()
+            self.take(")")
+            return ("abs", node)
+        elif kind == "var":
+            return ("var", value)
+        elif value == "(":
+            node = self.parse_or()
+            self.take(")")
+            return node
+        raise ValueError(f"Unexpected '{value}' in '{self.expr}'")
+
+
+def get_variables(node):
+    if node[0] == "var":
+        return {node[1]}
+    elif node[0] == "num":
+        return set()
+    return set().union(*[get_variables(child) for child in node[1:]])
+
+
+def is_logical(node):
+    return node[0] in compare_ops or node[0] in ("&&", "||", "not")
+
+
+def to_numexpr_bool(node):
+    if is_logical(node):
+        return to_numexpr(node)
+    return f"({to_numexpr(node)} != 0)"
+
+
+def to_numexpr(node):
+    kind = node[0]
+    if kind == "num":
+        return repr(node[1])
+    elif kind == "var":
+        return node[1]
+    elif kind == "abs":
+        return f"abs({to_numexpr(node[1])})"
+    elif kind == "neg":
+        return f"(-{to_numexpr(node[1])})"
+    elif kind == "not":
+        return f"(~{to_numexpr_bool(node[1])})"
+    elif kind in numexpr_ops:
+        return f"({to_numexpr_bool(node[1])} {numexpr_ops[kind]} {to_numexpr_bool(node[2])})"
+    return f"({to_numexpr(node[1])} {kind} {to_numexpr(node[2])})"
+
+
+def evaluate(node, columns, cache):
+    if node in cache:
+        return cache[node]
+    kind = node[0]
+    if kind == "num":
+        return node[1]
+    elif kind == "var":
+        value = columns[node[1]]
+    elif kind == "abs":
+        value = np.abs(evaluate(node[1], columns, cache))
+    elif kind == "neg":
+        value = np.negative(evaluate(node[1], columns, cache))
+    elif kind == "not":
+        value = np.logical_not(evaluate(node[1], columns, cache))
+    elif kind == "&&":
+        value = np.logical_and(evaluate(node[1], columns, cache), evaluate(node[2], columns, cache))
+    elif kind == "||":
+        value = np.logical_or(evaluate(node[1], columns, cache), evaluate(node[2], columns, cache))
+    else:
+        ops = compare_ops if kind in compare_ops else arith_ops
+        value = ops[kind](evaluate(node[1], columns, cache), evaluate(node[2], columns, cache))
+    cache[node] = value
+    return value
+
+
+class CutExpression:
+    """Compiled cut string, called with a getter to give the event mask
+
+    Attributes
+    ----------
+    expr : string
+        Original cut string
+    variables : list of string
+        Variables read from the getter
+    """
+
+    def __init__(self, expr):
+        self.expr = expr
+        self.tree = Parser(expr).parse()
+        self.variables = sorted(get_variables(self.tree))
+        self.numexpr_string = to_numexpr_bool(self.tree)
+
+    def __repr__(self):
+        return f"CutExpression('{self.expr}')"
+
+    def __call__(self, vg):
+        columns = {var: ak.to_numpy(vg[var]) for var in self.variables}
+        if has_numexpr:
+            columns = {var: arr.astype(np.int32) if arr.dtype == bool else arr for var, arr in columns.items()}
+            return numexpr.evaluate(self.numexpr_string, local_dict=columns)
+        return np.asarray(evaluate(self.tree, columns, {}), dtype=bool)
+
+
+@lru_cache(maxsize=None)
+def compile_cut(expr):
+    """Parse a cut string once, returning the same CutExpression for the same string"""
+    return CutExpression(expr)
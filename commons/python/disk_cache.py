@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Size limited on disk cache with least recently used eviction
+
+The column and histogram caches keep their entries as files or
+directories below one directory. The total size is counted once, on the
+first store, and then kept up to date as entries are written, so storing
+doesn't walk the whole cache. Only when the total goes over `max_size`
+are the entries listed and the least recently used removed, down to
+`low_water` of the limit, so the next evictions are many stores away.
+Other processes writing to the same directory are only seen at the next
+eviction.
+"""
+import os
+import shutil
+from pathlib import Path
+
+
+class DiskCache:
+    """Directory of cache entries kept under a maximum size
+
+    Subclasses give the entries with `get_entries`, call `added` with the
+    size of each new entry and `touch` on each hit.
+
+    Attributes
+    ----------
+    path : Path
+        Directory holding the cache
+    max_size : int
+        Size in bytes above which old entries are evicted
+    low_water : float
+        Fraction of `max_size` the cache is brought down to when evicting
+    total : int
+        Running size of the cache in bytes, None until first needed
+    """
+
+    def __init__(self, path, max_size, low_water=0.8):
+        self.path = Path(path)
+        self.max_size = max_size
+        self.low_water = low_water
+        self.total = None
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def get_entries(self):
+        """List of (last use time, size, path) of every entry"""
+        raise NotImplementedError
+
+    def touch(self, path):
+        """Mark an entry as used"""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def remove(self, path):
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
+
+    def added(self, size):
+        """Count a new entry of `size` bytes, evicting if the cache is over the limit"""
+        if self.total is None:
+            self.total = sum(size for _, size, _ in self.get_entries())
+        else:
+            self.total += size
+        if self.total > self.max_size:
+            self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache is under `low_water` of `max_size`"""
+        entries = sorted(self.get_entries(), key=lambda entry: entry[0])
+        self.total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self.total <= self.low_water*self.max_size:
+                break
+            self.remove(path)
+            self.total -= size
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Process wide decompression pool and open ROOT files
+
+Every reader in a process shares one decompression executor, sized by the
+thread budget, and opens its files through one FileManager, which keeps at
+most `max_open` files open and closes the least recently used one when
+another is opened. With `run_suite.py -j N` the budget is split between
+the N processes, so the number of threads stays bounded.
+"""
+import os
+import threading
+from collections import OrderedDict
+import uproot
+
+from .prefetcher import open_root
+
+thread_budget = os.cpu_count() or 1
+_executor = None
+_file_manager = None
+_lock = threading.Lock()
+
+
+def set_thread_budget(nthreads):
+    """Set the number of decompression threads of this process
+
+    The next `get_executor` call makes an executor of the new size. An
+    existing one is only dropped, not shut down, as files opened before may
+    still hold it; readers take `get_executor()` on each read, so they move
+    to the new one.
+    """
+    global thread_budget, _executor
+    with _lock:
+        thread_budget = max(1, int(nthreads))
+        if _executor is not None and _executor.num_workers != thread_budget:
+            _executor = None
+
+
+def get_executor():
+    """Decompression executor shared by the whole process
+
+    Ask for it on each read rather than keeping it, as `set_thread_budget`
+    replaces it.
+    """
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = uproot.ThreadPoolExecutor(thread_budget)
+        return _executor
+
+
+class FileManager:
+    """LRU of open ROOT files
+
+    Files are opened with the shared executor. Once more than `max_open`
+    files are open, the least recently used is closed: trees from it must
+    be asked for again through `open` (NtupleGetter does this when its
+    file was closed). Readers going over the same files many times (eg
+    HistGetter filling each graph) should `reserve` room for all of them,
+    or each pass closes and reopens every file.
+
+    Attributes
+    ----------
+    max_open : int
+        Number of files kept open
+    files : OrderedDict
+        Path to open file, most recently used last
+    """
+
+    def __init__(self, max_open=16):
+        self.max_open = max_open
+        self.files = OrderedDict()
+        self.lock = threading.RLock()
+
+    def open(self, path):
+        """Open file at `path`, or give it back if it is already open"""
+        path = str(path)
+        with self.lock:
+            f = self.files.get(path)
+            if f is not None and not f.file.closed:
+                self.files.move_to_end(path)
+                return f
+            f = open_root(path, get_executor())
+            self.files[path] = f
+            while len(self.files) > self.max_open:
+                _, old = self.files.popitem(last=False)
+                old.close()
+            return f
+
+    def reserve(self, nfiles):
+        """Keep at least `nfiles` files open"""
+        with self.lock:
+            self.max_open = max(self.max_open, nfiles)
+
+    def close(self, path=None):
+        """Close one file, or all of them if `path` isn't given"""
+        with self.lock:
+            paths = list(self.files) if path is None else [str(path)]
+            for name in paths:
+                f = self.files.pop(name, None)
+                if f is not None:
+                    f.close()
+
+    def __contains__(self, path):
+        return str(path) in self.files
+
+    def __len__(self):
+        return len(self.files)
+
+
+def get_file_manager():
+    """FileManager shared by the whole process"""
+    global _file_manager
+    with _lock:
+        if _file_manager is None:
+            _file_manager = FileManager()
+        return _file_manager
+
+
+def _reset_after_fork():
+    """Threads and file handles are not shared with forked workers"""
+    global _executor, _file_manager, _lock
+    _lock = threading.Lock()
+    _executor = None
+    _file_manager = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
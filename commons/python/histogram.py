@@ -28,6 +28,8 @@ warnings.simplefilter("ignore", UserWarning)
 from scipy.stats import beta
 
 class Histogram(bh.Histogram):
+    _pending_flow = None
+
     def __init__(self, *args, **kwargs):
         if len(args) == 0:
             axes = (bh.axis.Regular(1, 0, 1),)
@@ -142,18 +144,38 @@ class Histogram(bh.Histogram):
             return vals[1:-1,1:-1]
 
     def fill(self, *args, **kwargs):
+        """Fill the histogram, folding the under/overflow into the edge bins
+
+        With `flow` the under/overflow is dropped instead. With `deferred`
+        the fills accumulate in the flow bins and are folded once by
+        `finalize`, which must be called before the histogram is used.
+        """
         keep_overflow = kwargs.pop('flow', False)
         member = kwargs.pop('member', False)
+        deferred = kwargs.pop('deferred', False)
         if member:
-            wgt = np.array(kwargs['weight'])
-            self.breakdown[member] = [bh_weights(sum(wgt), sum(wgt**2)), len(wgt)]
+            wgt = np.asarray(kwargs['weight'], dtype=float)
+            self.breakdown[member] = [bh_weights(np.sum(wgt), np.dot(wgt, wgt)), len(wgt)]
+        if self._pending_flow is not None and self._pending_flow != keep_overflow:
+            self.finalize()
         super().fill(*args, **kwargs)
-        if not keep_overflow:
+        self._pending_flow = keep_overflow
+        if not deferred:
+            self.finalize()
+        return self
+
+    def finalize(self):
+        """Fold (or drop with `flow`) the under/overflow left by deferred fills"""
+        if self._pending_flow is None:
+            return self
+        if not self._pending_flow:
             self.values(flow=True)[:] = np.pad(self.vals, 1)
             self.variances(flow=True)[:] = np.pad(self.sumw2, 1)
         else:
             self.values(flow=True)[:] = np.pad(self.values(flow=False)[:], 1)
             self.variances(flow=True)[:] = np.pad(self.variances()[:], 1)
+        self._pending_flow = None
+        return self
 
     def get_name(self):
         name = f'${self.plot_label}$' if '\\' in self.plot_label else self.plot_label
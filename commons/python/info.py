@@ -4,6 +4,7 @@ import re
 from dataclasses import dataclass, field
 from typing import  Callable
 from pathlib import Path
+from types import MappingProxyType
 import logging
 
 from analysis_suite.data.FileInfo import info as finfo
@@ -13,6 +14,10 @@ class GroupInfo:
     def __init__(self, group2color=None, keep_dd_data=False, **kwargs):
         self.group2color = group2color if group2color is not None else {}
         self.group2MemberMap = self.get_memberMap(keep_dd_data)
+        self.member2group = dict()
+        for group, members in self.group2MemberMap.items():
+            for member in members:
+                self.member2group.setdefault(member, group)
 
     def get_groups(self):
         return list(self.group2color.keys())
@@ -67,10 +72,7 @@ class GroupInfo:
         return np.concatenate(list(groups.values()))
 
     def get_group(self, member):
-        for group, members in self.group2MemberMap.items():
-            if member in members:
-                return group
-        return None
+        return self.member2group.get(member, None)
 
     def is_data_driven(self, group):
         if "DataDriven" not in ginfo[group]:
@@ -80,10 +82,13 @@ class GroupInfo:
 class FileInfo:
     def __init__(self):
         self.dasNames = None
+        self.dasPatterns = None
+        self.alias_cache = dict()
 
     def get_group(self, splitname):
         if self.dasNames is None:
             self.dasNames = {key: info["DAS"] for key, info in finfo.items()}
+            self.dasPatterns = [(name, re.compile(reName)) for name, reName in self.dasNames.items()]
 
         if isinstance(splitname, str) and splitname in self.dasNames:
             return self.dasNames[splitname]
@@ -91,10 +96,11 @@ class FileInfo:
             return 'data'
 
         sample_name = next(filter(lambda x: "13TeV" in x, splitname), None)
-        for name, reName in self.dasNames.items():
-            if re.match(reName, sample_name) is not None:
-                return name
-        return None
+        if sample_name not in self.alias_cache:
+            self.alias_cache[sample_name] = next(
+                (name for name, pattern in self.dasPatterns if pattern.match(sample_name) is not None),
+                None)
+        return self.alias_cache[sample_name]
 
     def get_info(self, alias):
         return finfo[alias]
@@ -120,6 +126,46 @@ class FileInfo:
 
 fileInfo = FileInfo()
 
+
+class GroupLookup:
+    """Precomputed member to group tables for an NtupleInfo
+
+    Built once from the configuration and read-only afterwards: the NtupleInfo
+    makes a new one whenever its groups or tree assignments change.
+
+    Attributes
+    ----------
+    member_groups : mapping
+        (member, keep_dd) to the first group holding that member
+    tree_groups : mapping
+        (member, tree, keep_dd) to the group used for that member in that tree
+    data_driven : frozenset
+        Groups that are data driven
+    """
+
+    def __init__(self, ntuple):
+        member_groups = dict()
+        tree_groups = dict()
+        for keep_dd in (True, False):
+            info = ntuple.get_info(keep_dd_data=keep_dd)
+            for member, group in info.member2group.items():
+                member_groups[(member, keep_dd)] = group
+            for group, members in info.group2MemberMap.items():
+                for member in members:
+                    for tree in list(ntuple.trees) + [None]:
+                        if (member, tree, keep_dd) not in tree_groups and ntuple.pass_group(tree, group):
+                            tree_groups[(member, tree, keep_dd)] = group
+        self.member_groups = MappingProxyType(member_groups)
+        self.tree_groups = MappingProxyType(tree_groups)
+        self.data_driven = frozenset(group for group, info in ginfo.items() if info.get("DataDriven", False))
+
+    def get_group_name(self, member, tree, keep_dd=True):
+        return self.tree_groups.get((member, tree, keep_dd), None)
+
+    def is_data_driven(self, group):
+        return group in self.data_driven
+
+
 @dataclass
 class NtupleInfo:
     filename: str
@@ -134,8 +180,29 @@ class NtupleInfo:
     tree_groups: dict = field(default_factory=dict)
     group_trees: dict = field(default_factory=dict)
 
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in self.__dataclass_fields__:
+            self.clear_lookup()
+
+    @property
+    def lookup(self):
+        """GroupLookup for this configuration, built on first use"""
+        if self.__dict__.get('_lookup') is None:
+            self.__dict__['_lookup'] = GroupLookup(self)
+        return self.__dict__['_lookup']
+
+    def clear_lookup(self):
+        self.__dict__['_lookup'] = None
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.pop('_lookup', None)
+        return state
+
     def remove_group(self, group):
         self.color_by_group.pop(group, None)
+        self.clear_lookup()
 
     def get_info(self, remove=None, add=None, **kwargs):
         color_by_group = self.color_by_group
@@ -148,11 +215,13 @@ class NtupleInfo:
         return GroupInfo(color_by_group, **kwargs)
 
     def get_group_name(self, member, tree, keep_dd=True):
-        info = self.get_info(keep_dd_data=keep_dd)
-        for group, members in info.group2MemberMap.items():
-            if member in members and self.pass_group(tree, group):
-                return group
-        return None
+        if tree is not None and tree not in self.trees:
+            info = self.get_info(keep_dd_data=keep_dd)
+            for group, members in info.group2MemberMap.items():
+                if member in members and self.pass_group(tree, group):
+                    return group
+            return None
+        return self.lookup.get_group_name(member, tree, keep_dd)
 
     def get_file(self, **kwargs):
         return Path(str(self.filename).format(**kwargs))
@@ -183,6 +252,7 @@ class NtupleInfo:
             self.tree_groups[tree] = groups
         for group in groups:
             self.group_trees[group] = trees
+        self.clear_lookup()
 
     def pass_group(self, tree, group):
         if tree is None:
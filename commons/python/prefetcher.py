@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+import os
+import queue
+import threading
+import uproot
+
+
+def advise_willneed(path):
+    """Ask the kernel to start reading a whole file into the page cache (no-op if unsupported)"""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def open_root(path, executor=None):
+    """Open a ROOT file and read the metadata of all its trees
+
+    The file is also read ahead into the page cache, so the baskets are
+    (at least partially) local by the time they are decompressed
+    """
+    advise_willneed(path)
+    f = uproot.open(path, decompression_executor=executor)
+    for key, classname in f.classnames(recursive=True, cycle=False).items():
+        if classname == "TTree":
+            f[key]
+    return f
+
+
+class FilePrefetcher:
+    """Iterate over files while the next ones are opened on a background thread
+
+    At most `depth` files are opened ahead of the one being used, so the
+    memory held stays bounded. Exceptions raised while opening a file are
+    raised again when the iteration reaches that file.
+
+    Parameters
+    ----------
+    paths : iterable
+        Files to open, in order
+    open_file : callable
+        Function opening a file (eg `open_root`)
+    depth : int
+        Number of files opened ahead
+    """
+
+    def __init__(self, paths, open_file=open_root, depth=1):
+        self.paths = list(paths)
+        self.open_file = open_file
+        self.queue = queue.Queue(maxsize=depth)
+        self.stop = threading.Event()
+        self.thread = None
+
+    def _work(self):
+        for path in self.paths:
+            try:
+                item = (path, self.open_file(path), None)
+            except Exception as e:
+                item = (path, None, e)
+            while not self.stop.is_set():
+                try:
+                    self.queue.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            if self.stop.is_set():
+                return
+
+    def __iter__(self):
+        self.thread = threading.Thread(target=self._work, daemon=True)
+        self.thread.start()
+        try:
+            for _ in self.paths:
+                path, f, error = self.queue.get()
+                if error is not None:
+                    raise error
+                yield path, f
+        finally:
+            self.close()
+
+    def close(self):
+        self.stop.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
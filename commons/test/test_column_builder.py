@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+column_builder = pytest.importorskip("analysis_suite.commons.column_builder")
+
+
+def chunks():
+    rng = np.random.default_rng(2)
+    return [pd.DataFrame({"HT": rng.uniform(0, 1000, 4), "NJets": rng.integers(0, 8, 4).astype(float)}),
+            pd.DataFrame({"HT": rng.uniform(0, 1000, 3)}),
+            pd.DataFrame({"NJets": rng.integers(0, 8, 2).astype(float), "BDT": rng.uniform(0, 1, 2)})]
+
+
+def test_matches_concat():
+    builder = column_builder.ColumnBuilder()
+    for df in chunks():
+        builder.append(df)
+    expected = pd.concat(chunks(), ignore_index=True)
+    assert len(builder) == len(expected) == 9
+    assert builder.columns == list(expected.columns)
+    pd.testing.assert_frame_equal(builder.to_pandas(), expected)
+
+
+def test_front_and_extend():
+    first, second, third = chunks()
+    builder = column_builder.ColumnBuilder()
+    builder.append(second)
+    builder.append(first, front=True)
+    other = column_builder.ColumnBuilder()
+    other.append(third)
+    builder.extend(other)
+    pd.testing.assert_frame_equal(builder.to_pandas()[["HT", "NJets"]],
+                                  pd.concat([first, second, third], ignore_index=True)[["HT", "NJets"]])
+
+    front = column_builder.ColumnBuilder()
+    front.append({"HT": np.array([1.])})
+    front.extend(builder, front=True)
+    assert np.array_equal(front.build()["HT"][-2:], [np.nan, 1.], equal_nan=True)
+
+
+def test_append_after_build():
+    builder = column_builder.ColumnBuilder()
+    assert not builder
+    builder.append({"HT": [1., 2.]})
+    built = builder.build()
+    assert builder.build() is built
+    builder.append({"HT": [3.]})
+    assert np.array_equal(builder.build()["HT"], [1., 2., 3.])
+
+
+def test_different_lengths():
+    with pytest.raises(ValueError):
+        column_builder.ColumnBuilder().append({"HT": [1., 2.], "NJets": [1.]})
+
+
+def test_write_adds_index():
+    builder = column_builder.ColumnBuilder()
+    builder.append({"HT": [1., 2.]})
+    outfile = {}
+    builder.write(outfile, "ttt")
+    assert list(outfile["ttt"]) == ["index", "HT"]
+    assert np.array_equal(outfile["ttt"]["index"], [0, 1])
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("awkward")
+cut_expression = pytest.importorskip("analysis_suite.commons.cut_expression")
+
+exprs = [
+    "NJets >= 2 && (abs(l1Eta) < 2.1 || !passZVeto) && HT - Met > 200",
+    "NJets > 1 || HT > 500 && Met < 50",
+    "!passZVeto && -l1Eta*2 > 1 || HT/NJets >= 150",
+    "abs(l1Eta - 0.5) < 1 && abs(l1Eta - 0.5) > 0.2",
+    "1.5e2 < HT - 2*Met",
+]
+
+
+class Columns(dict):
+    """Columns of a getter counting how often each is read"""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.reads = {}
+
+    def __getitem__(self, key):
+        self.reads[key] = self.reads.get(key, 0) + 1
+        return super().__getitem__(key)
+
+
+@pytest.fixture
+def vg():
+    rng = np.random.default_rng(11)
+    nevents = 500
+    return Columns({"NJets": rng.integers(1, 8, nevents), "HT": rng.uniform(0, 1000, nevents),
+                    "Met": rng.uniform(0, 200, nevents), "l1Eta": rng.uniform(-2.5, 2.5, nevents),
+                    "passZVeto": rng.random(nevents) > 0.3})
+
+
+def test_precedence():
+    parse = lambda expr: cut_expression.Parser(expr).parse()
+    a, b, c = ("var", "a"), ("var", "b"), ("var", "c")
+    assert parse("a || b && c") == ("||", a, ("&&", b, c))
+    assert parse("(a || b) && c") == ("&&", ("||", a, b), c)
+    assert parse("!a > 1") == ("not", (">", a, ("num", 1.)))
+    assert parse("a - b - c") == ("-", ("-", a, b), c)
+    assert parse("-a*b + c") == ("+", ("*", ("neg", a), b), c)
+
+
+def test_bad_expressions():
+    for expr in ["HT >", "HT $ 2", "(HT > 2", "HT > 2)"]:
+        with pytest.raises(ValueError):
+            cut_expression.CutExpression(expr)
+
+
+def test_repeated_subexpressions_computed_once(vg):
+    tree = cut_expression.Parser(exprs[3]).parse()
+    cache = {}
+    cut_expression.evaluate(tree, vg, cache)
+    assert vg.reads == {"l1Eta": 1}
+    assert sum(node[0] == "abs" for node in cache) == 1
+
+
+@pytest.mark.parametrize("expr", exprs)
+def test_matches_python(vg, expr, monkeypatch):
+    monkeypatch.setattr(cut_expression, "has_numexpr", False)
+    njets, ht, met, eta, zveto = [vg[var] for var in ("NJets", "HT", "Met", "l1Eta", "passZVeto")]
+    expected = [
+        (njets >= 2) & ((np.abs(eta) < 2.1) | ~zveto) & (ht - met > 200),
+        (njets > 1) | ((ht > 500) & (met < 50)),
+        (~zveto & (-eta*2 > 1)) | (ht/njets >= 150),
+        (np.abs(eta - 0.5) < 1) & (np.abs(eta - 0.5) > 0.2),
+        150 < ht - 2*met,
+    ][exprs.index(expr)]
+    assert np.array_equal(cut_expression.CutExpression(expr)(vg), expected)
+
+
+@pytest.mark.parametrize("expr", exprs)
+def test_numexpr_matches_numpy(vg, expr, monkeypatch):
+    pytest.importorskip("numexpr")
+    cut = cut_expression.CutExpression(expr)
+    monkeypatch.setattr(cut_expression, "has_numexpr", True)
+    with_numexpr = cut(vg)
+    monkeypatch.setattr(cut_expression, "has_numexpr", False)
+    assert np.array_equal(with_numexpr, cut(vg))
+
+
+def test_compiled_once():
+    assert cut_expression.compile_cut("HT > 200") is cut_expression.compile_cut("HT > 200")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+import os
+import pytest
+
+np = pytest.importorskip("numpy")
+ak = pytest.importorskip("awkward")
+disk_cache = pytest.importorskip("analysis_suite.commons.disk_cache")
+column_cache = pytest.importorskip("analysis_suite.commons.column_cache")
+
+
+class FileCache(disk_cache.DiskCache):
+    """Cache of plain files counting how often the entries are listed"""
+    listed = 0
+
+    def get_entries(self):
+        self.listed += 1
+        return [(path.stat().st_mtime, path.stat().st_size, path) for path in self.path.glob("*.bin")]
+
+    def store(self, i, size):
+        path = self.path / f"{i}.bin"
+        path.write_bytes(b"0"*size)
+        os.utime(path, (i, i))
+        self.added(size)
+        return path
+
+
+def test_eviction_is_amortized(tmp_path):
+    cache = FileCache(tmp_path, max_size=1000)
+    first = cache.store(0, 100)
+    for i in range(1, 10):
+        cache.store(i, 100)
+    assert cache.listed == 1
+    assert cache.total == 1000
+
+    cache.touch(first)
+    cache.store(10, 100)
+    assert cache.listed == 2
+    assert cache.total == 800
+    assert sorted(int(path.stem) for path in tmp_path.glob("*.bin")) == [0, 4, 5, 6, 7, 8, 9, 10]
+
+
+class FakeTree:
+    def __init__(self, path):
+        self.file = type("FakeFile", (), {"file_path": str(path), "uuid": "0123"})()
+        self.object_path = "/ttt/Signal"
+
+
+def test_column_cache_key(tmp_path):
+    path = tmp_path / "input.root"
+    path.write_bytes(b"0"*10)
+    tree = FakeTree(path)
+    jets = ak.Array([[1., 2.], [], [3.]])
+    cache = column_cache.ColumnCache(tmp_path / "cache")
+    assert cache.load(tree, "Jets/pt", 0, 3) is None
+
+    cache.store(tree, "Jets/pt", 0, 3, jets)
+    assert ak.to_list(cache.load(tree, "Jets/pt", 0, 3)) == ak.to_list(jets)
+    assert cache.load(tree, "Jets/pt", 0, 2) is None
+    assert cache.load(tree, "Jets/eta", 0, 3) is None
+
+    path.write_bytes(b"0"*11)
+    assert cache.load(tree, "Jets/pt", 0, 3) is None
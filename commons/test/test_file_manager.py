@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+import pytest
+
+pytest.importorskip("uproot")
+file_manager = pytest.importorskip("analysis_suite.commons.file_manager")
+
+
+@pytest.fixture(autouse=True)
+def budget():
+    before = file_manager.thread_budget
+    yield
+    file_manager.set_thread_budget(before)
+
+
+def test_new_budget_keeps_old_executor_running():
+    file_manager.set_thread_budget(2)
+    old = file_manager.get_executor()
+    file_manager.set_thread_budget(3)
+    new = file_manager.get_executor()
+    assert new is not old and new.num_workers == 3
+    assert old.submit(sum, [1, 2]).result() == 3
+
+
+def test_getters_follow_shared_executor():
+    ntuplegetter = pytest.importorskip("analysis_suite.flatten.ntuplegetter")
+    vg = ntuplegetter.NtupleGetter({}, "Signal", "ttt", 1., file_manager=None)
+    file_manager.set_thread_budget(2)
+    assert vg.executor is file_manager.get_executor()
+    file_manager.set_thread_budget(3)
+    assert vg.executor is file_manager.get_executor()
+    assert ntuplegetter.NtupleGetter({}, "Signal", "ttt", 1., executor=None, file_manager=None).executor is None
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+import pytest
+
+np = pytest.importorskip("numpy")
+bh = pytest.importorskip("boost_histogram")
+histogram = pytest.importorskip("analysis_suite.commons.histogram")
+
+
+def fill_all(fills, deferred, flow):
+    hist = histogram.Histogram(bh.axis.Regular(10, 0, 100))
+    for member, vals, weight in fills:
+        hist.fill(vals, weight=weight, member=member, flow=flow, deferred=deferred)
+    return hist.finalize()
+
+
+@pytest.mark.parametrize("flow", [False, True])
+def test_deferred_fill_matches_immediate(flow):
+    rng = np.random.default_rng(1)
+    fills = [(f"member{i}", rng.uniform(-20, 120, 500), rng.normal(1, 0.3, 500)) for i in range(5)]
+    immediate, deferred = fill_all(fills, False, flow), fill_all(fills, True, flow)
+    assert np.allclose(immediate.view(flow=True).value, deferred.view(flow=True).value)
+    assert np.allclose(immediate.view(flow=True).variance, deferred.view(flow=True).variance)
+    assert immediate.breakdown.keys() == deferred.breakdown.keys()
+
+
+@pytest.mark.parametrize("flow, edges", [(False, 1.), (True, 0.)])
+def test_finalize_folds_overflow(flow, edges):
+    hist = histogram.Histogram(bh.axis.Regular(10, 0, 100))
+    hist.fill(np.array([-5., 150.]), weight=np.ones(2), flow=flow, deferred=True)
+    hist.finalize()
+    values = hist.values()
+    assert values[0] == edges and values[-1] == edges
+    assert np.all(hist.values(flow=True)[[0, -1]] == 0)
@@ -2,8 +2,11 @@
 import numpy as np
 import pickle
 
+# Files in the workdir the scales are read from
+inputs = ['btag_scales.pkl']
+
 def scale(vg, workdir, group, member, year, syst):
-    with open(workdir/f"btag_scales.pkl", "rb") as f:
+    with open(workdir/inputs[0], "rb") as f:
         scales = pickle.load(f)[year]
     # jet_bin = np.digitize(vg["NJets"], np.arange(1, 10)) - 1
     if group not in scales or not scales[group]:
@@ -2,10 +2,13 @@
 import numpy as np
 import pickle
 
+# Files in the workdir the scales are read from
+inputs = ['btag_scales_njet_lep2.pkl', 'btag_scales_njet_lep3.pkl']
+
 def scale(vg, workdir, group, member, year, syst):
-    with open(workdir/f"btag_scales_njet_lep2.pkl", "rb") as f:
+    with open(workdir/inputs[0], "rb") as f:
         sfile_2 = pickle.load(f)[year]
-    with open(workdir/f"btag_scales_njet_lep3.pkl", "rb") as f:
+    with open(workdir/inputs[1], "rb") as f:
         sfile_3 = pickle.load(f)[year]
     if group not in sfile_2 or not sfile_2[group]:
         return
@@ -2,8 +2,11 @@
 import numpy as np
 import pickle
 
+# Files in the workdir the scales are read from
+inputs = ['theory_scales.pkl']
+
 def scale(vg, workdir, group, member, year, syst):
-    with open(workdir/f"theory_scales.pkl", "rb") as f:
+    with open(workdir/inputs[0], "rb") as f:
         scales = pickle.load(f)[year]
 
     if syst not in scales or group not in scales[syst]:
@@ -2,10 +2,13 @@
 import numpy as np
 import pickle
 
+# Files in the workdir the scales are read from
+inputs = ['wz_scale_factor.pickle']
+
 def scale(vg, workdir, group, member, year, syst):
     if member != "wzTo3lnu":
         return
-    with open(workdir/'wz_scale_factor.pickle', 'rb') as f:
+    with open(workdir/inputs[0], 'rb') as f:
         scales = pickle.load(f)[year].vals
     njets = vg['NJets'] if "Flat" in repr(vg) else vg["Jets"].num()
     jet_bin = np.digitize(njets, np.arange(2,6)) - 1
@@ -19,7 +19,7 @@ from analysis_suite.commons.plot_utils import nonratio_plot, cms_label
 
 from analysis_suite.commons.constants import lumi
 
-def plot_graphs(workdir, year):
+def plot_graphs(workdir, year, hist_cache=False, column_cache=False):
     graphs_with = {
         "ht": GraphInfo(r"$H_T$", axis.Regular(25, 0, 1500), lambda vg : vg.get_hist('HT')),
         'met': GraphInfo(r"Met", axis.Regular(25, 0, 500), lambda vg : vg.get_hist('Met')),
@@ -68,7 +68,8 @@ def plot_graphs(workdir, year):
     ginfo = ntuple.get_info()
     plot_dir = workdir/ 'btag_scales'
     plot_dir.mkdir(exist_ok=True, parents=True)
-    hist_factory = HistGetter(ntuple, year, workdir=workdir, scales=['btag_jetbinned'])
+    hist_factory = HistGetter(ntuple, year, workdir=workdir, scales=['btag_jetbinned'], hist_cache=hist_cache,
+                              column_cache=column_cache)
     hists_with = hist_factory.get_hists(graphs_with)
     hists_without = hist_factory.get_hists(graphs_without)
     for name, graph in graphs_without.items():
@@ -80,7 +81,7 @@ def plot_graphs(workdir, year):
             print(scale*h_with[group].vals)
             print(scale*h_with[group].vals/h_without[group].vals)
 
-def process(workdir, year, nlep):
+def process(workdir, year, nlep, hist_cache=False, column_cache=False):
     ntuple = get_ntuple('btag')
     ginfo = ntuple.get_info()
     bins = axis.Regular(5, 2, 7)
@@ -93,7 +94,7 @@ def process(workdir, year, nlep):
     out_jet = {group: dict() for group in ginfo.get_groups()}
     out_int = {group: dict() for group in ginfo.get_groups()}
 
-    hist_factory = HistGetter(ntuple, year)
+    hist_factory = HistGetter(ntuple, year, hist_cache=hist_cache, column_cache=column_cache)
     if nlep == 2:
         hist_factory.cut(lambda vg: vg["TightLepton"].num() == 2)
     else:
@@ -160,6 +161,10 @@ if __name__ == "__main__":
                         help="Year to use")
     parser.add_argument('-d', '--workdir', required=True,
                         help="directory to run over. If nothing, use date",)
+    parser.add_argument('--hist_cache', action='store_true',
+                        help="Keep the histograms on disk and reuse them when rerunning with the same inputs")
+    parser.add_argument('--column_cache', action='store_true',
+                        help="Keep the decompressed branches in the scratch area to speed up reruns")
     args = parser.parse_args()
 
     workdir = workspace_area / args.workdir
@@ -167,6 +172,6 @@ if __name__ == "__main__":
 
     for year in args.years:
         print(year)
-        process(workdir, year, nlep=2)
-        process(workdir, year, nlep=3)
+        process(workdir, year, nlep=2, hist_cache=args.hist_cache, column_cache=args.column_cache)
+        process(workdir, year, nlep=3, hist_cache=args.hist_cache, column_cache=args.column_cache)
         # plot_graphs(workdir, year)
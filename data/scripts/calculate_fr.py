@@ -163,7 +163,7 @@ def chi2(h1, h2):
 
 #--------------------------------------------------------------------------
 
-def sideband(workdir, year, input_dir, fake_qcd):
+def sideband(workdir, year, input_dir, fake_qcd, hist_cache=False, column_cache=False):
     chans = ['Electron', 'Muon']
     ntuple = config.get_ntuple('fake_rate', 'sideband')
     plotter = Plotter(ntuple, year, bkg='all', outdir=workdir / f'SB_pteta_{year}')
@@ -183,7 +183,8 @@ def sideband(workdir, year, input_dir, fake_qcd):
                   lambda vg : vg.get_hist('Met')),
     }
 
-    hist_factory = HistGetter(ntuple, year, workdir=workdir)
+    hist_factory = HistGetter(ntuple, year, workdir=workdir, hist_cache=hist_cache,
+                              column_cache=column_cache)
     if fake_qcd:
         hist_factory.cut(lambda vg : vg['FakeLepton'].num() == 1, groups=['qcd'])
     else:
@@ -316,7 +317,7 @@ def measurement(workdir, year, input_dir, fake_qcd):
     with open(workdir/f"fr_{year}_new.pickle", "wb") as f:
         pickle.dump(fake_rates, f)
 
-def closure_tf(workdir, year, input_dir, fake_qcd):
+def closure_tf(workdir, year, input_dir, fake_qcd, hist_cache=False, column_cache=False):
     chans = ['MM', 'EE', 'EM']
     ntuple = config.get_ntuple('fake_rate', 'closure_tf')
     plotter = Plotter(ntuple, year, bkg=['ttbar_lep', 'wjet_ht'], outdir=workdir / f'CR_TF_{year}')
@@ -337,7 +338,8 @@ def closure_tf(workdir, year, input_dir, fake_qcd):
         'jetpt':     GraphInfo('$p_{{T}}(j)$', axis.Regular(20, 0, 200), lambda vg : vg['Jets'].get_hist('pt', -1)),
         'njets':  GraphInfo('$N_{{j}}$', axis.Regular(6, 0, 6), lambda vg : (vg.Jets.num(), vg.scale)),
     }
-    hist_factory = HistGetter(ntuple, year, workdir=workdir, inputdir=input_dir)
+    hist_factory = HistGetter(ntuple, year, workdir=workdir, inputdir=input_dir, hist_cache=hist_cache,
+                              column_cache=column_cache)
 
     for chan in chans:
         hist_factory.reset_mask()
@@ -454,6 +456,10 @@ if __name__ == "__main__":
     parser.add_argument('-r', '--run', type=lambda x: [i.strip() for i in x.split(',')],
                         help="Regions to run through (sideband, measurement, closure, dy)")
     parser.add_argument('--fakeqcd', action="store_true")
+    parser.add_argument('--hist_cache', action='store_true',
+                        help="Keep the histograms on disk and reuse them when rerunning with the same inputs")
+    parser.add_argument('--column_cache', action='store_true',
+                        help="Keep the decompressed branches in the scratch area to speed up reruns")
     args = parser.parse_args()
 
     workdir = workspace_area / args.workdir / 'fake_rate'
@@ -462,7 +468,7 @@ if __name__ == "__main__":
     for year in args.years:
         if 'sideband' in args.run:
             print("Sideband")
-            sideband(workdir, year, args.input_dir, args.fakeqcd)
+            sideband(workdir, year, args.input_dir, args.fakeqcd, args.hist_cache, args.column_cache)
 
         if 'measurement' in args.run:
             print("Measurement")
@@ -472,4 +478,4 @@ if __name__ == "__main__":
             closure(workdir, year, args.input_dir, args.fakeqcd)
         if 'closure_tf' in args.run:
             print("Closure")
-            closure_tf(workdir, year, args.input_dir, args.fakeqcd)
+            closure_tf(workdir, year, args.input_dir, args.fakeqcd, args.hist_cache, args.column_cache)
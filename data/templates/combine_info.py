@@ -18,14 +18,14 @@ regions = {
         'dir': 'split_files',
         'glob': 'bdt_3top_sig*signal.root',
         'graph': dilep_graph,
-        'mask': lambda vg : (vg['NLeps'] == 2),
+        'mask': "NLeps == 2",
         'ntuple': ('signal', 'dilep_ntuple'),
     },
     "Multi": {
         'dir': 'split_files',
         'glob': 'bdt_3top_sig*signal.root',
         'graph': multi_graph,
-        'mask': lambda vg : (vg['NLeps']>=3),
+        'mask': "NLeps >= 3",
         'ntuple': ('signal', 'multi_ntuple'),
     },
     "ttzCR": {
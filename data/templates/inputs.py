@@ -1,20 +1,22 @@
 #!/usr/bin/env python3
 from analysis_suite.commons.info import GroupInfo
 import numpy as np
-from mt2 import mt2
+from analysis_suite.flatten.mt2_stage import get_mt2
+from analysis_suite.flatten.topn import topn_allvars
 
 pad = -1
 
 def mt2_l(vg):
-    l1_x = vg.TightLepton['pt', 0]*np.cos(vg.TightLepton['phi', 0])
-    l1_y = vg.TightLepton['pt', 0]*np.sin(vg.TightLepton['phi', 0])
-    l2_x = vg.TightLepton['pt', 1]*np.cos(vg.TightLepton['phi', 1])
-    l2_y = vg.TightLepton['pt', 1]*np.sin(vg.TightLepton['phi', 1])
-    mx = vg["Met"]*np.cos(vg["Met_phi"])
-    my = vg["Met"]*np.sin(vg["Met_phi"])
-    return mt2(np.abs(vg.TightLepton['mass', 0]), l1_x, l1_y,
-               np.abs(vg.TightLepton['mass', 1]), l2_x, l2_y,
-               mx, my, 0., 0.)
+    return get_mt2(vg, "TightLepton")
+
+
+# Leading particle variables (j1Pt...j5Pt, j1Disc..., b1Pt...), filled together
+# as one block when flattening
+# (particle, number of particles, pad value, {variable: column name format})
+topn = [
+    ("Jets", 5, pad, {"pt": "j{}Pt", "discriminator": "j{}Disc"}),
+    ("BJets", 4, pad, {"pt": "b{}Pt", "discriminator": "b{}Disc"}),
+]
 
 
 # Variables used in Training
@@ -36,30 +38,7 @@ allvar = {
     "centrality":       lambda vg : vg['Centrality'],
     # "ZMass":            lambda vg : vg['Zmass'],
 
-    "j1Pt":             lambda vg : vg.Jets['pt', 0, pad],
-    "j2Pt":             lambda vg : vg.Jets['pt', 1, pad],
-    "j3Pt":             lambda vg : vg.Jets['pt', 2, pad],
-    "j4Pt":             lambda vg : vg.Jets['pt', 3, pad],
-    "j5Pt":             lambda vg : vg.Jets['pt', 4, pad],
-    # "j6Pt":             lambda vg : vg.Jets['pt', 5, pad],
-
-    "j1Disc":             lambda vg : vg.Jets['discriminator', 0, pad],
-    "j2Disc":             lambda vg : vg.Jets['discriminator', 1, pad],
-    "j3Disc":             lambda vg : vg.Jets['discriminator', 2, pad],
-    "j4Disc":             lambda vg : vg.Jets['discriminator', 3, pad],
-    "j5Disc":             lambda vg : vg.Jets['discriminator', 4, pad],
-    # "j6Disc":             lambda vg : vg.Jets['discriminator', 5, pad],
-
-    "b1Pt":             lambda vg : vg.BJets['pt', 0, pad],
-    "b2Pt":             lambda vg : vg.BJets['pt', 1, pad],
-    "b3Pt":             lambda vg : vg.BJets['pt', 2, pad],
-    "b4Pt":             lambda vg : vg.BJets['pt', 3, pad],
-
-    "b1Disc":             lambda vg : vg.BJets['discriminator', 0, pad],
-    "b2Disc":             lambda vg : vg.BJets['discriminator', 1, pad],
-    "b3Disc":             lambda vg : vg.BJets['discriminator', 2, pad],
-    "b4Disc":             lambda vg : vg.BJets['discriminator', 3, pad],
-
+    **topn_allvars(topn),
 
     "l1Pt":              lambda vg : vg.TightLepton["pt", 0],
     "l2Pt":              lambda vg : vg.TightLepton["pt", 1],
@@ -96,6 +75,7 @@ allvar = {
 }
 
 
+
 # Vars to actually use in training
 usevars = list(allvar.keys())
 
@@ -1,21 +1,44 @@
 #!/usr/bin/env python3
 import numpy as np
-from copy import copy
+from contextlib import contextmanager
 import awkward as ak
 
+from analysis_suite.commons.cut_expression import compile_cut
+
 
 class BaseGetter:
-    """ """
+    """Base class for the event getters
+
+    The selection is kept as the sorted indices of the selected events
+    (`index`), the full length boolean `mask` is only made from them when
+    asked for. Masks stack by selecting from the current indices, and
+    columns read through `_masked` are filtered once per selection:
+    `_mask_gen` is increased whenever the selection changes and drops the
+    filtered columns. Inside `batch`,
+    quantities shared by many graphs (the weights, particle counts, graph
+    functions) are also computed once per selection and weights.
+    """
 
     def __init__(self):
-        self._mask = None
+        self._mask = (-1, None)
         self._scale = None
+        self._mask_gen = 0
+        self._index = None
+        self._base_index = (None, None)
+        self._filtered = dict()
+        self._filtered_gen = -1
+        self.cutflow = None
+        self._cutflow_path = ()
+        self._cutflow_base = ()
+        self._scale_gen = 0
+        self._memo = None
+        self._memo_state = None
 
     def __bool__(self):
-        return self._mask is not None and bool(ak.count_nonzero(self._mask))
+        return self._index is not None and len(self._index) > 0
 
     def __len__(self):
-        return np.count_nonzero(self.mask)
+        return len(self.index)
 
     def __getattr__(self, key):
         return self.__getitem__(key)
@@ -29,7 +52,7 @@ class BaseGetter:
     @property
     def scale(self):
         """ """
-        return self._scale[self.mask]
+        return self.memo("scale", lambda: self._scale[self.index])
 
     @scale.setter
     def scale(self, scale):
@@ -44,54 +67,139 @@ class BaseGetter:
         """
         if isinstance(scale, tuple):
             scale, mask = scale
-            self._scale[self.get_submask(mask)] = (
-                scale * self._scale[self.get_submask(mask)]
-            )
+            subindex = self.index[np.asarray(mask)]
+            self._scale[subindex] = scale * self._scale[subindex]
         else:
-            self._scale[self.mask] = scale * self._scale[self.mask]
-
-    def get_submask(self, mask):
-        """Helper function for getting a submask.
-        Needed since the normal mask will have False values that reduce the overall size
-        of the output variables meaning masks derived from variables will be smaller that
-        the 'self.mask' length
-
-        Parameters
-        ----------
-        mask : array
-            Mask used to further mask the normal `self.mask` output
-
-        Returns
-        -------
-        array
-            Mask of length of `self.mask` but with correct masking needed
+            index = self.index
+            self._scale[index] = scale * self._scale[index]
+        self._scale_gen += 1
+
+    @contextmanager
+    def batch(self):
+        """Memoize `memo` values while filling many graphs from the same selection"""
+        outer = self._memo is not None
+        if not outer:
+            self._memo = dict()
+            self._memo_state = None
+        try:
+            yield self
+        finally:
+            if not outer:
+                self._memo = None
+                self._memo_state = None
+
+    def memo(self, key, func):
+        """Value of `func()`, computed once per selection and weights inside `batch`
+
+        Memoized arrays are made read only, so they can't be changed in place
+        by one graph and seen by the next one
         """
-        submask = copy(self.mask)
-        submask[submask] = mask
-        return submask
+        if self._memo is None:
+            return func()
+        try:
+            hash(key)
+        except TypeError:
+            return func()
+        state = self._memo_state
+        if state is None or state[:2] != (self._mask_gen, self._scale_gen) or state[2] is not self._scale:
+            self._memo.clear()
+            self._memo_state = (self._mask_gen, self._scale_gen, self._scale)
+        if key not in self._memo:
+            value = func()
+            if isinstance(value, np.ndarray):
+                value.flags.writeable = False
+            self._memo[key] = value
+        return self._memo[key]
 
     @property
     def mask(self):
-        """ """
-        return self._mask
+        """Full length boolean mask of the current selection, made from `index` once per selection"""
+        mask_gen, mask = self._mask
+        if mask_gen != self._mask_gen:
+            mask = np.zeros(len(self._base_mask), dtype=bool)
+            mask[self.index] = True
+            mask.flags.writeable = False
+            self._mask = (self._mask_gen, mask)
+        return mask
 
     @mask.setter
     def mask(self, mask):
         """ """
+        cut = mask
+        start = self.cutflow.timer() if self.cutflow is not None else None
+        if isinstance(mask, str):
+            mask = compile_cut(mask)
         if callable(mask):
             mask = ak.to_numpy(mask(self))
-        self._mask[self._mask] *= mask
+        index = self.index
+        mask = np.broadcast_to(np.asarray(mask, dtype=bool), index.shape)
+        self._set_index(index[mask])
+        if self.cutflow is not None:
+            self.cutflow.add(self, cut, self.cutflow.timer() - start)
+
+    @property
+    def index(self):
+        """Sorted indices of the events passing the current mask"""
+        return self._index
+
+    @property
+    def base_index(self):
+        """Sorted indices of the events passing the base mask"""
+        base_mask, index = self._base_index
+        if base_mask is not self._base_mask:
+            index = np.flatnonzero(self._base_mask)
+            self._base_index = (self._base_mask, index)
+        return index
+
+    def _set_index(self, index):
+        self._mask_gen += 1
+        self._index = index
+
+    def _masked(self, key, arr):
+        """Filter a full length column with the current selection, once per selection
+
+        The filtered arrays are shared by every caller until the selection
+        changes, so they are read-only.
+        """
+        if self._filtered_gen != self._mask_gen:
+            self._filtered = dict()
+            self._filtered_gen = self._mask_gen
+        if key not in self._filtered:
+            vals = arr[self.index]
+            if isinstance(vals, np.ndarray):
+                vals.flags.writeable = False
+            self._filtered[key] = vals
+        return self._filtered[key]
+
+    def unpack_systematics(self, systs):
+        """Prepare for going through the systematics `systs`, only used by getters with particle bitmaps"""
+        pass
 
     def clear_mask(self):
         """ """
-        self._mask = copy(self._base_mask)
+        self._set_index(self.base_index)
+        self._cutflow_path = self._cutflow_base
 
-    def cut(self, mask):
-        """ """
+    def cut(self, mask, name=None, start=None):
+        """Remove the events failing `mask` from the base selection
+
+        `start` is the CutFlow timer value when the evaluation of an already
+        computed mask began, so its time is counted in the step.
+        """
+        cut = mask if name is None else name
+        if start is None and self.cutflow is not None:
+            start = self.cutflow.timer()
+        if isinstance(mask, str):
+            mask = compile_cut(mask)
         if callable(mask):
             mask = ak.to_numpy(mask(self))
-        self._base_mask[self._base_mask] = mask
+        index = self.base_index
+        mask = np.broadcast_to(np.asarray(mask, dtype=bool), index.shape)
+        self._base_mask[index[~mask]] = False
+        self._base_index = (self._base_mask, index[mask])
         self.reset()
+        if self.cutflow is not None:
+            self.cutflow.add(self, cut, self.cutflow.timer() - start, base=True)
 
     def get_graph(self, graph, *args):
         """
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+import inspect
+import json
+import time
+import numpy as np
+from prettytable import PrettyTable
+
+
+def step_name(cut, pos):
+    """Readable name for a cut: the string, the lambda source or the step number
+
+    The values of simple variables a function closes over are added to its
+    source, so the same lambda made in a loop gives different steps.
+    """
+    if isinstance(cut, str):
+        return cut
+    if callable(cut):
+        try:
+            source = inspect.getsource(cut).strip().rstrip(',')
+            name = source[source.index('lambda'):] if 'lambda' in source else source.split('\n')[0]
+        except (OSError, TypeError):
+            return getattr(cut, '__name__', f'step {pos}')
+        try:
+            nonlocals = inspect.getclosurevars(cut).nonlocals
+        except (TypeError, ValueError):
+            nonlocals = {}
+        values = [f'{var}={val!r}' for var, val in nonlocals.items()
+                  if isinstance(val, (str, bool, int, float))]
+        return f'{name} [{", ".join(values)}]' if values else name
+    return f'step {pos}'
+
+
+class CutFlow:
+    """Records the yield after each cut and mask applied to the getters
+
+    A getter given a CutFlow (`vg.cutflow`) reports every `cut` and `mask`
+    with the number of events, the sum of weights and the sum of squared
+    weights passing afterwards and the time taken by the step. Steps are
+    stored per (member, tree, systematic) and keyed on the names of all the
+    steps leading to them, so chunks of the same tree add up while the
+    different masks applied after each `reset_mask` get their own rows.
+
+    Attributes
+    ----------
+    flows : dict
+        (member, tree, systematic) to a dict of step path to step dict
+    """
+
+    def __init__(self):
+        self.flows = dict()
+
+    @staticmethod
+    def key(vg):
+        return (vg.member, vg.treename, vg.syst_name)
+
+    @staticmethod
+    def timer():
+        return time.perf_counter()
+
+    def start(self, vg):
+        """Begin the flow of a getter (after a change of systematic)"""
+        vg._cutflow_path = ()
+        vg._cutflow_base = ()
+        self.add(vg, "Initial", 0.)
+
+    def add(self, vg, cut, elapsed, base=False):
+        """Add the current selection of a getter as the next step
+
+        Parameters
+        ----------
+        vg : BaseGetter
+            Getter after the step was applied
+        cut : callable, string or array
+            Cut or mask applied (used for the step name)
+        elapsed : float
+            Time taken by the step in seconds
+        base : bool
+            Whether the step changes the base selection (cuts) or only the mask
+        """
+        scale = vg.scale if vg._scale is not None else np.ones(len(vg.index))
+        path = vg._cutflow_path + (step_name(cut, len(vg._cutflow_path)),)
+        steps = self.flows.setdefault(self.key(vg), {})
+        if path not in steps:
+            steps[path] = {"step": path[-1], "depth": len(path) - 1, "events": 0, "sumw": 0.,
+                           "sumw2": 0., "time": 0.}
+        step = steps[path]
+        step["events"] += int(len(scale))
+        step["sumw"] += float(np.sum(scale))
+        step["sumw2"] += float(np.sum(scale**2))
+        step["time"] += elapsed
+        vg._cutflow_path = path
+        if base:
+            vg._cutflow_base = path
+
+    def get_table(self, steps):
+        """Table of the steps of a flow, each indented under the step before it"""
+        table = PrettyTable(["Step", "Raw Events", "Weighted Events", "Error", "Efficiency", "Time (ms)"])
+        table.align["Step"] = "l"
+        for path, step in steps.items():
+            previous = steps.get(path[:-1], {}).get("sumw")
+            eff = step["sumw"]/previous if previous else 1.
+            table.add_row(['  '*step["depth"] + step["step"], step["events"], f'{step["sumw"]:.3f}',
+                           f'{np.sqrt(step["sumw2"]):.3f}', f'{eff:.3f}', f'{1000*step["time"]:.2f}'])
+        return table
+
+    def write_out(self, path, output_name):
+        """Write the flows as tables (`.log`) and as JSON (`.json`)"""
+        with open(f'{path}/{output_name}.log', 'w') as out:
+            for (member, tree, syst), steps in sorted(self.flows.items(), key=lambda x: str(x[0])):
+                out.write('-' * 80 + '\n')
+                out.write(f'Member: {member}, Tree: {tree}, Systematic: {syst}\n')
+                out.write(self.get_table(steps).get_string() + '\n'*2)
+
+        output = dict()
+        for (member, tree, syst), steps in self.flows.items():
+            output.setdefault(member, {}).setdefault(str(tree), {})[syst] = [
+                {"path": list(path), **step} for path, step in steps.items()]
+        with open(f'{path}/{output_name}.json', 'w') as out:
+            json.dump(output, out, indent=4)
@@ -1,21 +1,24 @@
 #!/usr/bin/env python3
 import awkward as ak
 import numpy as np
-from copy import copy
 
+from analysis_suite.commons.cut_expression import compile_cut
 from .basegetter import BaseGetter
 
 
 class FlatGetter(BaseGetter):
     """ """
 
-    def __init__(self, upfile, member):
+    def __init__(self, upfile, member, cutflow=None):
         super().__init__()
+        self.member = member
+        self.treename = None
         if member not in upfile or "TTree" not in repr(upfile[member]):
             return
         self.arr = upfile[member].arrays()
+        self._clean = dict()
         self._base_mask = np.ones(len(self.arr), dtype=bool)
-        self._mask = copy(self._base_mask)
+        self.clear_mask()
         self._scale = ak.to_numpy(self.arr["scale_factor"])
         self.branches = self.arr.fields
         self.syst_name = "Nominal"
@@ -25,11 +28,16 @@ class FlatGetter(BaseGetter):
             systs = self.list_systs()
             if len(systs) == 1:
                 self.syst_name = systs[0]
+        self.cutflow = cutflow
+        if self.cutflow is not None:
+            self.cutflow.start(self)
 
     def __getitem__(self, key):
         if key not in self.branches:
             raise AttributeError(f"{key} not found")
-        return np.nan_to_num(self.arr[key][self.mask], nan=-10000)
+        if key not in self._clean:
+            self._clean[key] = np.nan_to_num(ak.to_numpy(self.arr[key]), nan=-10000)
+        return self._masked(key, self._clean[key])
 
     def includes_syst(self, syst):
         return syst in self.syst_weights.fields
@@ -47,6 +55,8 @@ class FlatGetter(BaseGetter):
             self._scale = ak.to_numpy(self.syst_weights[syst])
             self.syst_name = syst
             self.correct_syst = True
+            if self.cutflow is not None:
+                self.cutflow.start(self)
         else:
             self.correct_syst = False
             self.syst_name = None
@@ -69,7 +79,7 @@ class FlatGetter(BaseGetter):
         if cut is None:
             return
         elif isinstance(cut, str):
-            super().cut(self.get_cut(cut))
+            super().cut(self.get_cut(cut), name=cut)
         else:
             super().cut(cut)
 
@@ -79,7 +89,8 @@ class FlatGetter(BaseGetter):
         Parameters
         ----------
         cut : string
-            Cut string used to apply cuts to the dataframe (of form `var >/</== cutval`)
+            Cut string used to apply cuts to the dataframe (eg `NJets >= 2 && abs(l1Eta) < 2.1`,
+            see `commons.cut_expression`)
 
         Returns
         -------
@@ -88,11 +99,4 @@ class FlatGetter(BaseGetter):
         """
         if cut is None:
             return self.mask
-        if len(cutter := cut.split("<")) > 1:
-            return self[cutter[0]] < float(cutter[1])
-        elif len(cutter := cut.split(">")) > 1:
-            return self[cutter[0]] > float(cutter[1])
-        elif len(cutter := cut.split("==")) > 1:
-            return self[cutter[0]] == float(cutter[1])
-        else:
-            raise Exception(f"{cut} is not formatted correctly")
+        return compile_cut(cut)(self)
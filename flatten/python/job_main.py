@@ -1,99 +1,280 @@
 #!/usr/bin/env python3
-import pandas as pd
 import numpy as np
 import logging
 import uproot
 import subprocess
+from contextlib import ExitStack
 
 from analysis_suite.commons.configs import get_list_systs, get_inputs, get_ntuple
 from analysis_suite.commons.constants import lumi
 import analysis_suite.commons.user as user
 
 from analysis_suite.flatten import NtupleGetter
+from analysis_suite.flatten.manifest import Manifest
+from analysis_suite.flatten.cutflow import CutFlow
+from analysis_suite.flatten.topn import get_topn_columns
 from analysis_suite.commons.info import fileInfo
+from analysis_suite.commons.column_builder import ColumnBuilder
+from analysis_suite.commons.prefetcher import FilePrefetcher
+from analysis_suite.commons.file_manager import get_file_manager
 
 
 def setup(cli_args):
     argList = list()
 
     ntuple = get_ntuple(cli_args.ntuple)
+    inputs = get_inputs(cli_args.workdir)
     groups = []
     for year in cli_args.years:
         outdir = cli_args.workdir/year
         outdir.mkdir(exist_ok=True, parents=True)
-        allSysts = get_list_systs(ntuple.get_filename(year=year), cli_args.tool, cli_args.systs)
+        filename = ntuple.get_filename(year=year)
+        allSysts = get_list_systs(filename, cli_args.tool, cli_args.systs)
+        if not cli_args.force:
+            root_files = sorted(filename.glob("*root"))
+            current = [syst for syst in allSysts
+                       if Manifest(get_output(cli_args.workdir, year, syst, cli_args.ntuple),
+                                   get_allvars(inputs, cli_args.ntuple, syst), ntuple, inputs).is_current(root_files)]
+            if current:
+                logging.info(f"Skipping up to date outputs for {year}: {', '.join(current)}")
+            allSysts = [syst for syst in allSysts if syst not in current]
+        if not len(allSysts):
+            continue
+        if cli_args.single_pass:
+            argList.append((cli_args.workdir, cli_args.ntuple, year, list(allSysts), cli_args.chunk_size,
+                            cli_args.force, cli_args.cutflow, cli_args.column_cache))
+            continue
         for syst in allSysts:
-            argList.append((cli_args.workdir, cli_args.ntuple, year, syst))
+            argList.append((cli_args.workdir, cli_args.ntuple, year, syst, cli_args.chunk_size, cli_args.force,
+                            cli_args.cutflow, cli_args.column_cache))
     return argList
 
 
-def run(workdir, tupleName, year, syst):
-    print(year, syst, "start")
-    output = workdir / year/ f'processed_{syst}_{tupleName}.root'
-    # if output.exists():
-    #     return
-    ntuple = get_ntuple(tupleName)
-    filename = ntuple.get_filename(year)
-    inputs = get_inputs(workdir)
-    final_set = {}
-    final_weight = {}
-    final_ratio = {}
+def get_output(workdir, year, syst, tupleName):
+    return workdir / year / f'processed_{syst}_{tupleName}.root'
+
+
+def get_outnames(root_file, ntuple):
+    """Group and output tree name for each (member, tree) in an input file"""
+    outnames = {}
+    for member in root_file.keys(recursive=False, cycle=False):
+        for tree in ntuple.trees:
+            group = ntuple.get_group_name(member, tree)
+            if group is None or tree not in root_file[member]:
+                continue
+            outnames[(member, tree)] = (group, group if member == 'data' else member)
+    return outnames
+
+
+def get_entry_ranges(vg, chunk_size=None):
+    nentries = vg.tree.num_entries
+    if chunk_size is None:
+        return [(0, nentries)] if nentries > 0 else []
+    return [(start, min(start+chunk_size, nentries)) for start in range(0, nentries, chunk_size)]
+
+
+def append_tree(outfile, name, arrays, written):
+    """Write columns to a tree, extending the tree if it was already written
+
+    Keeps the running `index` branch the same as writing the full table at once
+    """
+    start = written.get(name, 0)
+    nrows = len(next(iter(arrays.values()))) if arrays else 0
+    arrays = {"index": np.arange(start, start+nrows), **arrays}
+    if name in written:
+        outfile[name].extend(arrays)
+    else:
+        outfile[name] = arrays
+    written[name] = start + nrows
+
+
+class FlatOutput:
+    """Collects the flattened trees for one systematic and writes them to its output file
+
+    Used as a context manager, the trees are written when the block ends
+    normally, and the file is only closed if an exception is raised.
+    """
+
+    def __init__(self, filename, syst, stream=False):
+        self.syst = syst
+        self.stream = stream
+        self.outfile = uproot.recreate(filename)
+        self.written = {}
+        self.final_set = {}
+        self.final_weight = {}
+        self.final_ratio = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.outfile.close()
+
+    def add(self, outname, arrays, weights, ratio=None):
+        if self.stream:
+            append_tree(self.outfile, outname, arrays, self.written)
+            append_tree(self.outfile, f"weights/{outname}", weights, self.written)
+            if ratio is not None:
+                append_tree(self.outfile, f"ratio/{outname}", ratio, self.written)
+            return
+
+        if outname not in self.final_set:
+            self.final_set[outname] = ColumnBuilder()
+            self.final_weight[outname] = ColumnBuilder()
+            self.final_ratio[outname] = ColumnBuilder()
+
+        self.final_set[outname].append(arrays)
+        self.final_weight[outname].append(weights)
+        if ratio is not None:
+            self.final_ratio[outname].append(ratio)
 
-    allvars = inputs.allvar
+    def copy(self, infile, outname, step_size=None):
+        """Copy an already flattened tree (and its weights) from a previous output"""
+        names = [outname, f"weights/{outname}"]
+        if self.syst != "Nominal":
+            names.append(f"ratio/{outname}")
+        if step_size is None:
+            step_size = infile[outname].num_entries + 1
+        iterators = [infile[name].iterate(library='np', step_size=step_size) for name in names]
+        for chunks in zip(*iterators):
+            chunks = [{key: arr for key, arr in chunk.items() if key != 'index'} for chunk in chunks]
+            self.add(outname, *chunks)
+
+    def close(self):
+        for outname in self.final_set:
+            self.final_set[outname].write(self.outfile, outname)
+            self.final_weight[outname].write(self.outfile, f"weights/{outname}")
+            if self.syst != "Nominal":
+                self.final_ratio[outname].write(self.outfile, f"ratio/{outname}")
+        self.outfile.close()
+
+
+def get_allvars(inputs, tupleName, syst):
     if "CR" in tupleName and syst != 'Nominal':
-        allvars = {
+        return {
             "HT": inputs.allvar['HT'],
             "NJets": inputs.allvar['NJets'],
             "NLeps": lambda vg: vg['TightLepton'].num(),
         }
+    return inputs.allvar
+
+
+def get_plan_systs(systs):
+    """Systematics that read different branches (JEC/JER read shifted jets)"""
+    return [systs[0]] + [syst for syst in systs[1:] if "JEC" in syst or "JER" in syst]
+
+
+def get_outputs(vg, allvars, syst, topn=None):
+    arrays = {}
+    columns = get_topn_columns(vg, topn, allvars) if topn else {}
+    for varname, func in allvars.items():
+        arrays[varname] = columns[varname] if varname in columns else np.asarray(func(vg))
+        if varname[0] == 'N':
+            arrays[varname] = arrays[varname].astype(int)
+    arrays["scale_factor"] = vg.scale
+    weights = vg.get_all_weights()
+    ratio = None
+    if syst != "Nominal":
+        ratio = {syst: vg.scale/vg.get_nom()}
+    return arrays, weights, ratio
+
+
+def run(workdir, tupleName, year, systs, chunk_size=None, force=False, cutflow=False, column_cache=False):
+    """Flatten the ntuples of a year for one systematic or a list of systematics
 
-    for root_file in filename.glob("*root"):
-        f = uproot.open(root_file)
-        members = [m for m in f.keys(recursive=False, cycle=False)]
-        for member in members:
-            xsec = 1. if fileInfo.is_data(member) else fileInfo.get_xsec(member)*lumi[year]*1000
-            for tree in ntuple.trees:
-                group = ntuple.get_group_name(member, tree)
-                outname = group if member == 'data' else member
-                if group is None:
+    With a list, each file is read once and every systematic is made from the
+    same in-memory arrays, each going to its own processed_{syst}_{ntuple}.root.
+    Outputs whose manifest matches the inputs are skipped, and only the trees
+    touched by changed input files are remade (unless `force` is given).
+    With `cutflow`, the yield after each cut is written next to the outputs
+    and with `column_cache` the branches read are kept in the ColumnCache
+    """
+    if isinstance(systs, str):
+        systs = [systs]
+    ntuple = get_ntuple(tupleName)
+    filename = ntuple.get_filename(year)
+    inputs = get_inputs(workdir)
+    topn = getattr(inputs, 'topn', None)
+    root_files = sorted(filename.glob("*root"))
+
+    files = get_file_manager()
+
+    def file_outnames(path):
+        return {outname for _, outname in get_outnames(files.open(path), ntuple).values()}
+
+    allvars, manifests, rebuild = {}, {}, {}
+    for syst in systs:
+        allvars[syst] = get_allvars(inputs, tupleName, syst)
+        manifests[syst] = Manifest(get_output(workdir, year, syst, tupleName), allvars[syst], ntuple, inputs)
+        if force:
+            manifests[syst].previous = None
+        rebuild[syst] = manifests[syst].stale_outnames(root_files, file_outnames)
+    systs = [syst for syst in systs if rebuild[syst] is None or rebuild[syst]]
+    if not systs:
+        print(year, "outputs up to date")
+        return
+    print(year, ", ".join(systs), "start")
+    funcs = list({id(allvars[syst][var]): allvars[syst][var] for syst in systs for var in allvars[syst]}.values())
+
+    cutflow = CutFlow() if cutflow else None
+    with ExitStack() as stack:
+        outputs = {}
+        for syst in systs:
+            output = get_output(workdir, year, syst, tupleName)
+            kept = set() if rebuild[syst] is None else manifests[syst].kept_outnames(rebuild[syst])
+            manifests[syst].remove()
+            if not kept:
+                outputs[syst] = stack.enter_context(FlatOutput(output, syst, stream=chunk_size is not None))
+                continue
+            previous = output.with_suffix('.root.old')
+            output.rename(previous)
+            outputs[syst] = stack.enter_context(FlatOutput(output, syst, stream=chunk_size is not None))
+            with uproot.open(previous) as f:
+                for outname in sorted(kept):
+                    if outname in f:
+                        outputs[syst].copy(f, outname, chunk_size)
+            previous.unlink()
+
+        for root_file, f in FilePrefetcher(root_files, files.open):
+            outnames = get_outnames(f, ntuple)
+            for syst in systs:
+                manifests[syst].add_file(root_file, {outname for _, outname in outnames.values()})
+            for (member, tree), (group, outname) in outnames.items():
+                xsec = 1. if fileInfo.is_data(member) else fileInfo.get_xsec(member)*lumi[year]*1000
+                run_systs = [syst for syst in systs if rebuild[syst] is None or outname in rebuild[syst]]
+                if group == "nonprompt_mc":
+                    run_systs = [syst for syst in run_systs if syst == 'Nominal'] # Only used in training
+                if not run_systs:
                     continue
-                if group == "nonprompt_mc" and syst != 'Nominal':
-                    continue # Skip since only used in training
-                vg = NtupleGetter(f, tree, member, xsec, systName=syst, cuts=ntuple.cut)
+                vg = NtupleGetter(f, tree, member, xsec, systName=run_systs[0], cuts=ntuple.cut,
+                                  cutflow=cutflow, column_cache=column_cache or None)
                 if not vg.tree or not vg.correct_syst:
                     continue
                 ntuple.setup_branches(vg)
-                vg.set_systematic(syst)
-                if not vg or not vg.correct_syst:
-                    continue
+                vg.unpack_systematics(run_systs)
+                branches = None
+                for start, stop in get_entry_ranges(vg, chunk_size):
+                    vg.set_entry_range(start, stop)
+                    if branches is None:
+                        branches = vg.plan_reads(funcs, get_plan_systs(run_systs))
+                    else:
+                        vg.prefetch(branches)
+                    for syst in run_systs:
+                        vg.set_systematic(syst)
+                        if not vg or not vg.correct_syst:
+                            continue
+                        # print(outname, group, len(vg))
+                        outputs[syst].add(outname, *get_outputs(vg, allvars[syst], syst, topn))
 
-                # print(outname, group, len(vg))
-                df_dict = {}
-                for varname, func in allvars.items():
-                    df_dict[varname] = func(vg)
-                df_dict["scale_factor"] = vg.scale
-                df = pd.DataFrame.from_dict(df_dict)
-                df = df.astype({col: int for col in df.columns if col[0] == 'N'})
-                if outname not in final_set:
-                    final_set[outname] = pd.DataFrame()
-                    final_weight[outname] = pd.DataFrame()
-                    final_ratio[outname] = pd.DataFrame()
-
-                final_set[outname] = pd.concat([final_set[outname], df], ignore_index=True)
-                final_weight[outname] = pd.concat([final_weight[outname], pd.DataFrame.from_dict(vg.get_all_weights())],
-                                                  ignore_index=True)
-                if syst != "Nominal":
-                    final_ratio[outname] = pd.concat([final_ratio[outname], pd.DataFrame.from_dict({syst:vg.scale/vg.get_nom()})], ignore_index=True)
-
-    with uproot.recreate(output) as f:
-        for outname in final_set:
-            f[outname] = final_set[outname]
-            f[f"weights/{outname}"] = final_weight[outname]
-            if syst != "Nominal":
-                f[f"ratio/{outname}"] = final_ratio[outname]
-
-            # f[f"/{outname}"] = final_weight[outname]
-    print(year, syst, "finished")
+    files.close()
+    for syst in systs:
+        manifests[syst].write()
+    if cutflow is not None:
+        cutflow.write_out(workdir/year, f'cutflow_{"_".join(systs)}_{tupleName}')
+    print(year, ", ".join(systs), "finished")
 
 def cleanup(cli_args):
     pass
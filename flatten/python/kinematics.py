@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""Kinematic kernels used by the ntuple getters
+
+The kernels are compiled with numba when it is installed, with each
+quantity computed in a single loop over the events. Without numba the same
+functions fall back to numpy expressions. Inputs can be one value per
+event or jagged (one value per particle, eg `vg.Jets["eta", -1]`), and the
+outputs have the same structure and floating point type as the inputs.
+The pairwise kernels go over the flat particle arrays with their offsets
+and give one value for every pair of particles in each event.
+"""
+import awkward as ak
+import numpy as np
+
+try:
+    import numba
+    has_numba = True
+except ImportError:
+    has_numba = False
+
+
+def _np_wrap_phi(dphi):
+    return np.where(dphi > np.pi, dphi - 2*np.pi, np.where(dphi < -np.pi, dphi + 2*np.pi, dphi))
+
+
+def _np_four_vector(pt, eta, phi, mass):
+    return (np.sqrt(mass**2 + (pt*np.cosh(eta))**2),
+            pt*np.cos(phi), pt*np.sin(phi), pt*np.sinh(eta))
+
+
+def _np_delta_r(eta1, phi1, eta2, phi2):
+    return np.sqrt((eta1 - eta2)**2 + _np_wrap_phi(phi1 - phi2)**2)
+
+
+def _np_cos_dtheta(eta1, phi1, eta2, phi2):
+    return (np.cos(phi1 - phi2) + np.sinh(eta1)*np.sinh(eta2)) / (np.cosh(eta1)*np.cosh(eta2))
+
+
+def _np_pair_mass(e1, px1, py1, pz1, e2, px2, py2, pz2):
+    return np.sqrt((e1 + e2)**2 - (px1 + px2)**2 - (py1 + py2)**2 - (pz1 + pz2)**2)
+
+
+def _np_transverse_mass(pt1, phi1, pt2, phi2):
+    return np.sqrt(2*pt1*pt2*(1 - np.cos(phi1 - phi2)))
+
+
+def _np_pairs(offsets):
+    """Flat indices of the first and second particle of every pair, and the number of pairs per event"""
+    pairs = ak.combinations(ak.unflatten(np.arange(offsets[-1]), np.diff(offsets)), 2)
+    return (ak.to_numpy(ak.flatten(pairs["0"])), ak.to_numpy(ak.flatten(pairs["1"])),
+            ak.to_numpy(ak.num(pairs)))
+
+
+def _np_pairwise_delta_r(offsets, eta, phi):
+    i, j, counts = _np_pairs(offsets)
+    return _np_delta_r(eta[i], phi[i], eta[j], phi[j]), counts
+
+
+def _np_pairwise_mass(offsets, e, px, py, pz):
+    i, j, counts = _np_pairs(offsets)
+    return _np_pair_mass(e[i], px[i], py[i], pz[i], e[j], px[j], py[j], pz[j]), counts
+
+
+def _np_pairwise_transverse_mass(offsets, pt, phi):
+    i, j, counts = _np_pairs(offsets)
+    return _np_transverse_mass(pt[i], phi[i], pt[j], phi[j]), counts
+
+
+if has_numba:
+    @numba.njit(cache=True)
+    def _nb_wrap(dphi):
+        if dphi > np.pi:
+            return dphi - 2*np.pi
+        elif dphi < -np.pi:
+            return dphi + 2*np.pi
+        return dphi
+
+    @numba.njit(cache=True)
+    def _nb_four_vector(pt, eta, phi, mass):
+        n = len(pt)
+        e, px, py, pz = np.empty(n), np.empty(n), np.empty(n), np.empty(n)
+        for i in range(n):
+            pz[i] = pt[i]*np.sinh(eta[i])
+            e[i] = np.sqrt(mass[i]**2 + (pt[i]*np.cosh(eta[i]))**2)
+            px[i] = pt[i]*np.cos(phi[i])
+            py[i] = pt[i]*np.sin(phi[i])
+        return e, px, py, pz
+
+    @numba.njit(cache=True)
+    def _nb_delta_r(eta1, phi1, eta2, phi2):
+        out = np.empty(len(eta1))
+        for i in range(len(eta1)):
+            out[i] = np.sqrt((eta1[i] - eta2[i])**2 + _nb_wrap(phi1[i] - phi2[i])**2)
+        return out
+
+    @numba.njit(cache=True)
+    def _nb_cos_dtheta(eta1, phi1, eta2, phi2):
+        out = np.empty(len(eta1))
+        for i in range(len(eta1)):
+            out[i] = ((np.cos(phi1[i] - phi2[i]) + np.sinh(eta1[i])*np.sinh(eta2[i]))
+                      / (np.cosh(eta1[i])*np.cosh(eta2[i])))
+        return out
+
+    @numba.njit(cache=True)
+    def _nb_pair_mass(e1, px1, py1, pz1, e2, px2, py2, pz2):
+        out = np.empty(len(e1))
+        for i in range(len(e1)):
+            out[i] = np.sqrt((e1[i] + e2[i])**2 - (px1[i] + px2[i])**2
+                             - (py1[i] + py2[i])**2 - (pz1[i] + pz2[i])**2)
+        return out
+
+    @numba.njit(cache=True)
+    def _nb_transverse_mass(pt1, phi1, pt2, phi2):
+        out = np.empty(len(pt1))
+        for i in range(len(pt1)):
+            out[i] = np.sqrt(2*pt1[i]*pt2[i]*(1 - np.cos(phi1[i] - phi2[i])))
+        return out
+
+    @numba.njit(cache=True)
+    def _nb_pair_counts(offsets):
+        counts = np.empty(len(offsets) - 1, dtype=np.int64)
+        for ev in range(len(offsets) - 1):
+            n = offsets[ev+1] - offsets[ev]
+            counts[ev] = n*(n - 1)//2
+        return counts
+
+    @numba.njit(cache=True)
+    def _nb_pairwise_delta_r(offsets, eta, phi):
+        counts = _nb_pair_counts(offsets)
+        out = np.empty(counts.sum())
+        k = 0
+        for ev in range(len(offsets) - 1):
+            for i in range(offsets[ev], offsets[ev+1]):
+                for j in range(i + 1, offsets[ev+1]):
+                    out[k] = np.sqrt((eta[i] - eta[j])**2 + _nb_wrap(phi[i] - phi[j])**2)
+                    k += 1
+        return out, counts
+
+    @numba.njit(cache=True)
+    def _nb_pairwise_mass(offsets, e, px, py, pz):
+        counts = _nb_pair_counts(offsets)
+        out = np.empty(counts.sum())
+        k = 0
+        for ev in range(len(offsets) - 1):
+            for i in range(offsets[ev], offsets[ev+1]):
+                for j in range(i + 1, offsets[ev+1]):
+                    out[k] = np.sqrt((e[i] + e[j])**2 - (px[i] + px[j])**2
+                                     - (py[i] + py[j])**2 - (pz[i] + pz[j])**2)
+                    k += 1
+        return out, counts
+
+    @numba.njit(cache=True)
+    def _nb_pairwise_transverse_mass(offsets, pt, phi):
+        counts = _nb_pair_counts(offsets)
+        out = np.empty(counts.sum())
+        k = 0
+        for ev in range(len(offsets) - 1):
+            for i in range(offsets[ev], offsets[ev+1]):
+                for j in range(i + 1, offsets[ev+1]):
+                    out[k] = np.sqrt(2*pt[i]*pt[j]*(1 - np.cos(phi[i] - phi[j])))
+                    k += 1
+        return out, counts
+
+def _kernel(name):
+    return globals()[f"_nb_{name}" if has_numba else f"_np_{name}"]
+
+
+def _apply(func, *arrays):
+    """Run `func` on the inputs as flat float64 arrays
+
+    Jagged inputs are broadcast together and flattened, and the outputs
+    unflattened back. The outputs are cast to the floating point type of
+    the inputs
+    """
+    counts = None
+    if any(isinstance(arr, ak.Array) and arr.ndim > 1 for arr in arrays):
+        arrays = ak.broadcast_arrays(*arrays)
+        if arrays[0].ndim > 2:
+            raise ValueError(f"Kinematics take one value per event or per particle, got {arrays[0].type}")
+        counts = ak.num(arrays[0])
+        arrays = [ak.flatten(arr) for arr in arrays]
+    arrays = [ak.to_numpy(arr) if isinstance(arr, ak.Array) else np.asarray(arr) for arr in arrays]
+    dtype = np.result_type(*[arr.dtype for arr in arrays], np.float32)
+    out = func(*[np.ascontiguousarray(arr, dtype=np.float64) for arr in arrays])
+
+    def restore(arr):
+        arr = arr.astype(dtype, copy=False)
+        return arr if counts is None else ak.unflatten(arr, counts)
+    return tuple(restore(arr) for arr in out) if isinstance(out, tuple) else restore(out)
+
+
+def _apply_pairwise(name, *arrays):
+    """Run a pairwise kernel on jagged arrays of particles, giving the values of the pairs per event"""
+    arrays = ak.broadcast_arrays(*arrays)
+    if arrays[0].ndim != 2:
+        raise ValueError(f"Pairwise kinematics take one value per particle, got {arrays[0].type}")
+    counts = ak.to_numpy(ak.num(arrays[0]))
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    flat = [ak.to_numpy(ak.flatten(arr)) for arr in arrays]
+    dtype = np.result_type(*[arr.dtype for arr in flat], np.float32)
+    out, pair_counts = _kernel(f"pairwise_{name}")(
+        offsets, *[np.ascontiguousarray(arr, dtype=np.float64) for arr in flat])
+    return ak.unflatten(out.astype(dtype, copy=False), pair_counts)
+
+
+def wrap_phi(dphi):
+    """Bring an angle difference back into [-pi, pi]"""
+    return _apply(_np_wrap_phi, dphi)
+
+
+def four_vector(pt, eta, phi, mass):
+    """Energy, px, py and pz from pt, eta, phi and mass arrays"""
+    return _apply(_kernel("four_vector"), pt, eta, phi, mass)
+
+
+def delta_r(eta1, phi1, eta2, phi2):
+    return _apply(_kernel("delta_r"), eta1, phi1, eta2, phi2)
+
+
+def cos_dtheta(eta1, phi1, eta2, phi2):
+    return _apply(_kernel("cos_dtheta"), eta1, phi1, eta2, phi2)
+
+
+def pair_mass(p4_1, p4_2):
+    """Invariant mass of two objects given as (energy, px, py, pz)"""
+    return _apply(_kernel("pair_mass"), *p4_1, *p4_2)
+
+
+def transverse_mass(pt1, phi1, pt2, phi2):
+    return _apply(_kernel("transverse_mass"), pt1, phi1, pt2, phi2)
+
+
+def pairwise_delta_r(eta, phi):
+    """DeltaR of every pair of particles in each event, ordered (0,1), (0,2), ..., (1,2), ..."""
+    return _apply_pairwise("delta_r", eta, phi)
+
+
+def pairwise_mass(p4):
+    """Invariant mass of every pair of particles given as jagged (energy, px, py, pz) (see `pairwise_delta_r`)"""
+    return _apply_pairwise("mass", *p4)
+
+
+def pairwise_transverse_mass(pt, phi):
+    """Transverse mass of every pair of particles in each event (see `pairwise_delta_r`)"""
+    return _apply_pairwise("transverse_mass", pt, phi)
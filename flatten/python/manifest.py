@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+import hashlib
+import inspect
+import json
+import logging
+from pathlib import Path
+
+import analysis_suite.commons as commons_module
+import analysis_suite.data.FileInfo as file_info_module
+import analysis_suite.data.PlotGroups as plot_groups_module
+
+
+def get_source(func):
+    """Source of a function, falling back on its bytecode if the source isn't available"""
+    if isinstance(func, str):
+        return func
+    try:
+        return inspect.getsource(func)
+    except (OSError, TypeError):
+        code = func.__code__
+        return repr((code.co_code, code.co_consts, code.co_names))
+
+
+def hash_strings(strings):
+    hasher = hashlib.sha256()
+    for string in strings:
+        hasher.update(string.encode())
+        hasher.update(b'\0')
+    return hasher.hexdigest()
+
+
+def hash_funcs(funcs):
+    if funcs is None:
+        return hash_strings([])
+    if callable(funcs):
+        funcs = [funcs]
+    if isinstance(funcs, dict):
+        return hash_strings([f'{name}:{get_source(func)}' for name, func in funcs.items()])
+    return hash_strings([get_source(func) for func in funcs])
+
+
+def hash_ntuple(ntuple):
+    return hash_strings([
+        hash_funcs(ntuple.cut),
+        hash_funcs(ntuple.branches),
+        repr(ntuple.trees),
+        repr(sorted(ntuple.tree_groups.items())),
+        repr(sorted(ntuple.group_trees.items())),
+    ])
+
+
+def hash_inputs(inputs):
+    """Hash of the whole inputs module (helpers used by the allvars) and its `topn` spec"""
+    if inputs is None:
+        return hash_strings([])
+    try:
+        source = Path(inputs.__file__).read_text()
+    except (AttributeError, TypeError, OSError):
+        source = inspect.getsource(inputs)
+    return hash_strings([source, repr(getattr(inputs, 'topn', None))])
+
+
+def get_code_version():
+    """Hash of the code that changes the content of the flattened files
+
+    Covers the flatten and commons modules (getters, cut expressions,
+    column builder, ...) and the group and file information
+    """
+    files = sorted(Path(__file__).parent.glob("*.py"))
+    files += sorted(Path(commons_module.__file__).parent.glob("*.py"))
+    files += [Path(file_info_module.__file__), Path(plot_groups_module.__file__)]
+    return hash_strings([path.read_text() for path in files])
+
+
+def get_file_stats(path):
+    stats = Path(path).stat()
+    return {"size": stats.st_size, "mtime": stats.st_mtime}
+
+
+class Manifest:
+    """Record of the inputs used to make a flattened output file
+
+    The manifest is stored next to the output (`processed_*.json`) and holds
+    the size and mtime of each input ROOT file with the output trees it
+    filled, as well as hashes of the `allvar` definitions, the inputs module,
+    the ntuple cuts and the flatten and commons code. Any change in the hashes makes the whole output
+    stale, while a changed input file only makes its own trees stale.
+
+    Attributes
+    ----------
+    output : Path
+        Output ROOT file described by this manifest
+    config : dict
+        Hashes of the variable definitions, ntuple and code
+    files : dict
+        Input file name to its stats and list of output trees
+    """
+    version = 2
+
+    def __init__(self, output, allvars, ntuple, inputs=None):
+        self.output = Path(output)
+        self.filename = self.output.with_suffix('.json')
+        self.config = {
+            "version": Manifest.version,
+            "allvar": hash_funcs(allvars),
+            "inputs": hash_inputs(inputs),
+            "ntuple": hash_ntuple(ntuple),
+            "code": get_code_version(),
+        }
+        self.files = dict()
+        self.previous = self._load()
+
+    def _load(self):
+        if not self.output.exists() or not self.filename.exists():
+            return None
+        try:
+            with open(self.filename) as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            logging.warning(f"Could not read {self.filename}, remaking the output")
+            return None
+        if previous.get("config") != self.config:
+            return None
+        return previous["files"]
+
+    def _changed_files(self, root_files):
+        current = {str(path): get_file_stats(path) for path in root_files}
+        changed = [name for name, stats in current.items()
+                   if name not in self.previous
+                   or stats != {key: self.previous[name][key] for key in stats}]
+        removed = [name for name in self.previous if name not in current]
+        return changed, removed
+
+    def is_current(self, root_files):
+        """Whether the output is up to date with the input files and configuration"""
+        if self.previous is None:
+            return False
+        changed, removed = self._changed_files(root_files)
+        return not changed and not removed
+
+    def stale_outnames(self, root_files, get_outnames):
+        """Find the output trees that need to be remade
+
+        Parameters
+        ----------
+        root_files : list of Path
+            Input ROOT files
+        get_outnames : callable
+            Function giving the output trees filled by an input file
+
+        Returns
+        -------
+        set or None
+            Names of stale trees, None if the whole output needs to be remade
+        """
+        if self.previous is None:
+            return None
+        changed, removed = self._changed_files(root_files)
+        stale = set()
+        for name in changed + removed:
+            if name in self.previous:
+                stale |= set(self.previous[name]["outnames"])
+        for name in changed:
+            stale |= set(get_outnames(name))
+        return stale
+
+    def kept_outnames(self, stale):
+        """Trees of the previous output that are still up to date"""
+        if self.previous is None:
+            return set()
+        outnames = set()
+        for info in self.previous.values():
+            outnames |= set(info["outnames"])
+        return outnames - stale
+
+    def add_file(self, path, outnames):
+        self.files[str(path)] = {**get_file_stats(path), "outnames": sorted(outnames)}
+
+    def remove(self):
+        """Delete the manifest, before the output it describes is remade"""
+        self.filename.unlink(missing_ok=True)
+
+    def write(self):
+        with open(self.filename, 'w') as f:
+            json.dump({"config": self.config, "files": self.files}, f, indent=4)
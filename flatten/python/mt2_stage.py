@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""Batched MT2 of the two leading particles and the MET
+
+The inputs are gathered once into contiguous arrays and MT2 is evaluated
+in chunks on a thread pool of its own, so the CPU bound chunks don't hold
+up the decompression pool. The result is kept in the `mt2_cache` of the
+NtupleGetter for the current systematic and mask, so every variable using
+it (eg the BDT inputs and the plotting variables) shares one evaluation,
+and in an MT2Cache on disk, so the later stages reading the same events
+(the second BDT stage, the plots from the ntuples) don't evaluate it again.
+"""
+import hashlib
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from mt2 import mt2
+import analysis_suite.commons.file_manager as file_manager
+import analysis_suite.commons.user as user
+from analysis_suite.commons.disk_cache import DiskCache
+
+_executor = None
+
+
+def get_mt2_executor():
+    """Pool for the MT2 chunks, sized by the thread budget"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(file_manager.thread_budget)
+    return _executor
+
+
+def _reset_after_fork():
+    global _executor
+    _executor = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def gather_inputs(vg, part):
+    """Leading two particles and the MET as contiguous float64 arrays
+
+    Returns
+    -------
+    tuple of arrays
+        Arguments of `mt2` (without the invisible masses)
+    """
+    block = vg[part].top_n(["pt", "phi", "mass"], 2, 0.)
+    pt, phi, mass = block[:, :, 0], block[:, :, 1], np.abs(block[:, :, 2])
+    met, met_phi = np.asarray(vg["Met"], dtype=np.float64), np.asarray(vg["Met_phi"], dtype=np.float64)
+    return tuple(np.ascontiguousarray(arr, dtype=np.float64) for arr in (
+        mass[:, 0], pt[:, 0]*np.cos(phi[:, 0]), pt[:, 0]*np.sin(phi[:, 0]),
+        mass[:, 1], pt[:, 1]*np.cos(phi[:, 1]), pt[:, 1]*np.sin(phi[:, 1]),
+        met*np.cos(met_phi), met*np.sin(met_phi),
+    ))
+
+
+def batched_mt2(inputs, chunk_size=50000, executor=None):
+    """Evaluate MT2 over chunks of the inputs in parallel
+
+    Parameters
+    ----------
+    inputs : tuple of arrays
+        Output of `gather_inputs`
+    chunk_size : int
+        Number of events per task
+    executor : concurrent.futures.Executor, optional
+        Pool used for the chunks (`get_mt2_executor` by default)
+
+    Returns
+    -------
+    array
+        MT2 for each event
+    """
+    nevents = len(inputs[0])
+    if nevents <= chunk_size:
+        return mt2(*inputs, 0., 0.)
+    if executor is None:
+        executor = get_mt2_executor()
+    out = np.empty(nevents)
+
+    def fill(start):
+        stop = min(start + chunk_size, nevents)
+        out[start:stop] = mt2(*[arr[start:stop] for arr in inputs], 0., 0.)
+
+    for future in [executor.submit(fill, start) for start in range(0, nevents, chunk_size)]:
+        future.result()
+    return out
+
+
+class MT2Cache(DiskCache):
+    """On disk cache of the MT2 values of a selection of events
+
+    Each entry is the array of MT2 of the selected events, saved as a
+    `.npy` file named by a hash of the file (UUID, path, size and
+    modification time), the tree, the member, the systematic, the particle,
+    the entry range and indices of the selected events, and the inputs of
+    MT2, which covers changes in the particle definitions. When the cache
+    goes over `max_size` the least recently used entries are removed (see
+    `DiskCache`).
+    """
+
+    def __init__(self, path, max_size=2*1024**3):
+        super().__init__(path, max_size)
+
+    def key(self, vg, part, inputs):
+        tree = vg.tree
+        filename = tree.file.file_path
+        try:
+            stats = os.stat(filename)
+            file_id = (stats.st_size, stats.st_mtime)
+        except OSError:
+            file_id = None
+        entry_stop = tree.num_entries if vg.entry_stop is None else vg.entry_stop
+        digest = hashlib.sha256(
+            f"{tree.file.uuid}:{filename}:{file_id}:{tree.object_path}:{vg.member}:{vg.treename}:"
+            f"{vg.syst_name}:{part}:{vg.entry_start}:{entry_stop}".encode())
+        digest.update(np.ascontiguousarray(vg.index, dtype=np.int64).tobytes())
+        for arr in inputs:
+            digest.update(arr.tobytes())
+        return digest.hexdigest()
+
+    def _entry(self, key):
+        return self.path / key[:2] / f"{key}.npy"
+
+    def load(self, key, nevents):
+        """Get the MT2 stored under `key`, None if it isn't stored"""
+        entry = self._entry(key)
+        if not entry.exists():
+            return None
+        try:
+            values = np.load(entry)
+            if len(values) != nevents:
+                raise ValueError(f"{len(values)} values for {nevents} events")
+        except (OSError, ValueError) as e:
+            logging.warning(f"Removing unreadable cache entry {entry}: {e}")
+            entry.unlink(missing_ok=True)
+            return None
+        self.touch(entry)
+        return values
+
+    def store(self, key, values):
+        """Write MT2 values to the cache, evicting old entries if over the size limit"""
+        entry = self._entry(key)
+        tmp = entry.with_name(f"{entry.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, 'wb') as f:
+                np.save(f, values)
+            size = tmp.stat().st_size
+            os.replace(tmp, entry)
+        except OSError as e:
+            logging.warning(f"Could not write MT2 to the cache: {e}")
+            tmp.unlink(missing_ok=True)
+            return
+        self.added(size)
+
+    def get_entries(self):
+        entries = []
+        for entry in self.path.glob("*/*.npy"):
+            try:
+                stats = entry.stat()
+                entries.append((stats.st_mtime, stats.st_size, entry))
+            except OSError:
+                continue
+        return entries
+
+
+_mt2_cache = False
+
+
+def get_mt2_cache():
+    """Shared cache in the user scratch area, None if it can't be used"""
+    global _mt2_cache
+    if _mt2_cache is False:
+        try:
+            _mt2_cache = MT2Cache(user.scratch_area / "mt2_cache")
+        except OSError:
+            _mt2_cache = None
+    return _mt2_cache
+
+
+def get_mt2(vg, part="TightLepton", chunk_size=50000, cache=None):
+    """MT2 of the two leading `part` particles, cached on the getter and on disk
+
+    Values are kept in `vg.mt2_cache` under the mask generation of the
+    getter, which empties the cache when the systematic changes. Values of
+    older masks are dropped when a new one is computed. Otherwise they are
+    looked up in `cache` (the shared MT2Cache by default, False for none) by
+    member, systematic and selection, and computed and stored if missing.
+    """
+    key = (part, vg._mask_gen)
+    if key not in vg.mt2_cache:
+        for old in [old for old in vg.mt2_cache if old[1] != vg._mask_gen]:
+            del vg.mt2_cache[old]
+        inputs = gather_inputs(vg, part)
+        cache = get_mt2_cache() if cache is None else cache or None
+        if cache is None:
+            values = batched_mt2(inputs, chunk_size)
+        else:
+            disk_key = cache.key(vg, part, inputs)
+            values = cache.load(disk_key, len(inputs[0]))
+            if values is None:
+                values = batched_mt2(inputs, chunk_size)
+                cache.store(disk_key, values)
+        vg.mt2_cache[key] = values
+    return vg.mt2_cache[key]
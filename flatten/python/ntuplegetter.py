@@ -4,26 +4,93 @@ import uproot as uproot
 import numpy as np
 from copy import copy
 import multiprocessing as mp
+import logging
 
+from analysis_suite.commons.cut_expression import compile_cut
+from analysis_suite.commons.column_cache import get_column_cache
+from analysis_suite.commons.file_manager import get_executor, get_file_manager
 from .basegetter import BaseGetter
+from . import kinematics as kin
 
 single_branch = ["run", "event", "luminosityBlock", "bjet_scale",
                  'dilepton_masses', "hasVetoJet", 'os_masses']
 
+
+class NotScalar(Exception):
+    pass
+
+
+class ScalarView:
+    """Stand-in for a getter that only gives event level branches
+
+    Cuts are first run on this view: the ones only reading event level
+    branches give their mask, the others raise NotScalar and are applied
+    once the particles are loaded.
+    """
+
+    def __init__(self, vg):
+        self.vg = vg
+
+    def __getitem__(self, key):
+        if not self.vg.is_scalar(key):
+            raise NotScalar(key)
+        return self.vg[key]
+
+    def __getattr__(self, key):
+        return self[key]
+
+
 class NtupleGetter(BaseGetter):
+    """Getter for the ntuple trees
+
+    Cuts reading only event level branches are applied before anything is
+    read from the particle collections (predicate pushdown). With `pushdown`
+    set, the particle branches are then only read for the clusters of
+    entries holding events that passed them. If the file is closed by the
+    FileManager, the tree is opened again on its next use.
+    With `column_cache` (True for the shared ColumnCache, or a ColumnCache),
+    the decompressed branches are stored on disk and read back from there.
+    """
+    pushdown_fraction = 0.5
+
     def __init__(self, root_file, treename, group, xsec, systName="", **kwargs):
         super().__init__()
         self.part_name = []
         self.arr = dict()
         self.syst_arr = dict()
         self.parts = dict()
+        self.part_cache = ParticleCache()
         self.branches = []
         self.xsec = xsec
         self.isData = (group == "data")
         self.correct_syst = True
         self.syst_name = systName
         self.cuts = kwargs.get('cuts', None)
+        self.cutflow = kwargs.get('cutflow', None)
+        self.member = group
+        self.treename = treename
+        # Decompression executor given to the getter, otherwise the shared one is taken on each read
+        self._own_executor = 'executor' in kwargs
+        self._executor = kwargs.get('executor', None)
+        self.file_manager = kwargs['file_manager'] if 'file_manager' in kwargs else get_file_manager()
+        column_cache = kwargs.get('column_cache', None)
+        self.column_cache = get_column_cache() if column_cache is True else column_cache
         self.tree = None
+        self._prefetched = dict()
+        # MT2 by (particle, mask generation), see mt2_stage.get_mt2 (which also keeps it on disk).
+        # Emptied on each change of systematic
+        self.mt2_cache = dict()
+        self._requested = None
+        self._plan_entries = None
+        self.entry_start = kwargs.get('entry_start', 0)
+        self.entry_stop = kwargs.get('entry_stop', None)
+        self.pushdown = kwargs.get('pushdown', True)
+        self.entry_ranges = None
+        self._pending = set()
+        self._clusters = None
+        self._loaded_clusters = None
+        self._object_cuts = set()
+        self._defer_parts = False
 
         if group not in root_file or treename not in root_file[group]:
             return
@@ -55,17 +122,320 @@ class NtupleGetter(BaseGetter):
             self.parts[name] = Particle(name, self)
         # self.set_systematic(systName)
 
+    @property
+    def executor(self):
+        """Executor used to decompress the branches, looked up at each read"""
+        return self._executor if self._own_executor else get_executor()
+
+    @property
+    def tree(self):
+        if self._tree is not None and self._tree.file.closed and self.file_manager is not None:
+            f = self.file_manager.open(self._tree.file.file_path)
+            self._tree = f[self.member][self.treename]
+        return self._tree
+
+    @tree.setter
+    def tree(self, tree):
+        self._tree = tree
+
+    def _read(self, name):
+        if name in self._pending:
+            self._prefetched.update(self._read_objects(self._pending))
+            self._pending.clear()
+        if name in self._prefetched:
+            return self._prefetched[name]
+        if self._requested is not None:
+            self._requested.add(name)
+        if "/" in name and self._use_pushdown():
+            return self._read_objects([name])[name]
+        return self._tree_arrays([name], **self._entry_range())[name]
+
+    def _tree_arrays(self, names, entry_start, entry_stop):
+        """Read branches over an entry range, going through the column cache if there is one"""
+        if entry_stop is None:
+            entry_stop = self.tree.num_entries
+        use_cache = self.column_cache is not None and self._plan_entries is None
+        output = {}
+        if use_cache:
+            for name in names:
+                arr = self.column_cache.load(self.tree, name, entry_start, entry_stop)
+                if arr is not None:
+                    output[name] = arr
+        missing = [name for name in names if name not in output]
+        if not missing:
+            return output
+        if len(missing) == 1:
+            arrays = {missing[0]: self.tree[missing[0]].array(entry_start=entry_start, entry_stop=entry_stop,
+                                                              decompression_executor=self.executor)}
+        else:
+            arrays = self.tree.arrays(filter_name=missing, how=dict, entry_start=entry_start,
+                                      entry_stop=entry_stop, decompression_executor=self.executor)
+        for key, arr in arrays.items():
+            if key not in missing:
+                continue
+            output[key] = arr
+            if use_cache:
+                self.column_cache.store(self.tree, key, entry_start, entry_stop, arr)
+        return output
+
+    def _use_pushdown(self):
+        return self.pushdown and self._plan_entries is None
+
+    def is_scalar(self, key):
+        """Whether a branch has one value per event (per systematic)"""
+        if key not in self.branches or "/" in key:
+            return False
+        return key not in single_branch or 'vector' not in self.tree[key].typename
+
+    def _get_clusters(self):
+        """Entry boundaries of the clusters (common basket edges) in the entry range"""
+        if self._clusters is None:
+            stop = self.entry_stop if self.entry_stop is not None else self.tree.num_entries
+            offsets = np.asarray(self.tree.common_entry_offsets())
+            self._clusters = np.unique(np.clip(np.append(offsets, [self.entry_start, stop]),
+                                               self.entry_start, stop))
+        return self._clusters
+
+    def _read_objects(self, names):
+        """Read particle branches, only over `entry_ranges` if set
+
+        Entries outside the ranges are filled with empty lists so the arrays
+        keep one entry per event of the entry range
+        """
+        names = list(names)
+        if self._loaded_clusters is None:
+            self._loaded_clusters = set(range(len(self._get_clusters()) - 1))
+        if self.entry_ranges is None:
+            return self._tree_arrays(names, **self._entry_range())
+        return self._read_ranges(names, self.entry_ranges)
+
+    def _read_ranges(self, names, ranges):
+        """Read branches over some entry ranges into arrays spanning the whole entry range"""
+        nentries = self._get_clusters()[-1] - self.entry_start
+        chunks = [self._tree_arrays(names, start, stop) for start, stop in ranges]
+        output = {}
+        for name in chunks[0]:
+            if name not in names:
+                continue
+            parts = [chunk[name] for chunk in chunks]
+            if parts[0].ndim == 1:
+                full = np.zeros(nentries, dtype=ak.to_numpy(parts[0]).dtype)
+                for (start, stop), part in zip(ranges, parts):
+                    full[start-self.entry_start:stop-self.entry_start] = ak.to_numpy(part)
+                output[name] = full
+                continue
+            counts = np.zeros(nentries, dtype=np.int64)
+            for (start, stop), part in zip(ranges, parts):
+                counts[start-self.entry_start:stop-self.entry_start] = ak.to_numpy(ak.num(part, axis=1))
+            output[name] = ak.unflatten(ak.concatenate([ak.flatten(part, axis=1) for part in parts]), counts)
+        return output
+
+    def _cluster_ranges(self, indices):
+        """Entry ranges covering a set of clusters, joining neighbouring ones"""
+        clusters = self._get_clusters()
+        ranges = []
+        for i in sorted(indices):
+            if ranges and ranges[-1][1] == clusters[i]:
+                ranges[-1][1] = clusters[i+1]
+            else:
+                ranges.append([clusters[i], clusters[i+1]])
+        return [(int(start), int(stop)) for start, stop in ranges]
+
+    def _update_entry_ranges(self):
+        """Pick the clusters to read particle branches from after the event level cuts
+
+        The clusters loaded only ever grow over an entry range: when a
+        systematic needs clusters that weren't read yet, only those are read
+        for the particle branches already in memory and added to them, so
+        going through many systematics reads each branch once.
+        """
+        if not self._use_pushdown():
+            return
+        clusters = self._get_clusters()
+        nclusters = len(clusters) - 1
+        passing = self.base_index + self.entry_start
+        needed = set(np.unique(np.searchsorted(clusters, passing, side='right') - 1).tolist())
+        if not needed:
+            needed = {0}
+        loaded = self._loaded_clusters
+        if loaded is not None:
+            if needed <= loaded:
+                return
+            needed |= loaded
+        if len(needed) > self.pushdown_fraction*nclusters:
+            needed = set(range(nclusters))
+        self._loaded_clusters = needed
+        self.entry_ranges = None if len(needed) == nclusters else self._cluster_ranges(needed)
+        if loaded is not None:
+            self._extend_objects(self._cluster_ranges(needed - loaded))
+
+    def _extend_objects(self, ranges):
+        """Read the particle branches in memory over more entry ranges and add them in
+
+        Everything made from the particle branches (shifted columns,
+        bitmaps, filtered columns) is remade from the extended arrays
+        """
+        stores = (self.arr, self.syst_arr, self._prefetched, self.part_cache.raw)
+        names = {key for store in stores for key in store if "/" in key}
+        if names:
+            nentries = self._get_clusters()[-1] - self.entry_start
+            added = np.zeros(nentries, dtype=bool)
+            for start, stop in ranges:
+                added[start-self.entry_start:stop-self.entry_start] = True
+            take = np.arange(nentries) + np.where(added, nentries, 0)
+            extra = self._read_ranges(names, ranges)
+            for store in stores:
+                for key in [key for key in store if "/" in key]:
+                    if isinstance(store[key], np.ndarray):
+                        store[key] = np.where(added, extra[key], store[key])
+                    else:
+                        store[key] = ak.concatenate([store[key], extra[key]])[take]
+        self.part_cache.columns.clear()
+        self.part_cache.bitmaps.clear()
+        self._filtered_gen = -1
+
+    def _entry_range(self):
+        stop = self.entry_stop
+        if self._plan_entries is not None:
+            plan_stop = self.entry_start + self._plan_entries
+            stop = plan_stop if stop is None else min(stop, plan_stop)
+        return {"entry_start": self.entry_start, "entry_stop": stop}
+
+    def set_entry_range(self, start, stop):
+        """Restrict the getter to a range of entries in the tree, dropping anything read
+
+        Parameters
+        ----------
+        start : int
+            First entry used
+        stop : int
+            Entry after the last one used (None for the end of the tree)
+        """
+        self.entry_start = start
+        self.entry_stop = stop
+        self._prefetched.clear()
+        self._pending.clear()
+        self.arr.clear()
+        self.syst_arr.clear()
+        self.part_cache.clear()
+        self._filtered_gen = -1
+        self._clusters = None
+        self._loaded_clusters = None
+        self.entry_ranges = None
+
     def _get_var(self, name):
         # return self.tree[name].array()[:, self.syst]
-        return self.tree[name].array()
+        return self._read(name)
 
     def _get_var_nosyst(self, name):
-        return self.tree[name].array()
+        return self._read(name)
+
+    def _get_weight(self, idx):
+        if 'weight' not in self.arr:
+            self.arr['weight'] = self._get_var('weight')
+        return ak.to_numpy(self.arr['weight'][:, idx])
+
+    def prefetch(self, names):
+        """Read a set of branches with a single batched call to the tree
+
+        With pushdown, the particle branches are only marked and read in
+        one call the first time one of them is needed, after the event level
+        cuts picked the entry ranges.
+
+        Parameters
+        ----------
+        names : iterable of string
+            Full branch paths (eg `Jets/pt`) to read and keep in memory
+        """
+        names = [name for name in names if name not in self._prefetched]
+        if self._use_pushdown():
+            self._pending.update(name for name in names if "/" in name)
+            names = [name for name in names if "/" not in name]
+        if not names:
+            return
+        self._prefetched.update(self._tree_arrays(names, **self._entry_range()))
+
+    def plan_reads(self, funcs, systs=None, entries=1000):
+        """Find all branches used by a set of functions and prefetch them
+
+        The cuts and the functions are run once over the first `entries` events
+        while recording every branch requested from the tree. The full set is
+        then read in one call with `prefetch`. Anything missed (eg a function
+        failing on the small sample) falls back to being read when accessed.
+
+        Parameters
+        ----------
+        funcs : iterable of callables
+            Functions taking this getter (eg the `allvar` lambdas)
+        systs : list of string, optional
+            Systematics the getter will be set to (JEC/JER read extra branches)
+        entries : int
+            Number of events used for the planning run
+
+        Returns
+        -------
+        set
+            Branches prefetched, can be passed to `prefetch` for other entry ranges
+        """
+        if systs is None:
+            systs = [self.syst_name if self.syst_name else "Nominal"]
+        self._requested = set()
+        self._plan_entries = entries
+        cutflow, self.cutflow = self.cutflow, None
+        try:
+            for syst in systs:
+                self.set_systematic(syst)
+                for func in funcs:
+                    try:
+                        func(self)
+                    except (IndexError, ValueError, KeyError) as e:
+                        # Small planning samples can be empty or short, the rest of
+                        # the branches of this function are read when first used
+                        logging.warning(f"Branch planning incomplete for {getattr(func, '__name__', func)}"
+                                        f" ({type(e).__name__}: {e}), reading the rest on demand")
+        finally:
+            requested, self._requested, self._plan_entries = self._requested, None, None
+            self.cutflow = cutflow
+            self.arr.clear()
+            self.syst_arr.clear()
+            self.part_cache.clear()
+            self._loaded_clusters = None
+            self.entry_ranges = None
+        self.prefetch(requested)
+        return requested
 
     def _get_arr(self, name):
-        if name not in self.arr:
+        if name not in self.syst_arr:
             self[name]
-        return self.arr[name]
+        return self.syst_arr[name]
+
+    def get_shifted(self, part, var):
+        """Get a JEC/JER shifted variable of a particle for the current systematic
+
+        The shifts are either stored as one branch with all systematics
+        (`{part}/{var}_shift`) or as a branch per systematic. Either way they
+        are read once and kept in the `part_cache`.
+
+        Parameters
+        ----------
+        part : string
+            Name of the particle
+        var : string
+            Variable shifted (pt or mass)
+
+        Returns
+        -------
+        array
+            Jagged array of the shifted variable for all events (no event mask)
+        """
+        shift = f'{part}/{var}_shift'
+        if shift in self.tree:
+            make = lambda: self.part_cache.get_raw(shift, self._read)[:, :, self.syst-1]
+        else:
+            sname = self.syst_name
+            branch = f"{part}_{sname[:sname.rindex('_')]}/{var}{sname[sname.rindex('_'):].lower()}"
+            make = lambda: self.part_cache.get_raw(branch, self._read)
+        return self.part_cache.get((part, var, self.syst_unique), make)
 
     def no_var(self, key):
         return "/" in key or 'vector' not in self.tree[key].typename or key in single_branch
@@ -84,7 +454,7 @@ class NtupleGetter(BaseGetter):
                 if key not in self.arr:
                     self.arr[key] = self._get_var(key)
                 self.syst_arr[key] = self.arr[key][:, self.syst]
-        return self.syst_arr[key][self.mask]
+        return self._masked(key, self.syst_arr[key])
 
         # elif key not in self.arr:
         #     if self.no_var(key):
@@ -98,12 +468,35 @@ class NtupleGetter(BaseGetter):
         # return self.arr[key][self.mask]
 
     def get_nom(self):
-        return self.get_sf("Nominal")*ak.to_numpy(self.tree['weight'].array()[:, 0])[self.mask]
+        return self.get_sf("Nominal")*self._get_weight(0)[self.index]
 
     def apply_cuts(self):
-        if self.cuts is None:
-            return
-        for cut in self.cuts:
+        """Apply the cuts, the event level ones before the particles are loaded
+
+        Each cut is first tried on a ScalarView. Cuts needing particles are
+        remembered and applied after the particle masks are set up.
+        """
+        self._defer_parts = True
+        try:
+            object_cuts = []
+            for i, cut in enumerate(self.cuts if self.cuts is not None else []):
+                if i in self._object_cuts:
+                    object_cuts.append(cut)
+                    continue
+                start = self.cutflow.timer() if self.cutflow is not None else None
+                func = compile_cut(cut) if isinstance(cut, str) else cut
+                try:
+                    mask = func(ScalarView(self))
+                except NotScalar:
+                    self._object_cuts.add(i)
+                    object_cuts.append(cut)
+                    continue
+                self.cut(mask, name=cut, start=start)
+        finally:
+            self._defer_parts = False
+        self._update_entry_ranges()
+        self.reset()
+        for cut in object_cuts:
             self.cut(cut)
         # for part, cut in self.part_cuts:
         #     self.mask_part
@@ -140,32 +533,72 @@ class NtupleGetter(BaseGetter):
         for key in list(self.syst_arr.keys()):
             if "/" not in key and 'vector' in self.tree[key].typename:
                 del self.syst_arr[key]
+        self.part_cache.evict(self.syst_unique)
+        self.mt2_cache.clear()
+        self._scale = self._get_weight(self.syst_unique)
+        if not self.isData:
+            self._scale = self.get_sf(systname) * self._scale
+        self._defer_parts = True
         self.reset()
-        for part in self.parts:
-            if f'{part}/pt_fix' in self.syst_arr:
-                self.syst_arr.pop(f'{part}/pt_fix')
-            if f'{part}/mas_fix' in self.syst_arr:
-                self.syst_arr.pop(f'{part}/mass_fix')
+        self._defer_parts = False
+        if self.cutflow is not None:
+            self.cutflow.start(self)
         self.apply_cuts()
-        self._scale = ak.to_numpy(self.tree['weight'].array()[:, self.syst_unique])
 
-        if not self.isData:
-            self._scale = self.get_sf(systname) * self._scale
 
+    def num_syst_indices(self):
+        """Number of systematic indices used by the bitmaps and the per systematic branches"""
+        return max(self.syst_indices.values(), default=len(self.all_systs)-1) + 1
+
+    def unpack_systematics(self, systs):
+        """Decode the particle masks of many systematics in one pass
+
+        Used before going through several systematics over the same entries:
+        each syst_bitMap is then unpacked once for all of them (see
+        `SystBitmap.unpack`) instead of being shifted for each systematic.
+
+        Parameters
+        ----------
+        systs : list of string
+            Systematics the getter will be set to
+        """
+        uniques = [self.all_systs.index(syst) for syst in systs if syst in self.all_systs]
+        indices = [self.syst_indices[i] for i in uniques] if self.syst_indices else uniques
+        if len(set(indices)) < 2:
+            return
+        self.part_cache.nsysts = max(indices) + 1
+        for bitmap in self.part_cache.bitmaps.values():
+            bitmap.unpack(self.part_cache.nsysts)
 
     def get_all_weights(self):
         all_weights = {}
         for i, systName in self.systNames:
-            base_wgt = ak.to_numpy(self.tree['weight'].array()[:, i])
+            base_wgt = self._get_weight(i)
             scale = self.get_sf(systName)*base_wgt
-            all_weights[systName] = scale[self.mask]
+            all_weights[systName] = scale[self.index]
         return all_weights
 
     def reset(self):
         self.clear_mask()
+        if self._defer_parts:
+            return
         for part in self.parts.values():
             part.reset_mask()
 
+    def _base_view(self):
+        """Getter selecting every event passing the base mask, sharing the arrays read
+
+        The view has its own selection and filtered columns, so values made
+        on it leave the current selection (and what is memoized for it) alone
+        """
+        view = object.__new__(type(self))
+        view.__dict__.update(self.__dict__)
+        view._index = self.base_index
+        view._mask = (-1, None)
+        view._filtered, view._filtered_gen = dict(), -1
+        view._memo = view._memo_state = None
+        return view
+
     def mergeParticles(self, merge, *parts):
         self.part_name = np.append(self.part_name, merge)
         self.parts[merge] = MergeParticle([self[part] for part in parts])
@@ -195,9 +628,8 @@ class NtupleGetter(BaseGetter):
         array
             Array of DeltaR between part1 and idx1 and part2 at idx2
         """
-        deta = self[part1]["eta", idx1] - self[part2]["eta", idx2]
-        dphi = self.dphi(part1, idx1, part2, idx2)
-        return np.sqrt(deta**2 + dphi**2)
+        p1, p2 = self[part1], self[part2]
+        return kin.delta_r(p1["eta", idx1], p1["phi", idx1], p2["eta", idx2], p2["phi", idx2])
 
     def dphi(self, part1, idx1, part2, idx2):
         """Calculates the DeltaPhi (normalized) between two particles in the event
@@ -218,10 +650,7 @@ class NtupleGetter(BaseGetter):
         array
             Array of DeltaPhi between part1 and idx1 and part2 at idx2
         """
-        dphi = ak.to_numpy(self[part1]["phi", idx1] - self[part2]["phi", idx2])
-        dphi[dphi > np.pi] = dphi[dphi > np.pi] - 2*np.pi
-        dphi[dphi < -np.pi] = dphi[dphi < -np.pi] + 2*np.pi
-        return dphi
+        return kin.wrap_phi(self[part1]["phi", idx1] - self[part2]["phi", idx2])
 
     def cosDtheta(self, part1, idx1, part2, idx2):
         """Calculates the cos(DeltaTheta) between two particles in the event
@@ -242,10 +671,8 @@ class NtupleGetter(BaseGetter):
         array
             Array of cos(DeltaTheta) between part1 and idx1 and part2 at idx2
         """
-        cosh_eta = np.cosh(self[part1]["eta", idx1]) * np.cosh(self[part2]["eta", idx2])
-        sinh_eta = np.sinh(self[part1]["eta", idx1]) * np.sinh(self[part2]["eta", idx2])
-        cos_dphi = np.cos(self[part1]["phi", idx1] - self[part2]["phi", idx2])
-        return (cos_dphi + sinh_eta) / cosh_eta
+        p1, p2 = self[part1], self[part2]
+        return kin.cos_dtheta(p1["eta", idx1], p1["phi", idx1], p2["eta", idx2], p2["phi", idx2])
 
     def dimass(self, part1, idx1, part2, idx2):
         """Calculates the mass between two particles in the event
@@ -266,15 +693,11 @@ class NtupleGetter(BaseGetter):
         array
             Array of mass between part1 and idx1 and part2 at idx2
         """
-        energy = self[part1]["energy", idx1] + self[part2]["energy", idx2]
-        px = self[part1]["px", idx1] + self[part2]["px", idx2]
-        py = self[part1]["py", idx1] + self[part2]["py", idx2]
-        pz = self[part1]["pz", idx1] + self[part2]["pz", idx2]
-        return np.sqrt(energy**2 - px**2 - py**2 - pz**2)
+        return kin.pair_mass(self[part1].p4(idx1), self[part2].p4(idx2))
 
     def dipart_mt(self, part1, idx1, part2, idx2):
-        ang_part = 1 - np.cos(self[part1]['phi', idx1] - self[part2]['phi', idx2])
-        return np.sqrt(2*self[part1]['pt', idx1]*self[part2]['pt', idx2]*ang_part)
+        p1, p2 = self[part1], self[part2]
+        return kin.transverse_mass(p1['pt', idx1], p1['phi', idx1], p2['pt', idx2], p2['phi', idx2])
 
     # def top_mass(self, part1, part2):
     #     energy = self.combine(self[part1].energy(), self[part2].energy()) + self["Met"]
@@ -285,6 +708,93 @@ class NtupleGetter(BaseGetter):
     #     return top[ak.argmin(np.abs(top - 172.76), axis=-1, keepdims=True)][:, 0]
 
 
+class SystBitmap:
+    """Decoded `syst_bitMap` of a particle
+
+    The bitmap (bit `i` set if the particle passes for systematic index `i`)
+    is kept as one flat unsigned array with the number of particles per
+    event, so the mask of any systematic is extracted without reading the
+    tree again.
+    """
+
+    def __init__(self, bitmap):
+        self.counts = ak.to_numpy(ak.num(bitmap, axis=-1))
+        self.bits = ak.to_numpy(ak.flatten(bitmap)).astype(np.uint64)
+        # Masks of the first systematics, one row per systematic index, once unpacked
+        self.unpacked = None
+
+    def mask(self, syst):
+        """Jagged mask of the particles passing for systematic index `syst`"""
+        if not 0 <= syst < 64:
+            raise ValueError(f"Systematic index {syst} is outside the 64 bits of syst_bitMap")
+        if self.unpacked is not None and syst < len(self.unpacked):
+            return ak.unflatten(self.unpacked[syst], self.counts)
+        return ak.unflatten((self.bits >> np.uint64(syst)) & np.uint64(1) != 0, self.counts)
+
+    def unpack(self, nsysts):
+        """Decode the masks of the first `nsysts` systematics in one pass
+
+        The masks are kept, so `mask` only takes a row of them afterwards
+
+        Returns
+        -------
+        awkward.Array
+            Boolean array of shape (events, particles, systematics)
+        """
+        if not 0 < nsysts <= 64:
+            raise ValueError(f"Can't unpack {nsysts} systematics from the 64 bits of syst_bitMap")
+        if self.unpacked is None or len(self.unpacked) < nsysts:
+            as_bytes = self.bits.astype('<u8').view(np.uint8).reshape(-1, 8)
+            bits = np.unpackbits(as_bytes, axis=1, bitorder='little')[:, :nsysts]
+            self.unpacked = np.ascontiguousarray(bits.T, dtype=bool)
+        return ak.unflatten(np.ascontiguousarray(self.unpacked[:nsysts].T), self.counts)
+
+
+class ParticleCache:
+    """Cache of particle columns that change with the systematic
+
+    Raw branches (eg `Jets/pt_shift` holding every JEC/JER shift) and the
+    decoded `syst_bitMap` of each particle are read once and kept for the
+    life of the entry range. The columns made from them
+    are stored under (particle, variable, systematic index) and are evicted
+    when the getter moves to another systematic. With `nsysts` set, the
+    bitmaps are unpacked for that many systematics when decoded.
+    """
+
+    def __init__(self):
+        self.raw = dict()
+        self.columns = dict()
+        self.bitmaps = dict()
+        self.nsysts = None
+
+    def get_raw(self, name, read):
+        if name not in self.raw:
+            self.raw[name] = read(name)
+        return self.raw[name]
+
+    def get(self, key, make):
+        if key not in self.columns:
+            self.columns[key] = make()
+        return self.columns[key]
+
+    def evict(self, syst=None):
+        """Drop the columns not made for systematic index `syst` (all if None)"""
+        self.columns = {key: arr for key, arr in self.columns.items()
+                        if syst is not None and key[2] == syst}
+
+    def get_bitmap(self, name, read):
+        if name not in self.bitmaps:
+            self.bitmaps[name] = SystBitmap(self.get_raw(name, read))
+            if self.nsysts is not None:
+                self.bitmaps[name].unpack(self.nsysts)
+        return self.bitmaps[name]
+
+    def clear(self):
+        self.raw.clear()
+        self.columns.clear()
+        self.bitmaps.clear()
+
+
 class ParticleBase:
     def __init__(self, vg):
         self.vg = vg
@@ -298,7 +808,17 @@ class ParticleBase:
     def reset(self):
         pass
 
+    def _on(self, vg):
+        """Copy of the particle reading from another getter (see `NtupleGetter._base_view`)"""
+        part = object.__new__(type(self))
+        part.__dict__.update(self.__dict__)
+        part.vg = vg
+        return part
+
     def num(self):
+        return self.vg.memo((self, "num"), self._num)
+
+    def _num(self):
         return ak.num(self.shape(), axis=-1)
 
     def scale(self, idx):
@@ -320,6 +840,48 @@ class ParticleBase:
             return self.vg.scale[self.num() > idx]
 
 
+    def p4(self, idx=-1, pad=False):
+        """Energy, px, py and pz of the particle at index `idx`"""
+        return [self[var, idx, pad] if pad is not False else self[var, idx]
+                for var in ("energy", "px", "py", "pz")]
+
+    def pair_dr(self):
+        """DeltaR of every pair of particles in each event, ordered (0,1), (0,2), ..., (1,2), ..."""
+        return kin.pairwise_delta_r(self["eta", -1], self["phi", -1])
+
+    def pair_mass(self):
+        """Invariant mass of every pair of particles in each event (same order as `pair_dr`)"""
+        return kin.pairwise_mass(self.p4())
+
+    def pair_mt(self):
+        """Transverse mass of every pair of particles in each event (same order as `pair_dr`)"""
+        return kin.pairwise_transverse_mass(self["pt", -1], self["phi", -1])
+
+    def top_n(self, variables, n, pad):
+        """Get variables of the leading particles in each event as one dense block
+
+        Parameters
+        ----------
+        variables : list of string
+            Variables (or function names) to fill
+        n : int
+            Number of leading particles kept per event
+        pad : float
+            Value used when an event has fewer than `n` particles
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of shape (events, n, variables), with the dtype of the
+            padded variables (the same as `self[var, i, pad]`)
+        """
+        arrays = [ak.to_numpy(ak.fill_none(ak.pad_none(self[var, -1], n, axis=-1, clip=True), pad))
+                  for var in variables]
+        block = np.empty((len(self), n, len(variables)), dtype=np.result_type(*arrays))
+        for i, arr in enumerate(arrays):
+            block[:, :, i] = arr
+        return block
+
     def get_hist(self, var, idx=-1):
         """Get the values and scales to make a histogram for a given variable
 
@@ -373,6 +935,8 @@ class Particle(ParticleBase):
     def __init__(self, name, vg):
         super().__init__(vg)
         self.name = name
+        self._p4 = None
+        self._event_mask = None
         # self.reset_mask()
 
     def __getattr__(self, var):
@@ -404,73 +968,104 @@ class Particle(ParticleBase):
     def __len__(self):
         return len(self.mask)
 
+    def _is_shifted(self, var):
+        return var in ('pt', 'mass') and self.vg.is_jec_unc and "Jet" in self.name
+
+    def _full_column(self, var):
+        if self._is_shifted(var):
+            return self.vg.get_shifted(self.name, var)
+        return self.vg._get_arr(f"{self.name}/{var}")
+
+    def _column(self, var):
+        if self._is_shifted(var):
+            return self.vg.get_shifted(self.name, var)[self.vg.mask]
+        return self.vg[f"{self.name}/{var}"]
+
     def _get_val(self, var, idx=-1, pad=False):
+        return self._select(self._column(var)[self.mask], idx, pad)
+
+    def _select(self, vals, idx=-1, pad=False):
         if pad:
             # vals = ak.where(self.num()>idx, self.vg[f"{self.name}/{var}"][self.mask, idx:idx+1]  pad)
-            vals = ak.fill_none(ak.firsts(self.vg[f"{self.name}/{var}"][self.mask][:,idx:idx+1]), pad)
+            vals = ak.fill_none(ak.firsts(vals[:,idx:idx+1]), pad)
             return ak.to_numpy(vals)
             # vals = ak.fill_none(ak.pad_none(self.vg[f"{self.name}/{var}"][self.mask], idx + 1), pad)
         elif idx == -1:
-            return self.vg[f"{self.name}/{var}"][self.mask]
+            return vals
         else:
-            vals = self.vg[f"{self.name}/{var}"][self.mask][self.num() > idx]
+            vals = vals[self.num() > idx]
         return ak.to_numpy(vals[:, idx])
 
+    def _four_vector(self):
+        """Jagged energy, px, py and pz of the particles, computed once per mask state"""
+        if self._p4 is None or self._p4[0] != self.vg._mask_gen:
+            pt = self("pt", -1)
+            flat = [ak.flatten(pt)] + [ak.flatten(self(var, -1)) for var in ("eta", "phi", "mass")]
+            counts = ak.num(pt, axis=-1)
+            self._p4 = (self.vg._mask_gen, [ak.unflatten(comp, counts) for comp in kin.four_vector(*flat)])
+        return self._p4[1]
+
+    def p4(self, idx=-1, pad=False):
+        return [self._select(comp, idx, pad) for comp in self._four_vector()]
+
     def reset_mask(self):
-        self._base_mask = (
-            np.bitwise_and(self.vg._get_var_nosyst(f"{self.name}/syst_bitMap"), self.vg.syst_bit)
-            != 0
-        )
+        self._base_mask = self.bitmap().mask(self.vg.syst)
         self.clear_mask()
 
+    def bitmap(self):
+        return self.vg.part_cache.get_bitmap(f"{self.name}/syst_bitMap", self.vg._get_var_nosyst)
+
+    def syst_masks(self, nsysts=None):
+        """Particle masks for all systematics at once for the selected events
+
+        Parameters
+        ----------
+        nsysts : int, optional
+            Number of systematic indices (all of the getter by default)
+
+        Returns
+        -------
+        awkward.Array
+            Boolean array of shape (events, particles, systematics)
+        """
+        if nsysts is None:
+            nsysts = self.vg.num_syst_indices()
+        return self.bitmap().unpack(nsysts)[self.vg.index]
+
     def clear_mask(self):
         self._mask = copy(self._base_mask)
+        self._p4 = None
+        self._event_mask = None
+
+    def _on(self, vg):
+        part = super()._on(vg)
+        part._p4 = None
+        part._event_mask = None
+        return part
 
     def shape(self):
         return self.pt()
 
     # Special function for allowing jec in pt
     def pt(self, *args):
-        if self.vg.is_jec_unc and "Jet" in self.name:
-            if f'{self.name}/pt_fix' not in  self.vg.arr:
-                if f'{self.name}/pt_shift' in self.vg.tree:
-                    self.vg.syst_arr[f'{self.name}/pt_fix'] = self.vg.tree[f"{self.name}/pt_shift"].array()[:, :, self.vg.syst-1]
-                    self.vg.branches.append(f'{self.name}/pt_fix')
-                else:
-                    sname = self.vg.syst_name
-                    syst = sname[:sname.rindex('_')]
-                    var = "pt"+sname[sname.rindex('_'):].lower()
-                    self.vg.syst_arr[f'{self.name}/pt_fix'] = self.vg.tree[f"{self.name}_{syst}"][var].array()
-                    self.vg.branches.append(f'{self.name}/pt_fix')
-            return self._get_val('pt_fix', *args)
-        else:
-            return self._get_val("pt", *args)
+        return self._get_val("pt", *args)
 
-    # Special function for allowing jec in pt
+    # Special function for allowing jec in mass
     def mass(self, *args):
-        if self.vg.is_jec_unc and "Jet" in self.name:
-            if f'{self.name}/mass_fix' not in  self.vg.arr:
-                if f'{self.name}/mass_shift' in self.vg.tree:
-                    self.vg.syst_arr[f'{self.name}/mass_fix'] = self.vg.tree[f"{self.name}/mass_shift"].array()[:, :, self.vg.syst-1]
-                    self.vg.branches.append(f'{self.name}/mass_fix')
-                else:
-                    sname = self.vg.syst_name
-                    syst = sname[:sname.rindex('_')]
-                    var = "mass"+sname[sname.rindex('_'):].lower()
-                    self.vg.syst_arr[f'{self.name}/mass_fix'] = self.vg.tree[f"{self.name}_{syst}"][var].array()
-                    self.vg.branches.append(f'{self.name}/mass_fix')
-            return self._get_val('mass_fix', *args)
-        else:
-            return self._get_val("mass", *args)
+        return self._get_val("mass", *args)
 
     @property
     def mask(self):
-        return self._mask[self.vg.mask]
+        if self._event_mask is None or self._event_mask[0] != self.vg._mask_gen:
+            self._event_mask = (self.vg._mask_gen, self._mask[self.vg.index])
+        return self._event_mask[1]
 
     def mask_part(self, var, func):
-        if var in ['pt', 'mass'] and "Jets" in self.name:
-            var += '_fix'
-        self._mask = func(self.vg._get_arr(f'{self.name}/{var}')) * self._mask
+        self._mask = func(self._full_column(var)) * self._mask
+        self._p4 = None
+        self._event_mask = None
+        # Values memoized for the selection (counts, MT2, graphs) change with the particles
+        self.vg._mask_gen += 1
 
     # Functions for a particle
 
@@ -480,27 +1075,28 @@ class Particle(ParticleBase):
     def ptsum(self):
         return ak.sum(self("pt", -1), axis=-1)
 
-    def num(self):
+    def _num(self):
         return ak.to_numpy(ak.count_nonzero(self.mask, axis=1))
 
     def px(self, *args):
-        return self("pt", *args) * np.cos(self("phi", *args))
+        return self._select(self._four_vector()[1], *args)
 
     def py(self, *args):
-        return self("pt", *args) * np.sin(self("phi", *args))
+        return self._select(self._four_vector()[2], *args)
 
     def pz(self, *args):
-        return self('pt', *args) * np.sinh(self("eta", *args))
+        return self._select(self._four_vector()[3], *args)
 
     def energy(self, *args):
-        return np.sqrt(
-            self("mass", *args) ** 2 + (self("pt", *args) * np.cosh(self("eta", *args))) ** 2
-        )
+        return self._select(self._four_vector()[0], *args)
 
     def mt(self, idx=-1, *args):
         mask = self.num() > idx
-        angle_part = 1 - np.cos(self("phi", idx, *args) - self.vg["Met_phi"][mask])
-        return np.sqrt(2 * self("pt", idx, *args) * self.vg["Met"][mask] * angle_part)
+        if idx == -1:
+            angle_part = 1 - np.cos(self("phi", idx, *args) - self.vg["Met_phi"][mask])
+            return np.sqrt(2 * self("pt", idx, *args) * self.vg["Met"][mask] * angle_part)
+        return kin.transverse_mass(self("pt", idx, *args), self("phi", idx, *args),
+                                   self.vg["Met"][mask], self.vg["Met_phi"][mask])
 
     def mt_fix(self, idx=-1, *args):
         mask = self.num() > idx
@@ -514,18 +1110,27 @@ class Particle(ParticleBase):
 
 
 class MergeParticle(ParticleBase):
-    """ """
+    """Collection made from several particles, sorted by pt
+
+    The merged variables are built once per systematic and cut state: each
+    variable is concatenated over the constituents for all events passing
+    the base mask and reordered with a stored pt sort. Reads afterwards only
+    apply the current event mask to these arrays.
+    """
 
     def __init__(self, parts):
         super().__init__(parts[0].vg)
         self.parts = parts
+        self._idx_sort = None
+        self._fields = dict()
         # self.reset()
 
     def reset_mask(self):
        self.reset()
 
     def reset(self):
-        self._idx_sort = ak.argsort(self._get_combined_item("pt"), ascending=False)
+        self._idx_sort = None
+        self._fields = dict()
 
     def __getstate__(self):
         return self.__dict__
@@ -534,11 +1139,11 @@ class MergeParticle(ParticleBase):
         self.__dict__ = d
 
     def __getattr__(self, var):
-        return self._get_combined_item(var)[self._sort]
+        return self._field(var)[self.mask]
 
     def __getitem__(self, idx):
         var, *idx = idx
-        vals = self._get_combined_item(var)[self._sort]
+        vals = self._field(var)[self.mask]
         if len(idx) == 1:
             if idx[0] == -1:
                 return vals
@@ -551,14 +1156,28 @@ class MergeParticle(ParticleBase):
     def __len__(self):
         return len(self._sort)
 
-    def _get_combined_item(self, var):
-        if callable(getattr(self.parts[0], var)):
+    def _base_item(self, var):
+        """Merged `var` for all events passing the base mask, made on a view of the getter"""
+        view = self.vg._base_view()
+        return self._get_combined_item(var, [part._on(view) for part in self.parts])
+
+    def _field(self, var):
+        if self._idx_sort is None:
+            pt = self._base_item("pt")
+            self._idx_sort = ak.argsort(pt, ascending=False)
+            self._fields["pt"] = pt[self._idx_sort]
+        if var not in self._fields:
+            self._fields[var] = self._base_item(var)[self._idx_sort]
+        return self._fields[var]
+
+    def _get_combined_item(self, var, parts):
+        if callable(getattr(parts[0], var)):
             return ak.concatenate(
-                [getattr(part, var)() for part in self.parts], axis=-1
+                [getattr(part, var)() for part in parts], axis=-1
             )
         else:
             return ak.concatenate(
-                [part.__getattr__(var) for part in self.parts], axis=-1
+                [part.__getattr__(var) for part in parts], axis=-1
             )
 
     def shape(self):
@@ -571,6 +1190,7 @@ class MergeParticle(ParticleBase):
 
     @property
     def _sort(self):
+        self._field("pt")
         return self._idx_sort[self.mask]
 
     @property
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Leading particle columns (eg `j1Pt`...`j5Pt`) described by a `topn` spec
+
+The spec in the inputs is a list of
+(particle, number of particles, pad value, {variable: column name format}).
+`topn_allvars` makes the allvar functions of these columns, and when
+flattening `get_topn_columns` fills all of them from one `top_n` block per
+particle instead of calling each function.
+"""
+
+
+def get_topn_name(fmt, i):
+    return fmt.format(i+1)
+
+
+def topn_allvars(topn):
+    """Allvar functions of the columns of a `topn` spec, in the spec order
+
+    Returns
+    -------
+    dict
+        Column name to function of the getter
+    """
+    allvars = {}
+    for part, n, pad, names in topn:
+        for var, fmt in names.items():
+            for i in range(n):
+                allvars[get_topn_name(fmt, i)] = lambda vg, part=part, var=var, i=i, pad=pad: vg[part][var, i, pad]
+    return allvars
+
+
+def get_topn_columns(vg, topn, allvars):
+    """Fill the leading particle columns of `allvars` from one block per particle
+
+    Parameters
+    ----------
+    topn : list of tuple
+        (particle, number of particles, pad value, {variable: column name format})
+    allvars : dict
+        Only columns in the variable definitions are returned
+
+    Returns
+    -------
+    dict
+        Column name to numpy array
+    """
+    columns = {}
+    for part, n, pad, names in topn:
+        wanted = [(i, j, get_topn_name(fmt, i)) for j, fmt in enumerate(names.values()) for i in range(n)]
+        wanted = [(i, j, name) for i, j, name in wanted if name in allvars]
+        if not wanted:
+            continue
+        block = vg[part].top_n(list(names.keys()), n, pad)
+        for i, j, name in wanted:
+            columns[name] = block[:, i, j]
+    return columns
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+from analysis_suite.commons.column_builder import ColumnBuilder
+
+
+def make_member(nevents, nvars, rng):
+    return {f'var{i}': rng.random(nevents) for i in range(nvars)}
+
+
+def concat_accumulate(members):
+    final = pd.DataFrame()
+    for member in members:
+        final = pd.concat([final, pd.DataFrame.from_dict(member)], ignore_index=True)
+    return final
+
+
+def builder_accumulate(members):
+    builder = ColumnBuilder()
+    for member in members:
+        builder.append(member)
+    return builder.build()
+
+
+def timeit(func, members, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(members)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare pd.concat accumulation to the ColumnBuilder")
+    parser.add_argument("-m", "--members", default="25,50,100,200,400",
+                        type=lambda x : [int(i) for i in x.split(',')],
+                        help="Number of members to accumulate")
+    parser.add_argument("-e", "--events", default=5000, type=int, help="Events per member")
+    parser.add_argument("-v", "--nvars", default=60, type=int, help="Columns per member")
+    parser.add_argument("-r", "--repeat", default=3, type=int)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(12345)
+    print(f"{'Members':>8} {'pd.concat (s)':>14} {'builder (s)':>12} {'concat/member (ms)':>19} {'builder/member (ms)':>20}")
+    for nmembers in args.members:
+        members = [make_member(args.events, args.nvars, rng) for _ in range(nmembers)]
+        concat_time = timeit(concat_accumulate, members, args.repeat)
+        builder_time = timeit(builder_accumulate, members, args.repeat)
+        print(f"{nmembers:>8} {concat_time:>14.3f} {builder_time:>12.3f} "
+              f"{1000*concat_time/nmembers:>19.2f} {1000*builder_time/nmembers:>20.2f}")
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+import argparse
+import time
+import awkward as ak
+import numpy as np
+
+import analysis_suite.flatten.kinematics as kin
+from analysis_suite.flatten.ntuplegetter import NtupleGetter, Particle
+
+
+def make_leptons(nevents, rng):
+    counts = rng.integers(2, 5, nevents)
+    total = counts.sum()
+    pt = np.sort(rng.exponential(40., total) + 15.)[::-1]
+    eta = rng.uniform(-2.5, 2.5, total)
+    phi = rng.uniform(-np.pi, np.pi, total)
+    mass = rng.choice([0.000511, 0.1057], total)
+    return {var: ak.unflatten(arr, counts) for var, arr in
+            zip(("pt", "eta", "phi", "mass"), (pt, eta, phi, mass))}
+
+
+def make_getter(leps, name="TightLepton"):
+    """NtupleGetter over in memory particles, set up as after reading an ntuple"""
+    vg = NtupleGetter({}, "Signal", "ttt", 1., executor=None, file_manager=None)
+    vg.part_name = [name]
+    vg.branches = [f"{name}/{var}" for var in leps]
+    vg.syst_arr.update({f"{name}/{var}": arr for var, arr in leps.items()})
+    vg.is_jec_unc = False
+    vg._base_mask = np.ones(len(leps["pt"]), dtype=bool)
+    part = vg.parts[name] = Particle(name, vg)
+    part._base_mask = ak.ones_like(leps["pt"], dtype=bool)
+    part.clear_mask()
+    vg.clear_mask()
+    return vg
+
+
+# Getter methods as they were before the kernels, going through the same particle access
+def old_dphi(vg, name):
+    dphi = ak.to_numpy(vg[name]["phi", 0] - vg[name]["phi", 1])
+    dphi[dphi > np.pi] = dphi[dphi > np.pi] - 2*np.pi
+    dphi[dphi < -np.pi] = dphi[dphi < -np.pi] + 2*np.pi
+    return dphi
+
+
+def old_dr(vg, name):
+    deta = vg[name]["eta", 0] - vg[name]["eta", 1]
+    return np.sqrt(deta**2 + old_dphi(vg, name)**2)
+
+
+def old_p4(part, *args):
+    pt, eta, phi, mass = [part(var, *args) for var in ("pt", "eta", "phi", "mass")]
+    return np.sqrt(mass**2 + (pt*np.cosh(eta))**2), pt*np.cos(phi), pt*np.sin(phi), pt*np.sinh(eta)
+
+
+def old_dimass(vg, name):
+    (e1, px1, py1, pz1), (e2, px2, py2, pz2) = old_p4(vg[name], 0), old_p4(vg[name], 1)
+    return np.sqrt((e1+e2)**2 - (px1+px2)**2 - (py1+py2)**2 - (pz1+pz2)**2)
+
+
+def old_mt(vg, name):
+    ang_part = 1 - np.cos(vg[name]['phi', 0] - vg[name]['phi', 1])
+    return np.sqrt(2*vg[name]['pt', 0]*vg[name]['pt', 1]*ang_part)
+
+
+def old_pairs(vg, name):
+    p4 = ak.zip(dict(zip(("e", "px", "py", "pz"), old_p4(vg[name], -1))))
+    leps = ak.zip({"eta": vg[name]["eta", -1], "phi": vg[name]["phi", -1]})
+    pairs, p4_pairs = ak.combinations(leps, 2), ak.combinations(p4, 2)
+    deta = pairs["0"].eta - pairs["1"].eta
+    dphi = (pairs["0"].phi - pairs["1"].phi + np.pi) % (2*np.pi) - np.pi
+    first, second = p4_pairs["0"], p4_pairs["1"]
+    mass = np.sqrt((first.e+second.e)**2 - (first.px+second.px)**2
+                   - (first.py+second.py)**2 - (first.pz+second.pz)**2)
+    return np.sqrt(deta**2 + dphi**2), mass
+
+
+def old_all(vg, name="TightLepton"):
+    return (old_dr(vg, name), old_dimass(vg, name), old_mt(vg, name)) + old_pairs(vg, name)
+
+
+def new_all(vg, name="TightLepton"):
+    return (vg.dr(name, 0, name, 1), vg.dimass(name, 0, name, 1), vg.dipart_mt(name, 0, name, 1),
+            vg[name].pair_dr(), vg[name].pair_mass())
+
+
+def timeit(func, vg, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        vg.clear_mask()  # New selection, so nothing memoized is reused
+        start = time.perf_counter()
+        func(vg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the getter kinematics to their implementation before the kernels")
+    parser.add_argument("-e", "--events", default="10000,100000,1000000",
+                        type=lambda x : [int(i) for i in x.split(',')],
+                        help="Number of events in the synthetic multilepton sample")
+    parser.add_argument("-r", "--repeat", default=3, type=int)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(12345)
+    print(f"Compiled kernels: {kin.has_numba}")
+    new_all(make_getter(make_leptons(100, rng)))  # Compile before timing
+    print(f"{'Events':>10} {'before (s)':>12} {'kernels (s)':>12} {'speedup':>8}")
+    for nevents in args.events:
+        vg = make_getter(make_leptons(nevents, rng))
+        old, new = old_all(vg), new_all(vg)
+        for old_vals, new_vals in zip(old, new):
+            if old_vals.ndim > 1:
+                old_vals, new_vals = ak.flatten(old_vals), ak.flatten(new_vals)
+            assert np.allclose(old_vals, new_vals)
+        old_time = timeit(old_all, vg, args.repeat)
+        new_time = timeit(new_all, vg, args.repeat)
+        print(f"{nevents:>10} {old_time:>12.3f} {new_time:>12.3f} {old_time/new_time:>8.2f}")
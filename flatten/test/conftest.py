@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+from types import SimpleNamespace
+import pytest
+
+
+class FakeBranch:
+    def __init__(self, tree, name):
+        self.tree, self.name = tree, name
+        self.typename = tree.types.get(name, "float")
+
+    def keys(self):
+        return [key for key in self.tree.columns if key.startswith(f"{self.name}/")]
+
+    def array(self, entry_start=0, entry_stop=None, decompression_executor=None):
+        entry_stop = self.tree.num_entries if entry_stop is None else entry_stop
+        self.tree.reads.append((self.name, entry_start, entry_stop))
+        return self.tree.columns[self.name][entry_start:entry_stop]
+
+
+class FakeTree:
+    """In memory stand-in for an ntuple tree, recording the entry ranges read
+
+    Columns named `part/var` make a particle `part`, the other columns are
+    event level branches
+    """
+
+    def __init__(self, columns, types=None, offsets=None):
+        self.columns, self.types, self.reads = columns, types or {}, []
+        self.num_entries = len(next(iter(columns.values())))
+        self.offsets = [0, self.num_entries] if offsets is None else offsets
+        self.parts = sorted({name.split("/")[0] for name in columns if "/" in name})
+        self.file = SimpleNamespace(closed=False, file_path="fake.root", uuid="0")
+        self.object_path = "/ttt/Signal"
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __getitem__(self, name):
+        return FakeBranch(self, name)
+
+    def items(self):
+        return [(name, self[name]) for name in self.parts + list(self.columns)]
+
+    def typenames(self):
+        return {**{name: self.types.get(name, "float") for name in self.columns},
+                **{part: "std::vector<ParticleOut>" for part in self.parts}}
+
+    def common_entry_offsets(self):
+        return self.offsets
+
+    def arrays(self, filter_name, how, entry_start, entry_stop, decompression_executor=None):
+        return {name: self[name].array(entry_start, entry_stop) for name in filter_name}
+
+
+class FakeNamed:
+    def __init__(self, **members):
+        self.members = members
+
+    def member(self, key):
+        return self.members[key]
+
+
+def make_ntuple(columns, systs, types=None, offsets=None, group="ttt", treename="Signal"):
+    """File holding one ntuple tree, in the layout read by NtupleGetter"""
+    import numpy as np
+    sumweight = SimpleNamespace(to_numpy=lambda: (np.ones(14), np.arange(15)))
+    tree = FakeTree(columns, types, offsets)
+    return {group: {"Systematics": [FakeNamed(fName=syst) for syst in systs],
+                    "sumweight": sumweight, treename: tree}}
+
+
+@pytest.fixture
+def ntuple():
+    return make_ntuple
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+import pytest
+
+np = pytest.importorskip("numpy")
+ak = pytest.importorskip("awkward")
+flatgetter = pytest.importorskip("analysis_suite.flatten.flatgetter")
+
+
+class FakeFlatTree:
+    def __init__(self, arrays):
+        self._arrays = arrays
+
+    def __repr__(self):
+        return "<TTree 'ttt'>"
+
+    def arrays(self):
+        return self._arrays
+
+
+def make_flat(nevents=50):
+    rng = np.random.default_rng(3)
+    arr = ak.zip({"HT": rng.uniform(0, 1000, nevents), "NJets": rng.integers(0, 8, nevents),
+                  "scale_factor": rng.normal(1, 0.1, nevents)})
+    return flatgetter.FlatGetter({"ttt": FakeFlatTree(arr)}, "ttt"), arr
+
+
+def test_index_matches_mask():
+    fg, arr = make_flat()
+    ht, njets, scale = [ak.to_numpy(arr[var]) for var in ("HT", "NJets", "scale_factor")]
+    fg.cut(lambda vg: vg["NJets"] >= 2)
+    fg.mask = lambda vg: vg["HT"] > 300
+    expected = (njets >= 2) & (ht > 300)
+    assert np.array_equal(fg.mask, expected)
+    assert not fg.mask.flags.writeable
+    assert np.array_equal(fg.index, np.flatnonzero(expected))
+    assert np.array_equal(fg["HT"], ht[expected])
+    assert np.allclose(fg.scale, scale[expected])
+    assert len(fg) == np.count_nonzero(expected)
+
+    fg.reset()
+    assert np.array_equal(fg.mask, njets >= 2)
+    assert np.array_equal(fg["NJets"], njets[njets >= 2])
+
+
+def test_filtered_columns_are_read_only():
+    fg, arr = make_flat()
+    fg.mask = lambda vg: vg["HT"] > 300
+    ht = fg["HT"]
+    assert fg["HT"] is ht
+    with pytest.raises(ValueError):
+        ht[0] = 0.
+    assert np.array_equal(fg["HT"], ak.to_numpy(arr["HT"])[ak.to_numpy(arr["HT"]) > 300])
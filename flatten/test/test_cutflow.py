@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+import json
+import pytest
+
+np = pytest.importorskip("numpy")
+ak = pytest.importorskip("awkward")
+ntuplegetter = pytest.importorskip("analysis_suite.flatten.ntuplegetter")
+cutflow = pytest.importorskip("analysis_suite.flatten.cutflow")
+
+key = ("ttt", "Signal", "Nominal")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [0.]
+    monkeypatch.setattr(cutflow.CutFlow, "timer", staticmethod(lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def make_getter(ntuple):
+    def make(cuts):
+        pt = ak.Array([[50.], [], [40., 30.], [20.], [], [60.]])
+        columns = {
+            "Jets/pt": pt, "Jets/eta": pt*0, "Jets/phi": pt*0, "Jets/mass": pt*0,
+            "Jets/syst_bitMap": ak.values_astype(pt*0 + 1, np.uint64),
+            "PassEvent": ak.values_astype(ak.Array([[1]]*6), bool),
+            "weight": ak.Array([[1.], [2.], [1.], [0.5], [1.], [3.]]),
+            "Met": np.array([10., 30., 50., 25., 40., 5.]),
+        }
+        types = {"PassEvent": "std::vector<bool>", "weight": "std::vector<float>"}
+        vg = ntuplegetter.NtupleGetter(ntuple(columns, ["Nominal"], types), "Signal", "ttt", 1., cuts=cuts,
+                                       cutflow=cutflow.CutFlow(), executor=None, file_manager=None)
+        vg.set_systematic("Nominal")
+        return vg
+    return make
+
+
+def yields(vg):
+    return [(step["depth"], step["events"], step["sumw"]) for step in vg.cutflow.flows[key].values()]
+
+
+def test_steps_follow_cuts_and_masks(make_getter, clock):
+    vg = make_getter(["Met > 20", lambda vg: vg["Jets"].num() >= 1])
+    assert list(vg.cutflow.flows[key])[1] == ("Initial", "Met > 20")
+    assert yields(vg) == [(0, 6, 8.5), (1, 4, 4.5), (2, 2, 1.5)]
+
+    vg.mask = lambda vg: vg["Met"] > 30
+    vg.clear_mask()
+    vg.mask = lambda vg: vg["Met"] < 30
+    assert yields(vg)[3:] == [(3, 1, 1.), (3, 1, 0.5)]
+
+
+def test_event_cut_time_counts_evaluation(make_getter, clock):
+    def slow_cut(vg):
+        clock[0] += 5.
+        return vg["Met"] > 20
+
+    vg = make_getter([slow_cut])
+    steps = list(vg.cutflow.flows[key].values())
+    assert steps[1]["events"] == 4
+    assert steps[1]["time"] == 5.
+
+
+def test_chunks_add_up(make_getter, tmp_path):
+    flow = cutflow.CutFlow()
+    for _ in range(2):
+        vg = make_getter(["Met > 20"])
+        vg.cutflow = flow
+        vg.set_systematic("Nominal")
+    flow.write_out(tmp_path, "cutflow")
+    with open(tmp_path/"cutflow.json") as f:
+        steps = json.load(f)["ttt"]["Signal"]["Nominal"]
+    assert [(step["path"], step["events"]) for step in steps] == [(["Initial"], 12), (["Initial", "Met > 20"], 8)]
+    assert (tmp_path/"cutflow.log").exists()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+import pytest
+
+np = pytest.importorskip("numpy")
+ak = pytest.importorskip("awkward")
+kin = pytest.importorskip("analysis_suite.flatten.kinematics")
+
+
+def test_jagged_inputs_keep_structure_and_dtype():
+    eta = ak.values_astype(ak.Array([[0., 1.], [], [2.]]), np.float32)
+    phi = ak.values_astype(ak.Array([[0., 3.], [], [-3.]]), np.float32)
+    dr = kin.delta_r(eta, phi, eta*0, phi*0)
+    assert ak.to_list(ak.num(dr)) == [2, 0, 1]
+    assert ak.to_numpy(ak.flatten(dr)).dtype == np.float32
+    assert np.allclose(ak.flatten(dr), np.hypot([0., 1., 2.], [0., 3., -3.]))
+    assert np.allclose(ak.flatten(kin.wrap_phi(phi - 4.)), [2*np.pi - 4., -1., -7. + 2*np.pi])
+
+
+def test_pairwise_kernels():
+    eta = ak.Array([[0., 1., 3.], [0.5], [], [0., 0.]])
+    phi = ak.Array([[0., 0., 0.], [1.], [], [3., -3.]])
+    dr = kin.pairwise_delta_r(eta, phi)
+    assert ak.to_list(ak.num(dr)) == [3, 0, 0, 1]
+    assert np.allclose(ak.flatten(dr), [1., 3., 2., 2*np.pi - 6.])
+
+    pt = ak.Array([[1., 1.], [2.]])
+    mt = kin.pairwise_transverse_mass(pt, ak.Array([[0., np.pi], [0.]]))
+    assert ak.to_list(ak.num(mt)) == [1, 0]
+    assert np.allclose(ak.flatten(mt), [2.])
+
+
+def test_pairwise_mass_matches_two_body_mass():
+    rng = np.random.default_rng(5)
+    counts = rng.integers(0, 5, 200)
+    pt, eta, phi, mass = [ak.unflatten(vals, counts) for vals in
+                          (rng.uniform(10, 100, counts.sum()), rng.uniform(-2.5, 2.5, counts.sum()),
+                           rng.uniform(-np.pi, np.pi, counts.sum()), rng.uniform(0, 1, counts.sum()))]
+    p4 = kin.four_vector(pt, eta, phi, mass)
+    pairs = ak.argcombinations(pt, 2)
+    expected = kin.pair_mass([comp[pairs["0"]] for comp in p4], [comp[pairs["1"]] for comp in p4])
+    masses = kin.pairwise_mass(p4)
+    assert ak.to_list(ak.num(masses)) == ak.to_list(ak.num(pairs))
+    assert np.allclose(ak.flatten(masses), ak.flatten(expected))
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+from types import SimpleNamespace
+import pytest
+
+manifest = pytest.importorskip("analysis_suite.flatten.manifest")
+
+ntuple = SimpleNamespace(cut=[lambda vg: vg["NJets"] > 1], branches=None, trees=["Signal"],
+                         tree_groups={"Signal": ["ttt"]}, group_trees={"ttt": ["Signal"]})
+allvars = {"HT": lambda vg: vg["HT"]}
+
+
+@pytest.fixture
+def files(tmp_path):
+    inputs = [tmp_path / "a.root", tmp_path / "b.root"]
+    for path in inputs:
+        path.write_bytes(b"0"*10)
+    output = tmp_path / "processed_Nominal_signal.root"
+    output.write_bytes(b"0")
+    written = manifest.Manifest(output, allvars, ntuple)
+    written.add_file(inputs[0], {"ttt"})
+    written.add_file(inputs[1], {"ttz"})
+    written.write()
+    return output, inputs
+
+
+def test_unchanged_inputs_are_skipped(files):
+    output, inputs = files
+    current = manifest.Manifest(output, allvars, ntuple)
+    assert current.is_current(inputs)
+    assert current.stale_outnames(inputs, lambda name: set()) == set()
+
+
+def test_changed_input_remakes_its_trees(files):
+    output, inputs = files
+    inputs[1].write_bytes(b"0"*11)
+    current = manifest.Manifest(output, allvars, ntuple)
+    assert not current.is_current(inputs)
+    stale = current.stale_outnames(inputs, lambda name: {"ttz"})
+    assert stale == {"ttz"}
+    assert current.kept_outnames(stale) == {"ttt"}
+
+
+def test_changed_config_remakes_everything(files):
+    output, inputs = files
+    current = manifest.Manifest(output, {"HT": lambda vg: 2*vg["HT"]}, ntuple)
+    assert not current.is_current(inputs)
+    assert current.stale_outnames(inputs, lambda name: set()) is None
+
+
+def test_removed_manifest_remakes_everything(files):
+    output, inputs = files
+    manifest.Manifest(output, allvars, ntuple).remove()
+    assert manifest.Manifest(output, allvars, ntuple).previous is None
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+np = pytest.importorskip("numpy")
+ak = pytest.importorskip("awkward")
+mt2 = pytest.importorskip("mt2")
+ntuplegetter = pytest.importorskip("analysis_suite.flatten.ntuplegetter")
+mt2_stage = pytest.importorskip("analysis_suite.flatten.mt2_stage")
+
+systs = ["Nominal", "Jet_JEC_up"]
+
+
+@pytest.fixture
+def make_getter(ntuple):
+    pt = ak.Array([[50., 30.], [40.], [70., 20., 10.], [35., 25.], [], [60., 45.]])
+    columns = {
+        "TightLepton/pt": pt, "TightLepton/eta": pt*0, "TightLepton/phi": pt/30, "TightLepton/mass": pt*0,
+        "TightLepton/syst_bitMap": ak.values_astype(pt*0 + 3, np.uint64),
+        "PassEvent": ak.values_astype(ak.Array([[1, 1]]*6), bool),
+        "weight": ak.Array([[1., 1.]]*6),
+        "Met": np.array([10., 30., 50., 25., 40., 5.]),
+        "Met_phi": np.array([0., 1., 2., 3., 2., 1.]),
+    }
+    types = {"PassEvent": "std::vector<bool>", "weight": "std::vector<float>"}
+
+    def make(syst="Nominal"):
+        vg = ntuplegetter.NtupleGetter(ntuple(columns, systs, types), "Signal", "ttt", 1.,
+                                       executor=None, file_manager=None)
+        vg.set_systematic(syst)
+        vg.mask = lambda vg: vg["Met"] > 8
+        return vg
+    return make
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return mt2_stage.MT2Cache(tmp_path/"mt2")
+
+
+def test_chunks_match_single_call():
+    rng = np.random.default_rng(5)
+    inputs = tuple(rng.uniform(-50, 50, 1000) for _ in range(8))
+    with ThreadPoolExecutor(3) as executor:
+        chunked = mt2_stage.batched_mt2(inputs, chunk_size=64, executor=executor)
+    assert np.allclose(chunked, mt2.mt2(*inputs, 0., 0.))
+
+
+def test_later_stage_reads_from_disk(make_getter, cache, monkeypatch):
+    first = mt2_stage.get_mt2(make_getter(), cache=cache)
+    assert len(first) == 5
+    assert len(cache.get_entries()) == 1
+
+    def compute(*args):
+        raise AssertionError("MT2 evaluated again for a stored selection")
+    monkeypatch.setattr(mt2_stage, "batched_mt2", compute)
+    assert np.array_equal(mt2_stage.get_mt2(make_getter(), cache=cache), first)
+
+
+def test_key_follows_systematic_and_selection(make_getter, cache):
+    vg = make_getter()
+    keys = {cache.key(vg, "TightLepton", mt2_stage.gather_inputs(vg, "TightLepton"))}
+    vg.mask = lambda vg: vg["Met"] > 20
+    keys.add(cache.key(vg, "TightLepton", mt2_stage.gather_inputs(vg, "TightLepton")))
+    vg = make_getter("Jet_JEC_up")
+    keys.add(cache.key(vg, "TightLepton", mt2_stage.gather_inputs(vg, "TightLepton")))
+    assert len(keys) == 3
+
+
+def test_getter_cache_follows_mask(make_getter):
+    vg = make_getter()
+    values = mt2_stage.get_mt2(vg, cache=False)
+    assert mt2_stage.get_mt2(vg, cache=False) is values
+    vg.mask = lambda vg: vg["Met"] > 20
+    assert np.array_equal(mt2_stage.get_mt2(vg, cache=False), values[[1, 2, 3, 4]])
+    assert len(vg.mt2_cache) == 1
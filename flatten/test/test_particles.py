@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+import pytest
+
+np = pytest.importorskip("numpy")
+ak = pytest.importorskip("awkward")
+ntuplegetter = pytest.importorskip("analysis_suite.flatten.ntuplegetter")
+
+systs = ["Nominal", "Jet_JEC_up", "Jet_JEC_down"]
+shifts = [1.1, 0.9]
+
+
+def particle(pt, bitmap, shifted=False):
+    pt = ak.Array(pt)
+    columns = {"pt": pt, "eta": pt/100, "phi": -pt/100, "mass": pt/10,
+               "syst_bitMap": ak.values_astype(ak.Array(bitmap), np.uint64)}
+    if shifted:
+        columns["pt_shift"] = ak.concatenate([pt[:, :, np.newaxis]*shift for shift in shifts], axis=-1)
+        columns["mass_shift"] = columns["pt_shift"]/10
+    return columns
+
+
+@pytest.fixture
+def getter(ntuple):
+    parts = {
+        "Jets": particle([[50, 30], [40], [], [60, 20, 10], [35], [80, 45]],
+                         [[7, 7], [7], [], [7, 3, 7], [7], [7, 7]], shifted=True),
+        "FwdJets": particle([[25], [], [55], [], [15, 12], [90]],
+                            [[7], [], [7], [], [7, 5], [7]], shifted=True),
+        "TightMuon": particle([[30], [25], [], [40], [10], []], [[7], [7], [], [7], [1], []]),
+        "TightElectron": particle([[20], [35], [15], [], [50], [60]], [[7], [7], [7], [], [7], [7]]),
+    }
+    columns = {f"{part}/{var}": arr for part, cols in parts.items() for var, arr in cols.items()}
+    columns["PassEvent"] = ak.values_astype(ak.Array([[1, 1, 1], [1, 1, 0], [0, 1, 1], [1, 1, 1], [1, 1, 0],
+                                                      [1, 1, 1]]), bool)
+    columns["weight"] = ak.Array([[1., 1.1, 0.9]]*6)
+    columns["Met"] = np.array([10., 30., 50., 25., 40., 5.])
+    columns["Met_phi"] = np.zeros(6)
+    types = {"PassEvent": "std::vector<bool>", "weight": "std::vector<float>"}
+    root_file = ntuple(columns, systs, types)
+    return ntuplegetter.NtupleGetter(root_file, "Signal", "ttt", 1., executor=None, file_manager=None)
+
+
+def select(vg, syst):
+    vg.set_systematic(syst)
+    vg.mask = lambda vg: vg["Met"] > 20
+
+
+def test_merged_sorted_by_pt(getter):
+    select(getter, "Nominal")
+    getter.mergeParticles("Leptons", "TightMuon", "TightElectron")
+    assert np.array_equal(getter.index, [1, 3, 4])
+    gen = getter._mask_gen
+    assert ak.to_list(getter["Leptons"]["pt", -1]) == [[35, 25], [40], [50, 10]]
+    assert ak.to_list(getter["Leptons"]["eta", 0]) == [0.35, 0.4, 0.5]
+    assert np.array_equal(getter["Leptons"].num(), [2, 1, 2])
+    assert getter._mask_gen == gen
+
+
+def test_merged_jets_follow_jec_shift(getter):
+    getter.mergeParticles("AllJets", "Jets", "FwdJets")
+    select(getter, "Jet_JEC_up")
+    assert np.array_equal(getter.index, [1, 2, 3, 4])
+    gen = getter._mask_gen
+    pt = getter["AllJets"]["pt", -1]
+    assert ak.to_list(ak.num(pt)) == [1, 1, 3, 2]
+    assert np.allclose(ak.flatten(pt), [44., 60.5, 66., 22., 11., 38.5, 16.5])
+    assert np.allclose(ak.flatten(getter["AllJets"]["eta", -1]), [0.4, 0.55, 0.6, 0.2, 0.1, 0.35, 0.15])
+    assert getter._mask_gen == gen
+
+    select(getter, "Nominal")
+    assert np.allclose(ak.flatten(getter["AllJets"]["pt", -1]), [40., 60., 20., 10., 35., 15., 12.])
+
+
+def test_syst_masks_match_each_systematic(getter):
+    select(getter, "Nominal")
+    masks = getter["Jets"].syst_masks()
+    assert ak.to_list(ak.num(masks, axis=-1)[0]) == [3]
+    for syst in range(len(systs)):
+        bitmap = getter["Jets"].bitmap()
+        single = bitmap.mask(syst)[getter.index]
+        assert ak.to_list(masks[:, :, syst]) == ak.to_list(single)
+    assert ak.to_list(masks[1]) == [[True, True, True], [True, True, False], [True, True, True]]
+
+
+def test_unpacked_masks_used_for_systematics(getter):
+    getter.unpack_systematics(systs)
+    select(getter, "Jet_JEC_down")
+    bitmap = getter["FwdJets"].bitmap()
+    assert bitmap.unpacked is not None and len(bitmap.unpacked) == len(systs)
+    assert ak.to_list(bitmap.mask(2)) == [[True], [], [True], [], [True, True], [True]]
+    pt = getter["Jets"]["pt", -1]
+    assert ak.to_list(ak.num(pt)) == [0, 2]
+    assert np.allclose(ak.flatten(pt), [54., 9.])
+
+
+def test_bitmap_limits():
+    bitmap = ntuplegetter.SystBitmap(ak.unflatten(np.array([1, 2**63], dtype=np.uint64), [2]))
+    assert ak.to_list(bitmap.mask(63)) == [[False, True]]
+    with pytest.raises(ValueError):
+        bitmap.mask(64)
+    with pytest.raises(ValueError):
+        bitmap.unpack(65)
+    assert ak.to_list(bitmap.unpack(64)[:, :, 63]) == [[False, True]]
+
+
+def test_pair_kinematics(getter):
+    select(getter, "Nominal")
+    dr = getter["Jets"].pair_dr()
+    assert ak.to_list(ak.num(dr)) == [0, 3, 0]
+    assert np.allclose(ak.flatten(dr), np.sqrt(2)*np.array([0.4, 0.5, 0.1]))
+    assert ak.to_list(ak.num(getter["Jets"].pair_mass())) == [0, 3, 0]
+
+
+def test_jec_shifts_read_once(getter):
+    expected = [("Jet_JEC_up", [44., 66., 22., 11., 38.5]), ("Jet_JEC_down", [54., 9.]),
+                ("Nominal", [40., 60., 20., 10., 35.]), ("Jet_JEC_up", [44., 66., 22., 11., 38.5])]
+    for syst, pt in expected:
+        select(getter, syst)
+        assert np.allclose(ak.flatten(getter["Jets"]["pt", -1]), pt), syst
+        assert np.allclose(ak.flatten(getter["Jets"]["mass", -1]), np.array(pt)/10), syst
+    assert [read[0] for read in getter.tree.reads].count("Jets/pt_shift") == 1
+    assert [read[0] for read in getter.tree.reads].count("Jets/mass_shift") == 1
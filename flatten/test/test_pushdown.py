@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+from types import SimpleNamespace
+import pytest
+
+np = pytest.importorskip("numpy")
+ak = pytest.importorskip("awkward")
+ntuplegetter = pytest.importorskip("analysis_suite.flatten.ntuplegetter")
+
+
+class FakeBranch:
+    def __init__(self, tree, name):
+        self.tree, self.name = tree, name
+
+    def array(self, entry_start, entry_stop, decompression_executor=None):
+        self.tree.reads.append((self.name, entry_start, entry_stop))
+        return self.tree.columns[self.name][entry_start:entry_stop]
+
+
+class FakeNtupleTree:
+    """Tree of in memory columns recording the entry ranges read"""
+
+    def __init__(self, columns, offsets):
+        self.columns, self.offsets, self.reads = columns, offsets, []
+        self.num_entries = len(next(iter(columns.values())))
+        self.file = SimpleNamespace(closed=False, file_path="fake.root")
+
+    def common_entry_offsets(self):
+        return self.offsets
+
+    def __getitem__(self, name):
+        return FakeBranch(self, name)
+
+    def arrays(self, filter_name, how, entry_start, entry_stop, decompression_executor=None):
+        return {name: self[name].array(entry_start, entry_stop) for name in filter_name}
+
+
+def read_jets(pushdown, jets, passing):
+    vg = ntuplegetter.NtupleGetter({}, "Signal", "ttt", 1., pushdown=pushdown,
+                                   executor=None, file_manager=None)
+    vg.tree = FakeNtupleTree({"Jets/pt": jets}, [0, 10, 20, 30, 40])
+    vg._base_mask = passing
+    vg._update_entry_ranges()
+    return vg, vg._read_objects(["Jets/pt"])["Jets/pt"]
+
+
+def test_pushdown_reads_passing_clusters():
+    nevents = 40
+    jets = ak.Array([[float(i)]*(i % 3) for i in range(nevents)])
+    passing = np.zeros(nevents, dtype=bool)
+    passing[[12, 15, 33]] = True
+
+    vg, pushed = read_jets(True, jets, passing)
+    assert vg.column_cache is None
+    assert vg.entry_ranges == [(10, 20), (30, 40)]
+    assert sorted(vg.tree.reads) == [("Jets/pt", 10, 20), ("Jets/pt", 30, 40)]
+    assert len(pushed) == nevents
+
+    vg, full = read_jets(False, jets, passing)
+    assert vg.tree.reads == [("Jets/pt", 0, nevents)]
+    assert ak.to_list(pushed[passing]) == ak.to_list(full[passing]) == ak.to_list(jets[passing])
+
+
+def select(vg, events):
+    vg._base_mask = np.isin(np.arange(vg.tree.num_entries), events)
+    vg._update_entry_ranges()
+    vg.clear_mask()
+
+
+def test_systematics_only_add_clusters():
+    nevents = 80
+    jets = ak.Array([[float(i)]*(i % 3) for i in range(nevents)])
+    vg = ntuplegetter.NtupleGetter({}, "Signal", "ttt", 1., executor=None, file_manager=None)
+    vg.tree = FakeNtupleTree({"Jets/pt": jets}, list(range(0, nevents+1, 10)))
+    vg.branches = ["Jets/pt"]
+
+    select(vg, [12, 15, 33])
+    vg["Jets/pt"]
+    assert sorted(vg.tree.reads) == [("Jets/pt", 10, 20), ("Jets/pt", 30, 40)]
+
+    # Another systematic passing an event of a cluster not read yet
+    vg.tree.reads.clear()
+    select(vg, [3, 12])
+    assert vg.tree.reads == [("Jets/pt", 0, 10)]
+    assert vg.entry_ranges == [(0, 20), (30, 40)]
+    assert ak.to_list(vg["Jets/pt"]) == ak.to_list(jets[[3, 12]])
+    loaded = np.r_[0:20, 30:40]
+    assert ak.to_list(vg.syst_arr["Jets/pt"][loaded]) == ak.to_list(jets[loaded])
+
+    # Going back to the first selection reads nothing
+    vg.tree.reads.clear()
+    select(vg, [12, 15, 33])
+    assert vg.tree.reads == []
+    assert ak.to_list(vg["Jets/pt"]) == ak.to_list(jets[[12, 15, 33]])
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+import pytest
+
+np = pytest.importorskip("numpy")
+ak = pytest.importorskip("awkward")
+ntuplegetter = pytest.importorskip("analysis_suite.flatten.ntuplegetter")
+topn = pytest.importorskip("analysis_suite.flatten.topn")
+
+pad = -1
+spec = [
+    ("Jets", 3, pad, {"pt": "j{}Pt", "discriminator": "j{}Disc"}),
+    ("BJets", 2, pad, {"pt": "b{}Pt"}),
+]
+
+
+@pytest.fixture
+def getter(ntuple):
+    columns = {}
+    for part, pt in [("Jets", [[50., 30., 20., 10.], [40.], [], [60., 20.]]), ("BJets", [[30.], [], [], [60., 20.]])]:
+        pt = ak.Array(pt)
+        columns.update({f"{part}/pt": pt, f"{part}/eta": pt*0, f"{part}/phi": pt*0, f"{part}/mass": pt*0,
+                        f"{part}/discriminator": pt/100,
+                        f"{part}/syst_bitMap": ak.values_astype(pt*0 + 1, np.uint64)})
+    columns["PassEvent"] = ak.values_astype(ak.Array([[1]]*4), bool)
+    columns["weight"] = ak.Array([[1.]]*4)
+    columns["Met"] = np.array([10., 30., 50., 25.])
+    types = {"PassEvent": "std::vector<bool>", "weight": "std::vector<float>"}
+    vg = ntuplegetter.NtupleGetter(ntuple(columns, ["Nominal"], types), "Signal", "ttt", 1.,
+                                   executor=None, file_manager=None)
+    vg.set_systematic("Nominal")
+    vg.mask = lambda vg: vg["Met"] > 20
+    return vg
+
+
+def test_names_in_spec_order():
+    assert list(topn.topn_allvars(spec)) == ["j1Pt", "j2Pt", "j3Pt", "j1Disc", "j2Disc", "j3Disc", "b1Pt", "b2Pt"]
+
+
+def test_block_matches_functions(getter):
+    allvars = topn.topn_allvars(spec)
+    columns = topn.get_topn_columns(getter, spec, allvars)
+    assert set(columns) == set(allvars)
+    for name, func in allvars.items():
+        assert np.array_equal(columns[name], ak.to_numpy(func(getter))), name
+    assert np.array_equal(columns["j2Pt"], [pad, pad, 20.])
+    assert np.allclose(columns["j1Disc"], [0.4, pad, 0.6])
+
+
+def test_only_wanted_columns(getter):
+    allvars = {name: func for name, func in topn.topn_allvars(spec).items() if name in ("j1Pt", "j3Disc")}
+    assert set(topn.get_topn_columns(getter, spec, allvars)) == {"j1Pt", "j3Disc"}
@@ -17,6 +17,8 @@ from analysis_suite.data.PlotGroups import info as ginfo
 
 from analysis_suite.commons.histogram import Histogram
 from analysis_suite.commons.plot_utils import plot, cms_label
+from analysis_suite.commons.column_builder import ColumnBuilder
+from analysis_suite.commons.file_manager import get_executor
 
 pd.options.mode.chained_assignment = None
 
@@ -108,34 +110,46 @@ class MLHolder:
         trainable_class = sample not in self.nonTrained
         return enough_events and trainable_class
 
+    def combine_sets(self, builder, workset=None):
+        """Prepend the rows collected in a ColumnBuilder to a DataFrame in one concatenation"""
+        if workset is None:
+            workset = setup_pandas(self.all_vars)
+        if not builder:
+            return workset
+        return pd.concat([builder.to_pandas(), workset], ignore_index=True)
+
     def read_in_files(self, indir, year, typ='test'):
-        test_set= setup_pandas(self.all_vars)
+        test_set = ColumnBuilder()
         test_weights = dict()
 
-        with uproot.open(indir/year/f'{typ}_{self.outfile_info}.root') as f:
+        with uproot.open(indir/year/f'{typ}_{self.outfile_info}.root', decompression_executor=get_executor()) as f:
             for df, sample, weights in self.read_in_dataframe(f):
-                test_set = pd.concat([df, test_set], ignore_index=True)
+                test_set.append(df, front=True)
                 test_weights[sample] = weights
-        self.test_sets[year] = test_set
+        self.test_sets[year] = self.combine_sets(test_set)
         self.test_weights[year] = test_weights
 
 
     def read_in_train_files(self, indir):
         # Training files
-        with uproot.open(indir/f'train_{self.outfile_info}.root') as f:
+        train_set = ColumnBuilder()
+        with uproot.open(indir/f'train_{self.outfile_info}.root', decompression_executor=get_executor()) as f:
             for df, sample, _ in self.read_in_dataframe(f):
-                self.train_set = pd.concat([df, self.train_set], ignore_index=True)
+                train_set.append(df, front=True)
+        self.train_set = self.combine_sets(train_set, self.train_set)
 
         # Validation Files
-        with uproot.open(indir/f'validation_{self.outfile_info}.root') as f:
+        validation_set = ColumnBuilder()
+        with uproot.open(indir/f'validation_{self.outfile_info}.root', decompression_executor=get_executor()) as f:
             for df, sample, _ in self.read_in_dataframe(f):
-                self.validation_set = pd.concat([df, self.validation_set], ignore_index=True)
+                validation_set.append(df, front=True)
+        self.validation_set = self.combine_sets(validation_set, self.validation_set)
 
     def read_in_bdt(self, infile, variable, usevar=False, onlyTest=False):
         if usevar:
             self.usevars.append(variable)
 
-        with uproot.open(infile) as f:
+        with uproot.open(infile, decompression_executor=get_executor()) as f:
             for year, test in self.test_sets.items():
                 test_bdt = np.array([])
                 for sample in self.samples:
@@ -190,7 +204,7 @@ class MLHolder:
 
     def setup_weights(self, filename):
         self.total_yield = 0.
-        with uproot.open(filename) as f:
+        with uproot.open(filename, decompression_executor=get_executor()) as f:
             # Setup estimation of number of events (do based on ttW events)
             sample_wgt = f['ttw']['scale_factor'].array()
             self.total_trained_evt = len(sample_wgt)/0.2*self.split_ratio
@@ -215,11 +229,13 @@ class MLHolder:
             directory(string): Path to directory where root files are kept
         """
         print(year)
-        self.test_sets[year] = setup_pandas(self.all_vars)
+        test_set = ColumnBuilder()
+        train_set = ColumnBuilder()
+        validation_set = ColumnBuilder()
         self.test_weights[year] = dict()
         infile = directory / year / f'processed_{self.outfile_info}.root'
         self.setup_weights(infile)
-        with uproot.open(infile) as f:
+        with uproot.open(infile, decompression_executor=get_executor()) as f:
             for df, sample, weights in self.read_in_dataframe(f, create=True):
                 test, train, validation = self.setup_split(df, sample, split)
                 total_scale = np.sum(df.scale_factor)
@@ -233,11 +249,14 @@ class MLHolder:
                             continue
                         self.test_weights[year][sample].insert(
                             0, key, col.loc[test.index]*np.sum(col)/np.sum(col[test.index]))
-                    self.test_sets[year] = pd.concat([test, self.test_sets[year]], ignore_index=True)
+                    test_set.append(test, front=True)
                 if not train.empty:
-                    self.train_set = pd.concat([train, self.train_set], ignore_index=True)
+                    train_set.append(train, front=True)
                 if not validation.empty:
-                    self.validation_set = pd.concat([validation, self.validation_set], ignore_index=True)
+                    validation_set.append(validation, front=True)
+        self.test_sets[year] = self.combine_sets(test_set)
+        self.train_set = self.combine_sets(train_set, self.train_set)
+        self.validation_set = self.combine_sets(validation_set, self.validation_set)
         # print()
 
     def setup_split(self, df, sample, split=True):
@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 from .hist_getter import HistGetter, GraphInfo
 from analysis_suite.commons.constants import all_eras
+from analysis_suite.commons.file_manager import set_thread_budget
 
 class YearGetter:
-    def __init__(self, ntuple_info, years, **kwargs):
+    def __init__(self, ntuple_info, years, cores=None, **kwargs):
         self.factories = []
+        if cores is not None:
+            set_thread_budget(cores)
         if years == "all":
             years = all_eras
         elif isinstance(years, str):
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+import dataclasses
+import hashlib
+import inspect
+import logging
+import os
+import pickle
+import re
+import sysconfig
+import uuid
+from collections import abc
+from functools import lru_cache
+from importlib import import_module
+from pathlib import Path
+import awkward as ak
+import numpy as np
+import boost_histogram as bh
+
+import analysis_suite.commons.user as user
+from analysis_suite.commons.disk_cache import DiskCache
+
+code_packages = ["analysis_suite.commons", "analysis_suite.flatten", "analysis_suite.data.scales"]
+
+
+def file_identity(path):
+    """Path, size and modification time of a file (None for the last two if missing)"""
+    try:
+        stats = os.stat(path)
+        return (str(path), stats.st_size, stats.st_mtime)
+    except OSError:
+        return (str(path), None, None)
+
+
+@lru_cache(maxsize=None)
+def code_version():
+    """Hash of the source of the getters, scales and commons and of the HistGetter"""
+    digest = hashlib.sha256()
+    sources = [Path(__file__).with_name("hist_getter.py")]
+    for name in code_packages:
+        for directory in import_module(name).__path__:
+            sources += sorted(Path(directory).glob("*.py"))
+    for source in sources:
+        digest.update(source.read_bytes())
+    return digest.hexdigest()
+
+
+library_paths = tuple(str(Path(path).resolve()) for name, path in sysconfig.get_paths().items()
+                      if name in ("stdlib", "platstdlib", "purelib", "platlib"))
+
+
+def is_library(func):
+    """Whether a function comes from the standard library or an installed package"""
+    try:
+        path = str(Path(inspect.getsourcefile(func)).resolve())
+    except TypeError:
+        return True
+    return path.startswith(library_paths) or "site-packages" in path
+
+
+def describe_code(code, depth=0):
+    """Bytecode, constants and names of a code object and of the ones nested in it"""
+    consts = [describe_code(const, depth+1) if inspect.iscode(const) else describe(const, depth+1)
+              for const in code.co_consts]
+    digest = hashlib.sha1(code.co_code).hexdigest()
+    return f"code({digest}, [{', '.join(consts)}], {code.co_names})"
+
+
+def code_globals(func):
+    """Module globals used by a function, including in the functions nested in it"""
+    names = set()
+    codes = [func.__code__]
+    while codes:
+        code = codes.pop()
+        names.update(code.co_names)
+        codes += [const for const in code.co_consts if inspect.iscode(const)]
+    return {name: func.__globals__[name] for name in names if name in func.__globals__}
+
+
+def describe(obj, depth=0):
+    """Text describing an object that is stable between runs
+
+    Functions are described by their source, bytecode and constants, and the
+    values of the closure cells, defaults and module globals they use
+    (functions of installed packages only by their name), arrays by a hash
+    of their contents and containers element by element.
+    Anything else uses its repr without memory addresses.
+    """
+    if depth > 8:
+        return "..."
+    if obj is None or isinstance(obj, (str, bool, int, float, np.integer, np.floating)):
+        return repr(obj)
+    elif isinstance(obj, Path):
+        return repr(str(obj))
+    elif isinstance(obj, np.ndarray):
+        digest = hashlib.sha1(np.ascontiguousarray(obj).tobytes()).hexdigest()
+        return f"array({obj.dtype}, {obj.shape}, {digest})"
+    elif isinstance(obj, ak.Array):
+        form, length, container = ak.to_buffers(obj)
+        digest = hashlib.sha1()
+        for buffer in container.values():
+            digest.update(np.asarray(buffer).tobytes())
+        return f"ak({form.to_json()}, {length}, {digest.hexdigest()})"
+    elif isinstance(obj, bh.axis.Axis):
+        return f"{type(obj).__name__}({describe(obj.edges)}, {obj.traits})"
+    elif isinstance(obj, abc.Mapping):
+        items = sorted((describe(k, depth+1), describe(v, depth+1)) for k, v in obj.items())
+        return "{" + ", ".join(f"{k}: {v}" for k, v in items) + "}"
+    elif isinstance(obj, abc.Set):
+        return "{" + ", ".join(sorted(describe(v, depth+1) for v in obj)) + "}"
+    elif isinstance(obj, (list, tuple)):
+        return "[" + ", ".join(describe(v, depth+1) for v in obj) + "]"
+    elif dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        fields = {field.name: getattr(obj, field.name) for field in dataclasses.fields(obj)}
+        return f"{type(obj).__name__}({describe(fields, depth+1)})"
+    elif inspect.ismethod(obj):
+        return f"method({describe(obj.__func__, depth+1)})"
+    elif inspect.isfunction(obj):
+        if is_library(obj):
+            return f"func({obj.__module__}.{obj.__qualname__})"
+        try:
+            source = inspect.getsource(obj).strip()
+        except (OSError, TypeError):
+            source = f"{obj.__module__}.{obj.__qualname__}"
+        closure = [cell.cell_contents for cell in obj.__closure__ or []]
+        return (f"func({source}, {describe_code(obj.__code__, depth+1)}, {describe(closure, depth+1)}, "
+                f"{describe(obj.__defaults__, depth+1)}, {describe(code_globals(obj), depth+1)})")
+    return re.sub(r" at 0x[0-9a-fA-F]+", "", repr(obj))
+
+
+class HistCache(DiskCache):
+    """On disk cache of the histograms made by HistGetter
+
+    Each entry is the dictionary of histograms (with their `breakdown`) of
+    one graph, pickled to its own file and named by a hash of everything
+    used to make it (see `HistGetter.cache_key`). When the cache goes over
+    `max_size` the least recently used entries are removed (see `DiskCache`).
+    """
+
+    def __init__(self, path, max_size=5*1024**3):
+        super().__init__(path, max_size)
+
+    def key(self, *parts):
+        return hashlib.sha256(describe(parts).encode()).hexdigest()
+
+    def _entry(self, key):
+        return self.path / key[:2] / f"{key}.pkl"
+
+    def load(self, key):
+        """Get the histograms stored under `key`, None if they aren't stored"""
+        entry = self._entry(key)
+        if not entry.exists():
+            return None
+        try:
+            with open(entry, 'rb') as f:
+                hists = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError) as e:
+            logging.warning(f"Removing unreadable cache entry {entry}: {e}")
+            entry.unlink(missing_ok=True)
+            return None
+        self.touch(entry)
+        return hists
+
+    def store(self, key, hists):
+        """Write histograms (or any picklable value) to the cache, evicting old entries if over the size limit"""
+        entry = self._entry(key)
+        tmp = entry.with_name(f"{entry.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, 'wb') as f:
+                pickle.dump(hists, f, protocol=pickle.HIGHEST_PROTOCOL)
+            size = tmp.stat().st_size
+            os.replace(tmp, entry)
+        except (OSError, pickle.PicklingError) as e:
+            logging.warning(f"Could not write histograms to the cache: {e}")
+            tmp.unlink(missing_ok=True)
+            return
+        self.added(size)
+
+    def get_entries(self):
+        entries = []
+        for entry in self.path.glob("*/*.pkl"):
+            try:
+                stats = entry.stat()
+                entries.append((stats.st_mtime, stats.st_size, entry))
+            except OSError:
+                continue
+        return entries
+
+
+_hist_cache = False
+
+
+def get_hist_cache():
+    """Shared cache in the user scratch area, None if it can't be used"""
+    global _hist_cache
+    if _hist_cache is False:
+        try:
+            _hist_cache = HistCache(user.scratch_area / "hist_cache")
+        except OSError:
+            _hist_cache = None
+    return _hist_cache
@@ -6,10 +6,14 @@ from importlib import import_module
 from typing import Callable
 
 from analysis_suite.flatten import NtupleGetter, FlatGetter
+from analysis_suite.flatten.cutflow import CutFlow
 from analysis_suite.commons.histogram import Histogram
 from analysis_suite.commons.constants import lumi
 from analysis_suite.commons.info import fileInfo
 from analysis_suite.commons.user import analysis_area
+from analysis_suite.commons.prefetcher import FilePrefetcher
+from analysis_suite.commons.file_manager import get_file_manager, set_thread_budget
+from .hist_cache import get_hist_cache, file_identity, code_version
 
 @dataclass
 class GraphInfo:
@@ -36,31 +40,130 @@ class GraphInfo:
         return self.axis_name.format(*args, **kwargs)
 
 class HistGetter:
-    def __init__(self, ntuple_info, year, cores=1, **kwargs):
-        self.dfs = dict()
+    """Histograms of the graphs for all the members of an ntuple or flat file
+
+    With `hist_cache` (True for the shared HistCache, or a HistCache), the
+    histograms are stored on disk keyed on the input files, the ntuple
+    setup, the options, every cut, mask, scale and systematic applied and
+    the graph, along with the scale files and the source of the code used.
+    The files are then only read once a histogram (or the list of
+    systematics) is missing from the cache: until then the operations are
+    recorded and replayed on load.
+
+    With `cutflow` (True for a new CutFlow, or a CutFlow), the yield after
+    each cut and mask is recorded and written by `write_cutflow`. Nothing is
+    cached then, as the files must be read for the yields.
+
+    With `column_cache` (True for the shared ColumnCache, or a ColumnCache),
+    the ntuple branches are read through the column cache, see NtupleGetter.
+    """
+
+    def __init__(self, ntuple_info, year, cores=None, **kwargs):
+        self._dfs = dict()
+        self._systs = []
         self.lumi = lumi[year]
         self.year = year
         self.cores = cores
+        if cores is not None:
+            set_thread_budget(cores)
         self.ntuple = ntuple_info
-        self.systs = []
         self.scales = []
+        self.scale_inputs = []
         self.scaled = []
         self.workdir = kwargs.get('workdir', analysis_area/"data")
         self.limit_samples = kwargs.get('limit', True)
+        self.cutflow = kwargs.get('cutflow', None)
+        if self.cutflow is True:
+            self.cutflow = CutFlow()
         if kwargs.get('scales', False):
             for scale in kwargs['scales']:
-                self.scales.append(import_module(f"analysis_suite.data.scales.{scale}").scale)
+                module = import_module(f"analysis_suite.data.scales.{scale}")
+                self.scales.append(module.scale)
+                self.scale_inputs += [self.workdir/name for name in getattr(module, 'inputs', [])]
+        hist_cache = kwargs.pop('hist_cache', None)
+        self.hist_cache = get_hist_cache() if hist_cache is True else hist_cache or None
+        self.column_cache = kwargs.pop('column_cache', None) or None
+        self._kwargs = kwargs
+        self._history = []
+        self._pending = []
+        self._loaded = False
         filename = kwargs.get('filename', None)
         if filename is not None:
-            self.setup_flat(filename, cuts=kwargs.get('mask', None))
+            self.sources = [filename]
         else:
             filename = ntuple_info.get_filename(year, **kwargs)
+            self.sources = sorted(filename.glob("*root")) if filename.is_dir() else [filename]
+        if self.hist_cache is None or self.cutflow is not None:
+            self._load()
+
+    @property
+    def dfs(self):
+        self._load()
+        return self._dfs
+
+    @property
+    def systs(self):
+        if self._loaded:
+            return self._systs
+        return self.cached("systs", self._load_systs)
+
+    @systs.setter
+    def systs(self, systs):
+        self._systs = systs
+
+    def _load_systs(self):
+        self._load()
+        return self._systs
+
+    def _load(self):
+        """Read the files and replay the operations recorded before"""
+        if self._loaded:
+            return
+        self._loaded = True
+        if self._kwargs.get('filename', None) is not None:
+            self.setup_flat(self._kwargs['filename'], cuts=self._kwargs.get('mask', None))
+        else:
             self.root_files = []
-            if filename.is_dir():
-                for root_file in filename.glob("*root"):
-                    self.setup_ntuple(root_file, **kwargs)
-            else:
-                self.setup_ntuple(filename, **kwargs)
+            get_file_manager().reserve(len(self.sources))
+            for root_file, f in FilePrefetcher(self.sources, get_file_manager().open):
+                self.setup_ntuple(f, **self._kwargs)
+        history, pending = self._history, self._pending
+        self._pending = []
+        for op, args, kwargs in pending:
+            getattr(self, op)(*args, **kwargs)
+        self._history = history
+
+    def _record(self, op, *args, **kwargs):
+        """Add an operation to the history, returning True if it is left for `_load`"""
+        self._history.append((op, args, kwargs))
+        if self._loaded:
+            return False
+        self._pending.append((op, args, kwargs))
+        return True
+
+    def cache_key(self, graph, args, kwargs):
+        """Key of the histograms of a graph in the cache, None if not caching"""
+        if self.hist_cache is None or self.cutflow is not None:
+            return None
+        options = {key: val for key, val in self._kwargs.items() if key != 'cutflow'}
+        return self.hist_cache.key(self.year, [file_identity(path) for path in self.sources],
+                                   [file_identity(path) for path in self.scale_inputs], code_version(),
+                                   self.ntuple, options, self._history, graph, args, kwargs)
+
+    def cached(self, name, func):
+        """Value of `func()` stored in the cache under `name` and the current setup"""
+        key = self.cache_key(name, (), {})
+        if key is not None and (value := self.hist_cache.load(key)) is not None:
+            return value
+        value = func()
+        if key is not None:
+            self.hist_cache.store(key, value)
+        return value
+
+    def write_cutflow(self, path, output_name):
+        """Write the yields of the cuts and masks applied so far (see `CutFlow.write_out`)"""
+        self._load()
+        self.cutflow.write_out(path, output_name)
 
     def df_iter(self, members=None):
         for member, df in self.dfs.items():
@@ -81,17 +184,19 @@ class HistGetter:
                 yield group, member, df
 
     def setup_ntuple(self, root_file, systName="Nominal", **kwargs):
-        f = uproot.open(root_file,
-                        decompression_executor=uproot.ThreadPoolExecutor(self.cores)
-        )
-        self.root_files.append(f)
+        if isinstance(root_file, uproot.ReadOnlyDirectory):
+            f = root_file
+        else:
+            f = get_file_manager().open(root_file)
+        self.root_files.append(f.file.file_path)
         members = [m for m in f.keys(recursive=False, cycle=False)]
         for member in members:
             xsec = 1. if fileInfo.is_data(member) else fileInfo.get_xsec(member)*self.lumi*1000
             for tree in self.ntuple.trees:
                 if self.limit_samples and self.ntuple.get_group_name(member, tree) is None:
                     continue
-                vg = NtupleGetter(f, tree, member, xsec, systName=systName, cuts=self.ntuple.cut)
+                vg = NtupleGetter(f, tree, member, xsec, systName=systName, cuts=self.ntuple.cut,
+                                  cutflow=self.cutflow, column_cache=self.column_cache)
                 if not vg.tree:
                     continue
                 self.ntuple.setup_branches(vg)
@@ -112,7 +217,7 @@ class HistGetter:
             for member in members:
                 if self.limit_samples and self.ntuple.get_group_name(member, None, False) is None:
                     continue
-                fg = FlatGetter(f, member)
+                fg = FlatGetter(f, member, cutflow=self.cutflow)
                 if not fg:
                     continue
                 self.systs = np.unique(np.concatenate([self.systs, fg.list_systs()]))
@@ -122,12 +227,16 @@ class HistGetter:
                 self.dfs[member] = fg
 
     def cut(self, mask, groups=None):
+        if self._record('cut', mask, groups):
+            return
         for group, member, df in self.df_iter(self.dfs.keys()):
             if groups is not None and group not in groups:
                 continue
             df.cut(mask)
 
     def mask(self, mask, groups=None):
+        if self._record('mask', mask, groups):
+            return
         for group, member, df in self.df_iter(self.dfs.keys()):
             if groups is not None and group not in groups:
                 continue
@@ -135,7 +244,7 @@ class HistGetter:
 
 
     def _internal_scale(self, df, group, member):
-        if self.ntuple.get_info().is_data_driven(group) or group == 'data':
+        if self.ntuple.lookup.is_data_driven(group) or group == 'data':
             return
         for scale in self.scales:
             # print(group, member, df.syst_name)
@@ -143,6 +252,8 @@ class HistGetter:
             self.scaled.append(df.syst_name)
 
     def scale(self, scale, groups=None):
+        if self._record('scale', scale, groups):
+            return
         if isinstance(groups, str):
             groups = [groups]
         for group, member, df in self.df_iter(self.dfs.keys()):
@@ -154,14 +265,20 @@ class HistGetter:
                 df.scale = scale
 
     def reset_mask(self):
+        if self._record('reset_mask'):
+            return
         for group, member, df in self.df_iter(self.dfs.keys()):
             df.reset()
 
     def reset(self):
+        if self._record('reset'):
+            return
         for _, _, df in self.df_iter():
             df.set_systematic("Nominal")
 
     def reset_syst(self, systName, members=None):
+        if self._record('reset_syst', systName, members):
+            return
         for group, member, df in self.df_iter(members):
             df.set_systematic(systName)
             if not df.correct_syst:
@@ -170,33 +287,85 @@ class HistGetter:
             #     continue
             self._internal_scale(df, group, member)
 
+    def _fill(self, hists, graph, axis_name, group, member, vals, weight, **kwargs):
+        if len(vals) == 0:
+            return
+        if group not in hists:
+            hists[group] = Histogram(*graph.bins(), axis_name=axis_name)
+        if graph.dim() == 1:
+            hists[group].fill(vals, weight=weight, member=member, flow=kwargs.get('flow', False), deferred=True)
+        else:
+            hists[group].fill(*vals, weight=weight, member=member, flow=kwargs.get('flow', False), deferred=True)
+
+    def _finalize(self, hists, fix_negative=False):
+        for group, hist in hists.items():
+            hist.finalize()
+            if not fix_negative:
+                continue
+            if min(hist.vals) < 0:
+                hist.values()[:] = np.abs(hist.vals)
+
     def get_hist(self, graph, *args, **kwargs):
+        key = self.cache_key(graph, args, kwargs)
+        if key is not None and (hists := self.hist_cache.load(key)) is not None:
+            return hists
         hists = {}
         members = kwargs.get("members", self.dfs.keys())
         axis_name = graph.get_axis_name(**kwargs)
         for group, member, df in self.df_iter(members):
             vals, weight = df.get_graph(graph, *args)
-            if len(vals) == 0:
-                continue
-            if group not in hists:
-                hists[group] = Histogram(*graph.bins(), axis_name=axis_name)
-            if graph.dim() == 1:
-                hists[group].fill(vals, weight=weight, member=member, flow=kwargs.get('flow', False))
-            else:
-                hists[group].fill(*vals, weight=weight, member=member, flow=kwargs.get('flow', False))
-        if kwargs.get('fix_negative', False):
-            for group, hist in hists.items():
-                if min(hist.vals) < 0:
-                    hist.values()[:] = np.abs(hist.vals)
+            self._fill(hists, graph, axis_name, group, member, vals, weight, **kwargs)
+        self._finalize(hists, kwargs.get('fix_negative', False))
+        if key is not None:
+            self.hist_cache.store(key, hists)
         return hists
 
     def get_hists(self, graphs, *args, **kwargs):
-        return {
-            key: self.get_hist(graph, *args, **kwargs) for key, graph in graphs.items()
-        }
+        """Fill the histograms of many graphs in one pass over the getters
+
+        Each getter is visited once and all graphs are filled from it inside
+        `batch`, so the weights, particle counts and graph functions shared
+        by several graphs are only computed once. Graphs found in the cache
+        aren't filled again
+        """
+        keys = {name: self.cache_key(graph, args, kwargs) for name, graph in graphs.items()}
+        hists = {}
+        for name, key in keys.items():
+            if key is not None and (cached := self.hist_cache.load(key)) is not None:
+                hists[name] = cached
+        missing = {name: graph for name, graph in graphs.items() if name not in hists}
+        if not missing:
+            return hists
+
+        members = kwargs.get("members", self.dfs.keys())
+        filled = {key: {} for key in missing}
+        axis_names = {key: graph.get_axis_name(**kwargs) for key, graph in missing.items()}
+        for group, member, df in self.df_iter(members):
+            with df.batch():
+                for key, graph in missing.items():
+                    vals, weight = df.memo(("graph", graph.func, args), lambda: df.get_graph(graph, *args))
+                    self._fill(filled[key], graph, axis_names[key], group, member, vals, weight, **kwargs)
+        for name in filled:
+            self._finalize(filled[name], kwargs.get('fix_negative', False))
+            if keys[name] is not None:
+                self.hist_cache.store(keys[name], filled[name])
+        hists.update(filled)
+        return {name: hists[name] for name in graphs}
+
+    def unpack_systematics(self, systs, members=None):
+        """Decode the particle masks of `systs` at once (see `NtupleGetter.unpack_systematics`)
+
+        Doesn't change the histograms, so it is left out of the history
+        """
+        if not self._loaded:
+            self._pending.append(('unpack_systematics', (systs, members), {}))
+            return
+        for _, _, df in self.df_iter(members):
+            df.unpack_systematics(systs)
 
     def get_syst_hist(self, graph, members, systName, *args, **kwargs):
         hists = {}
+        self.unpack_systematics([systName+"_up", systName+"_down"], members)
         self.reset_syst(systName+"_up", members)
         hist_up = self.get_hist(graph, *args, members=members, **kwargs)
         self.reset_syst(systName+"_down", members)
@@ -2,6 +2,7 @@
 import sys
 import datetime
 import logging
+import multiprocessing as mp
 
 import analysis_suite.commons.configs as config
 import analysis_suite.commons.constants as constants
@@ -40,28 +41,25 @@ def setup(cli_args):
                 plots = getattr(plots_module, cli_args.plots)
                 if cli_args.hists != ['all']:
                     plots = [graph for graph in plots if graph.name in cli_args.hists]
+                if cli_args.load_once:
+                    argList.append((filename, outpath, plots, cli_args.signal, year, syst, cli_args))
+                    continue
                 for plot in plots:
                     argList.append((filename, outpath, [plot], cli_args.signal, year, syst, cli_args))
     return argList
 
 
 
-def run(infile, outpath, graphs, signalName, year, syst, args):
-    # logging.info(f'Processing {graphs.name} for year {year} and systematic {syst}')
-    kwargs = {
-        'ratio_bot': args.ratio_range[0],
-        'ratio_top': args.ratio_range[1],
-        'extra_format': 'pdf',
-    }
+_loaded = None
 
+
+def load(infile, signalName, year, syst, args):
+    """Read the file into a Plotter and apply the scalers of the inputs"""
     scales = config.get_inputs(args.workdir, "scales")
 
     if args.type == "ntuple":
         ntuple = config.get_ntuple(args.region, obj=args.region_type)
         ginfo = ntuple.get_info(keep_dd_data=True, remove=['nonprompt_mc'])
-        graphs = getattr(plots_module, args.plots)
-        if args.hists != ['all']:
-            graphs = [graph for graph in graphss if graph.name in args.hists]
     else:
         ginfo = config.get_ntuple_info(args.region, remove=['nonprompt_mc'])
         ntuple = None
@@ -73,7 +71,16 @@ def run(infile, outpath, graphs, signalName, year, syst, args):
     plotter.set_groups(sig=signalName, bkg=bkg, data='data')
     for scaler in scales.scale_list:
         scaler(plotter, year, syst)
+    return plotter
 
+
+def draw(plotter, graphs, outpath, signalName, year, args):
+    """Fill and plot graphs from a loaded Plotter, writing their logs"""
+    kwargs = {
+        'ratio_bot': args.ratio_range[0],
+        'ratio_top': args.ratio_range[1],
+        'extra_format': 'pdf',
+    }
     plotter.fill_hists(graphs)
 
     for graph in graphs:
@@ -89,6 +96,41 @@ def run(infile, outpath, graphs, signalName, year, syst, args):
         logger.write_out(outpath/'logs')
 
 
+def draw_loaded(graph):
+    """Pool task: draw one graph from the Plotter loaded before the fork"""
+    plotter, outpath, signalName, year, args = _loaded
+    draw(plotter, [graph], outpath, signalName, year, args)
+
+
+def run(infile, outpath, graphs, signalName, year, syst, args):
+    """Make the plots of one file
+
+    With `load_once`, the file is read and scaled once for all the graphs.
+    For flat files, the graphs are then filled and drawn by `-j` processes
+    forked after the load, which share the loaded data copy-on-write. Ntuple
+    getters read their branches lazily, so forked processes would each
+    decompress them again: ntuples are drawn in this process instead.
+    """
+    # logging.info(f'Processing {graphs.name} for year {year} and systematic {syst}')
+    global _loaded
+    if args.type == "ntuple":
+        graphs = getattr(plots_module, args.plots)
+        if args.hists != ['all']:
+            graphs = [graph for graph in graphs if graph.name in args.hists]
+
+    plotter = load(infile, signalName, year, syst, args)
+    if not getattr(args, 'load_once', False) or args.j == 1 or len(graphs) == 1 or args.type == "ntuple":
+        draw(plotter, graphs, outpath, signalName, year, args)
+        return
+
+    _loaded = (plotter, outpath, signalName, year, args)
+    try:
+        with mp.get_context('fork').Pool(min(args.j, len(graphs))) as pool:
+            pool.map(draw_loaded, graphs, chunksize=1)
+    finally:
+        _loaded = None
+
+
 def cleanup(cli_args):
     basePath = get_plot_area(cli_args.region, cli_args.name, cli_args.workdir)
     # combined page
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+import argparse
+import time
+import numpy as np
+import boost_histogram as bh
+from boost_histogram.accumulators import WeightedSum as bh_weights
+
+from analysis_suite.commons.histogram import Histogram
+from analysis_suite.data.PlotGroups import info as ginfo
+
+
+def get_fills(groups, nevents, rng):
+    """Values and weights of one synthetic fill per (member, tree) of the groups"""
+    fills = []
+    for group in groups:
+        for member in ginfo[group]["Members"]:
+            for tree in ("Signal", "Nonprompt"):
+                nfill = rng.integers(nevents//10, nevents)
+                fills.append((group, f'{member}_{tree}', rng.exponential(200., nfill), rng.normal(1., 0.3, nfill)))
+    return fills
+
+
+def old_fill(hist, vals, weight, member):
+    """Histogram.fill before deferred folding"""
+    wgt = np.array(weight)
+    hist.breakdown[member] = [bh_weights(sum(wgt), sum(wgt**2)), len(wgt)]
+    bh.Histogram.fill(hist, vals, weight=weight)
+    hist.values(flow=True)[:] = np.pad(hist.vals, 1)
+    hist.variances(flow=True)[:] = np.pad(hist.sumw2, 1)
+
+
+def fill_old(fills, axis):
+    hists = {}
+    for group, member, vals, weight in fills:
+        if group not in hists:
+            hists[group] = Histogram(axis)
+        old_fill(hists[group], vals, weight, member)
+    return hists
+
+
+def fill_new(fills, axis):
+    hists = {}
+    for group, member, vals, weight in fills:
+        if group not in hists:
+            hists[group] = Histogram(axis)
+        hists[group].fill(vals, weight=weight, member=member, deferred=True)
+    for hist in hists.values():
+        hist.finalize()
+    return hists
+
+
+def timeit(func, fills, axis, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(fills, axis)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare deferred overflow folding to folding after every fill")
+    parser.add_argument("-g", "--groups", default="rare,xg",
+                        type=lambda x : [i.strip() for i in x.split(',')],
+                        help="Groups whose members are filled")
+    parser.add_argument("-e", "--events", default="100,10000,100000",
+                        type=lambda x : [int(i) for i in x.split(',')],
+                        help="Maximum number of events per member")
+    parser.add_argument("-b", "--bins", default="20,200",
+                        type=lambda x : [int(i) for i in x.split(',')],
+                        help="Number of bins of the histogram")
+    parser.add_argument("-r", "--repeat", default=5, type=int)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(12345)
+    nmembers = {group: len(ginfo[group]["Members"]) for group in args.groups}
+    print("Members:", ", ".join(f"{group}: {num}" for group, num in nmembers.items()))
+    print(f"{'Events':>10} {'Bins':>6} {'Fills':>6} {'per fill (s)':>13} {'deferred (s)':>13} {'speedup':>8}")
+    for nevents in args.events:
+        fills = get_fills(args.groups, nevents, rng)
+        for nbins in args.bins:
+            axis = bh.axis.Regular(nbins, 0, 1000)
+            old, new = fill_old(fills, axis), fill_new(fills, axis)
+            for group in old:
+                assert np.allclose(old[group].view(flow=True).value, new[group].view(flow=True).value)
+                assert np.allclose(old[group].view(flow=True).variance, new[group].view(flow=True).variance)
+            old_time = timeit(fill_old, fills, axis, args.repeat)
+            new_time = timeit(fill_new, fills, axis, args.repeat)
+            print(f"{nevents:>10} {nbins:>6} {len(fills):>6} {old_time:>13.4f} {new_time:>13.4f} {old_time/new_time:>8.2f}")
@@ -90,7 +90,7 @@ def split_hists(hists, systname, year, chan):
                 yield f'{out_name}_{updown}', group, hist
 
 # Read in files/hists
-def read_histograms(workdir, ntuple, year, graphs, infile, region):
+def read_histograms(workdir, ntuple, year, graphs, infile, region, hist_cache=False, column_cache=False):
     syst_hists = {name: dict() for name in graphs}
     ntuple = get_ntuple(*ntuple)
     ntuple.remove_group('nonprompt_mc')
@@ -99,18 +99,9 @@ def read_histograms(workdir, ntuple, year, graphs, infile, region):
     hist_factory = HistGetter(ntuple, year, filename=infile, workdir=workdir,
                               scales=['btag_jetlep', 'wz'],
                               mask = mask,
+                              hist_cache=hist_cache,
+                              column_cache=column_cache,
                               )
-    nom_vals = {}
-    group_nom = {}
-    for group, member, df in hist_factory.df_iter():
-        if member == 'data':
-            nom_vals[group] = np.sum(df.scale)
-        else:
-            nom_vals[member] = np.sum(df.scale)
-        if group not in group_nom:
-            group_nom[group] = 0.
-        group_nom[group] += np.sum(df.scale)
-
     for syst in hist_factory.systs:
         print(f"Processing: {syst}")
         hist_factory.reset_syst(syst)
@@ -122,7 +113,8 @@ def read_histograms(workdir, ntuple, year, graphs, infile, region):
                 syst_hists[graph_name][systname][group] = hist
     return syst_hists
 
-def make_hist(ntuple, workdir, outdir, year, region, graphs, useFlat=False, cores=1):
+def make_hist(ntuple, workdir, outdir, year, region, graphs, useFlat=False, cores=1, hist_cache=False,
+              column_cache=False):
     outfiles = []
     all_hists = {name: dict() for name in graphs}
     if useFlat:
@@ -131,11 +123,12 @@ def make_hist(ntuple, workdir, outdir, year, region, graphs, useFlat=False, core
         infiles = [None]
 
     if cores == 1 or not useFlat:
-        outputs = [read_histograms(workdir, ntuple, year, graphs, f, region) for f in infiles]
+        outputs = [read_histograms(workdir, ntuple, year, graphs, f, region, hist_cache, column_cache)
+                   for f in infiles]
     else:
         inputs = []
         for infile in infiles:
-            inputs.append((workdir, ntuple, year, graphs, infile, region))
+            inputs.append((workdir, ntuple, year, graphs, infile, region, hist_cache, column_cache))
         with mp.Pool(cores) as pool:
             outputs = pool.starmap(read_histograms, inputs)
     for output in outputs:
@@ -247,6 +240,10 @@ if __name__ == "__main__":
     parser.add_argument('-t', '--extra', default="")
     parser.add_argument('-ne', '--ntuple_extra', default="info")
     parser.add_argument("-j", '--cores', default=1, type=int)
+    parser.add_argument('--hist_cache', action='store_true',
+                        help="Keep the histograms on disk and reuse them when rerunning with the same inputs")
+    parser.add_argument('--column_cache', action='store_true',
+                        help="Keep the decompressed branches in the scratch area to speed up reruns")
     args = parser.parse_args()
     years = args.years if args.years is not None else []
 
@@ -294,7 +291,8 @@ if __name__ == "__main__":
         combine_dir.mkdir(exist_ok=True, parents=True)
         runCombine.work_dir = combine_dir
         rootfiles = [combine_dir/f'{name}_{year}_{region}.root' for name in graphs]
-        make_hist(ntuple, args.workdir, combine_dir, year, region, graphs, args.flat, args.cores)
+        make_hist(ntuple, args.workdir, combine_dir, year, region, graphs, args.flat, args.cores, args.hist_cache,
+                  args.column_cache)
 
         input_files = []
         for rootfile, graph in zip(rootfiles, graphs.values()):
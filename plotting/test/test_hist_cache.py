@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+import sys
+from types import SimpleNamespace
+import pytest
+
+bh = pytest.importorskip("boost_histogram")
+hist_cache = pytest.importorskip("analysis_suite.plotting.hist_cache")
+hist_getter = pytest.importorskip("analysis_suite.plotting.hist_getter")
+
+graph = hist_getter.GraphInfo("$H_T$", bh.axis.Regular(10, 0, 1000), "HT")
+njets_cut = 2
+
+
+@pytest.fixture
+def make_getter(tmp_path):
+    source = tmp_path / "processed_Nominal_signal.root"
+    source.write_bytes(b"0"*10)
+    (tmp_path / "wz_scale_factor.pickle").write_bytes(b"0"*10)
+    cache = hist_cache.HistCache(tmp_path / "cache")
+
+    def make(**kwargs):
+        return hist_getter.HistGetter(SimpleNamespace(name="signal"), "2018", filename=source,
+                                      workdir=tmp_path, scales=["wz"], hist_cache=cache, **kwargs)
+    return make
+
+
+def test_key_follows_inputs(tmp_path, make_getter):
+    key = make_getter().cache_key(graph, (), {})
+    assert make_getter().cache_key(graph, (), {}) == key
+
+    getter = make_getter()
+    getter.cut(lambda vg: vg["NJets"] > 2)
+    assert getter.cache_key(graph, (), {}) != key
+
+    (tmp_path / "wz_scale_factor.pickle").write_bytes(b"0"*11)
+    assert make_getter().cache_key(graph, (), {}) != key
+
+
+def test_closure_values_change_key(make_getter):
+    keys = set()
+    for njets in (2, 3):
+        getter = make_getter()
+        getter.cut(lambda vg: vg["NJets"] > njets)
+        keys.add(getter.cache_key(graph, (), {}))
+    assert len(keys) == 2
+
+
+def test_lambdas_on_one_line_differ():
+    masks = {"low": lambda vg: vg["BDT"] > 1, "high": lambda vg: vg["BDT"] > 2}
+    assert hist_cache.describe(masks["low"]) != hist_cache.describe(masks["high"])
+
+
+def test_globals_change_key(make_getter, monkeypatch):
+    def key():
+        getter = make_getter()
+        getter.cut(lambda vg: vg["NJets"] > njets_cut)
+        return getter.cache_key(graph, (), {})
+    before = key()
+    assert key() == before
+    monkeypatch.setattr(sys.modules[__name__], "njets_cut", 3)
+    assert key() != before
+
+
+def test_no_key_with_cutflow(make_getter, monkeypatch):
+    monkeypatch.setattr(hist_getter.HistGetter, "_load", lambda self: None)
+    assert make_getter(cutflow=True).cache_key(graph, (), {}) is None
+
+
+def test_systs_hit_does_not_read(make_getter):
+    systs = ["Nominal", "BJet_up"]
+    assert make_getter().cached("systs", lambda: systs) == systs
+
+    def read():
+        raise AssertionError("Files read on a cache hit")
+    assert make_getter().cached("systs", read) == systs
+
+
+def test_column_cache_kept_out_of_key(make_getter, tmp_path):
+    key = make_getter().cache_key(graph, (), {})
+    getter = make_getter(column_cache=tmp_path)
+    assert getter.column_cache == tmp_path
+    assert getter.cache_key(graph, (), {}) == key
+    assert make_getter(column_cache=False).column_cache is None
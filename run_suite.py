@@ -6,8 +6,10 @@ import sys
 import argparse
 import pkgutil
 import shutil
+import os
 
 import analysis_suite.commons.user as user
+from analysis_suite.commons.file_manager import set_thread_budget
 
 warnings.filterwarnings('ignore')
 
@@ -21,6 +23,8 @@ def get_cli():
     parser.add_argument("-d", "--workdir", required=True, type=lambda x : user.workspace_area / x,
                         help="Working Directory")
     parser.add_argument("-j", type=int, default=1, help="Number of cores")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Decompression threads per process (default: cores of the machine split between the -j processes)")
     parser.add_argument("--log", type=str, default="ERROR",
                         choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
                         help="Set debug status (currently not used)")
@@ -41,6 +45,16 @@ def get_cli():
         parser.add_argument('-n', '--ntuple', required=True, choices= ntupleInfo,
                             help="Ntuple info class used for make root files")
         parser.add_argument('-i', '--inputs')
+        parser.add_argument('--chunk_size', type=int, default=None,
+                            help="Stream each tree in chunks of this many events to bound memory")
+        parser.add_argument('--single_pass', action='store_true',
+                            help="Read each file once and write all systematics from it")
+        parser.add_argument('--force', action='store_true',
+                            help="Remake outputs even if their manifest says they are up to date")
+        parser.add_argument('--cutflow', action='store_true',
+                            help="Write the yield and time of each cut next to the outputs")
+        parser.add_argument('--column_cache', action='store_true',
+                            help="Keep the decompressed branches in the scratch area to speed up reruns")
     elif sys.argv[1] == "mva":
         parser.add_argument('-t', '--train', action="store_true")
         parser.add_argument('-m', '--model', default='XGBoost', choices=['DNN', 'TMVA', 'XGBoost', "CutBased"],
@@ -66,6 +80,10 @@ def get_cli():
                             help='Region that this histogram will be plotted from')
         parser.add_argument('-rt', '--region_type', default='info',
                             help='Region that this histogram will be plotted from')
+        parser.add_argument('--load_once', action='store_true',
+                            help='Load each file once and share it with the -j processes drawing its plots. '
+                            'The (year, systematic) jobs then run one after the other, and ntuple '
+                            'files (-t ntuple) are drawn in this process only')
     else:
         pass
 
@@ -110,13 +128,14 @@ if __name__ == "__main__":
         exit()
 
 
+    set_thread_budget(cli_args.threads if cli_args.threads else (os.cpu_count() or 1)//cli_args.j)
     argList = job_main.setup(cli_args)
     func = job_main.run
 
     #############
     # Start Job #
     #############
-    if cli_args.j == 1:
+    if cli_args.j == 1 or getattr(cli_args, 'load_once', False):
         [func(*al) for al in argList]
     else:
         with mp.Pool(cli_args.j) as pool:
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+import sys
+from pathlib import Path
+import pytest
+
+np = pytest.importorskip("numpy")
+ak = pytest.importorskip("awkward")
+pytest.importorskip("ROOT")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+analyze = pytest.importorskip("analyze")
+
+
+def loop_fills(runs):
+    """(bin, weight) of each Fill of the per run loop getSumW used before"""
+    LHESCALE, PDF, ALPHAZ = 1, 10, 12
+    fills = []
+    for sumW, scales, pdf_sumw in zip(runs["genEventSumw"], runs["LHEScaleSumw"], runs["LHEPdfSumw"]):
+        fills.append((0, sumW))
+        for i, scale in enumerate(scales):
+            fills.append((LHESCALE+i, scale*sumW))
+        if len(pdf_sumw) >= 101:
+            pdf = sorted(pdf_sumw[:101])
+            err = (pdf[85] - pdf[15])/2
+            fills += [(PDF, (pdf[50]-err)*sumW), (PDF+1, (pdf[50]+err)*sumW)]
+        if len(pdf_sumw) == 103:
+            fills += [(ALPHAZ, pdf_sumw[101]*sumW), (ALPHAZ+1, pdf_sumw[102]*sumW)]
+        else:
+            fills += [(ALPHAZ, sumW), (ALPHAZ+1, sumW)]
+    return fills
+
+
+def test_sumweight_fills_match_run_loop():
+    rng = np.random.default_rng(7)
+    npdf = [103, 101, 33, 103]
+    scales = [list(rng.uniform(0.8, 1.2, 9)) for _ in npdf]
+    pdfs = [list(rng.uniform(0.9, 1.1, n)) for n in npdf]
+    sumw = list(rng.uniform(1e3, 1e4, len(npdf)))
+
+    runs = {"genEventSumw": np.array(sumw), "LHEScaleSumw": ak.Array(scales), "LHEPdfSumw": ak.Array(pdfs)}
+    bins, weights = analyze.get_sumw_fills(runs, len(npdf))
+    expected = loop_fills({"genEventSumw": sumw, "LHEScaleSumw": scales, "LHEPdfSumw": pdfs})
+    assert bins.tolist() == [float(b) for b, _ in expected]
+    assert np.allclose(weights, [w for _, w in expected], rtol=1e-12)
+
+
+def test_missing_sums_fill_default():
+    runs = {"genEventSumw": None, "LHEScaleSumw": None, "LHEPdfSumw": None}
+    bins, weights = analyze.get_sumw_fills(runs, 2)
+    assert bins.tolist() == [0., 0.]
+    assert weights.tolist() == [-1., -1.]